@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Throughput comparison of the Flask development server and the ASGI app.
+
+Starts each server in a subprocess, sends concurrent BaZi reading requests
+and reports requests per second and latency percentiles. Every request uses
+a different birth date, so responses are not served from the cache.
+
+Without --config the servers use the in-process mock provider, which answers
+instantly, so the run measures serving overhead only. To include realistic
+provider latency over the network, start the stand-in LLM server
+(python -m fortune_teller.mock_llm_server) and pass a config whose llm
+section points at it (llm.base_url or llm.endpoint_url).
+
+Usage:
+    python benchmark_api_server.py --requests 500 --concurrency 32 --workers 4
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import datetime
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+MOCK_CONFIG = 'llm:\n  provider: "mock"\n  model: "mock-model"\n'
+
+
+def start_server(kind: str, config_path: str, port: int, workers: int) -> subprocess.Popen:
+    """Start the Flask or ASGI server in a subprocess."""
+    if kind == "flask":
+        command = [sys.executable, "-m", "fortune_teller.api_server", "--config", config_path, "--port", str(port)]
+    else:
+        command = [sys.executable, "-m", "fortune_teller.asgi_app", "--config", config_path,
+                   "--port", str(port), "--workers", str(workers)]
+    return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    """Poll the health endpoint until the server answers."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}; "
+                               f"run {' '.join(process.args[1:])} to see why")
+        try:
+            urllib.request.urlopen(f"{base_url}/health", timeout=1).read()
+            return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready within {timeout}s")
+
+
+def reading_request(base_url: str, index: int) -> float:
+    """Send one reading request; returns its latency in seconds."""
+    birth_date = datetime.date(1950, 1, 1) + datetime.timedelta(days=index)
+    payload = {"name": f"bench-{index}", "birthDate": birth_date.isoformat(),
+               "birthTime": "08:30", "gender": "male" if index % 2 else "female"}
+    request = urllib.request.Request(f"{base_url}/api/fortune/bazi",
+                                     data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    started = time.monotonic()
+    urllib.request.urlopen(request, timeout=120).read()
+    return time.monotonic() - started
+
+
+def run_load(base_url: str, requests: int, concurrency: int, offset: int) -> Dict[str, Any]:
+    """Send the requests with a fixed number of client threads."""
+    latencies: List[float] = []
+    errors = 0
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(reading_request, base_url, offset + i) for i in range(requests)]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception:
+                errors += 1
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+
+    def percentile(p: float) -> Optional[float]:
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": elapsed,
+        "rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+    }
+
+
+def format_seconds(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较 Flask 开发服务器与 ASGI 应用的吞吐量")
+    parser.add_argument("--server", choices=["flask", "asgi", "both"], default="both", help="要测试的服务器")
+    parser.add_argument("--config", help="配置文件路径 (默认: 使用模拟LLM)")
+    parser.add_argument("--requests", type=int, default=200, help="每个服务器的请求数 (默认: 200)")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发客户端数 (默认: 16)")
+    parser.add_argument("--workers", type=int, default=1, help="ASGI 工作进程数 (默认: 1)")
+    parser.add_argument("--port", type=int, default=5100, help="起始端口 (默认: 5100)")
+    args = parser.parse_args()
+
+    config_path = args.config
+    temp_dir = None
+    if config_path is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        config_path = os.path.join(temp_dir.name, "config.yaml")
+        with open(config_path, "w", encoding="utf-8") as f:
+            f.write(MOCK_CONFIG)
+
+    kinds = ["flask", "asgi"] if args.server == "both" else [args.server]
+    results = {}
+    try:
+        for offset, kind in enumerate(kinds):
+            port = args.port + offset
+            base_url = f"http://127.0.0.1:{port}"
+            process = start_server(kind, config_path, port, args.workers)
+            try:
+                wait_until_ready(base_url, process)
+                # Warm up connections, plugins and the LLM client
+                run_load(base_url, min(args.concurrency, args.requests), args.concurrency,
+                         offset=len(kinds) * args.requests)
+                # Separate date ranges per server so neither benefits from the other's cache
+                results[kind] = run_load(base_url, args.requests, args.concurrency, offset=offset * args.requests)
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    print(f"{'server':<12}{'req/s':>10}{'p50':>12}{'p95':>12}{'p99':>12}{'errors':>8}")
+    for kind, result in results.items():
+        label = kind if kind == "flask" else f"asgi x{args.workers}"
+        print(f"{label:<12}{result['rps']:>10.1f}{format_seconds(result['p50']):>12}"
+              f"{format_seconds(result['p95']):>12}{format_seconds(result['p99']):>12}{result['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
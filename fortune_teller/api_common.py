@@ -0,0 +1,640 @@
+"""
+Request handling shared by the Flask API server and the ASGI app.
+Converts between the frontend's JSON format and FortuneTeller inputs and
+results, and keeps generated results for later retrieval.
+"""
+import re
+import json
+import asyncio
+import hashlib
+import logging
+import datetime
+import threading
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, Iterator, List, Optional, Tuple
+
+from fortune_teller.core.metrics import get_metrics_registry
+from fortune_teller.core.result_store import ResultStore, create_result_store
+from fortune_teller.core.single_flight import SingleFlight
+
+logger = logging.getLogger("FortuneAPI")
+
+# Frontend values of select inputs to the plugins' option values
+GENDER_MAP = {"male": "男", "female": "女"}
+
+# Request fields echoed in the results of every system
+ECHO_FIELDS = ("name", "question")
+
+_DATE_PATTERN = re.compile(r"^\d{4}-\d{1,2}-\d{1,2}$")
+_TIME_PATTERN = re.compile(r"^\d{1,2}:\d{2}$")
+
+
+def _camel_case(name: str) -> str:
+    """birth_date -> birthDate"""
+    first, *rest = name.split("_")
+    return first + "".join(part.title() for part in rest)
+
+
+def _compile_check(spec: Dict[str, Any]) -> Callable[[Any], Any]:
+    """Build the check of one input: returns the value to pass to the plugin, or None if invalid."""
+    input_type = spec.get("type", "text")
+    if input_type == "date":
+        return lambda value: value if isinstance(value, str) and _DATE_PATTERN.match(value) else None
+    if input_type == "time":
+        return lambda value: value if isinstance(value, str) and _TIME_PATTERN.match(value) else None
+    if input_type == "select":
+        options = {option["value"] if isinstance(option, dict) else option for option in spec.get("options", [])}
+        aliases = {alias: value for alias, value in GENDER_MAP.items() if value in options}
+        aliases.update((option, option) for option in options)
+        return lambda value: aliases.get(value) if isinstance(value, str) else None
+    return lambda value: value if isinstance(value, str) else None
+
+
+class InputSchema:
+    """
+    Request validation of one fortune telling system, compiled once from the
+    plugin's ``get_required_inputs``. Fields may be sent under the plugin's
+    names or their camelCase forms (birth_date or birthDate).
+    """
+    
+    def __init__(self, required_inputs: Dict[str, Dict[str, Any]]):
+        """
+        Compile the schema.
+        
+        Args:
+            required_inputs: Result of the plugin's get_required_inputs
+        """
+        # Request key -> plugin field name
+        self.aliases: Dict[str, str] = {}
+        # (field name, description, required, check)
+        self.fields: List[Tuple[str, str, bool, Callable[[Any], Any]]] = []
+        for field, spec in required_inputs.items():
+            self.aliases[field] = field
+            self.aliases[_camel_case(field)] = field
+            self.fields.append((field, spec.get("description", field), bool(spec.get("required")), _compile_check(spec)))
+    
+    def validate(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate a request and convert it to plugin inputs.
+        
+        Args:
+            data: Request JSON
+            
+        Returns:
+            Inputs for the plugin
+            
+        Raises:
+            ValueError: If required fields are missing or values are malformed
+        """
+        values = {}
+        for key, value in data.items():
+            field = self.aliases.get(key)
+            if field is not None and value not in (None, ""):
+                values[field] = value
+        
+        inputs = {}
+        errors = []
+        for field, description, required, check in self.fields:
+            if field not in values:
+                if required:
+                    errors.append(f"缺少{description}")
+                continue
+            value = check(values[field])
+            if value is None:
+                errors.append(f"{description}无效")
+            else:
+                inputs[field] = value
+        if errors:
+            raise ValueError("请求参数错误: " + "，".join(errors))
+        return inputs
+
+
+def frontend_request(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Request JSON in the frontend format equivalent to plugin inputs, for
+    readings generated outside the API such as batch jobs.
+    
+    Args:
+        inputs: Plugin inputs
+        
+    Returns:
+        Request JSON with camelCase keys and frontend values
+    """
+    genders = {value: alias for alias, value in GENDER_MAP.items()}
+    return {
+        _camel_case(field): genders.get(value, value) if field == "gender" else value
+        for field, value in inputs.items()
+    }
+
+
+# Requests answered with an already stored or in-flight result
+RESULTS_REUSED = get_metrics_registry().counter(
+    "api_results_reused_total",
+    "Reading requests served by an existing result instead of a new LLM call",
+    ("source",)
+)
+
+
+def reading_model(fortune_teller: Any) -> str:
+    """Provider and model generating the readings of a FortuneTeller."""
+    return f"{fortune_teller.llm_connector.provider}/{fortune_teller.llm_connector.model}"
+
+
+def reading_result_id(system_name: str, processed_data: Dict[str, Any], data: Dict[str, Any], model: str) -> str:
+    """
+    Content-addressed ID of a reading, stable across processes and restarts.
+    
+    Requests with the same processed chart, question and model get the same
+    ID. The name is included because the saved result shows it.
+    
+    Args:
+        system_name: Name of the fortune telling system
+        processed_data: Processed data of the reading
+        data: Request JSON in the frontend format
+        model: Provider and model generating the reading
+        
+    Returns:
+        Result ID
+    """
+    payload = json.dumps(
+        [system_name, processed_data, data.get("question") or "", data.get("name") or "", model],
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str
+    )
+    return f"{system_name}-{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]}"
+
+
+# Store of generated results, created on first use
+_result_store: Optional[ResultStore] = None
+_result_store_lock = threading.Lock()
+
+
+def configure_result_store(config: Optional[Dict[str, Any]] = None) -> ResultStore:
+    """
+    Create the process-wide result store, replacing any previous one.
+    
+    Args:
+        config: ``api.result_store`` configuration section
+        
+    Returns:
+        New result store
+    """
+    global _result_store
+    with _result_store_lock:
+        if _result_store is not None:
+            _result_store.close()
+        _result_store = create_result_store(config)
+        return _result_store
+
+
+def get_result_store() -> ResultStore:
+    """
+    Get the process-wide result store (an in-memory store unless configured).
+    
+    Returns:
+        Shared ResultStore instance
+    """
+    global _result_store
+    with _result_store_lock:
+        if _result_store is None:
+            _result_store = create_result_store()
+        return _result_store
+
+
+async def aget_or_create_result(single_flight: SingleFlight,
+                                result_id: str,
+                                create: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Get the stored result with an ID, or create it; concurrent requests for
+    the same ID wait for a single creation.
+    
+    Args:
+        single_flight: Coalescing registry of the calling event loop
+        result_id: Result ID
+        create: Generates and saves the result
+        
+    Returns:
+        Result in the frontend format
+    """
+    stored = await aload_result(result_id)
+    if stored is not None:
+        RESULTS_REUSED.inc(source="store")
+        return stored
+    if single_flight.in_flight(result_id):
+        RESULTS_REUSED.inc(source="in_flight")
+    return await single_flight.do(result_id, create)
+
+
+class ReadingError(Exception):
+    """The LLM failed to generate a reading; the failure is never saved as a result."""
+    pass
+
+
+class ReadingRequests:
+    """
+    Handles reading requests for every loaded fortune telling system.
+    Request schemas are compiled once, when the servers start.
+    """
+    
+    def __init__(self, fortune_teller: Any):
+        """
+        Compile the request schemas of the loaded plugins.
+        
+        Args:
+            fortune_teller: FortuneTeller serving the readings
+        """
+        self.fortune_teller = fortune_teller
+        self.schemas = {
+            name: InputSchema(plugin.get_required_inputs())
+            for name, plugin in fortune_teller.plugin_manager.get_all_plugins().items()
+        }
+    
+    def prepare(self, system_name: str, data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], str]:
+        """
+        Validate and process a request.
+        
+        Args:
+            system_name: Name of the fortune telling system
+            data: Request JSON
+            
+        Returns:
+            Tuple of (plugin inputs, processed data, result ID)
+            
+        Raises:
+            LookupError: If the system is not loaded
+            ValueError: If the request is invalid
+        """
+        schema = self.schemas.get(system_name)
+        if schema is None:
+            raise LookupError(f"未找到占卜系统: {system_name}")
+        inputs = schema.validate(data)
+        processed_data = self.fortune_teller.process_inputs(system_name, inputs)
+        result_id = reading_result_id(system_name, processed_data, data, reading_model(self.fortune_teller))
+        return inputs, processed_data, result_id
+    
+    async def acreate(self,
+                      system_name: str,
+                      data: Dict[str, Any],
+                      inputs: Dict[str, Any],
+                      processed_data: Dict[str, Any],
+                      result_id: str) -> Dict[str, Any]:
+        """
+        Generate a prepared reading and save it.
+        
+        Args:
+            system_name: Name of the fortune telling system
+            data: Request JSON
+            inputs: Plugin inputs from prepare
+            processed_data: Processed data from prepare
+            result_id: Result ID from prepare
+            
+        Returns:
+            Saved result in the frontend format
+            
+        Raises:
+            ReadingError: If the LLM call failed
+        """
+        result = await self.fortune_teller.aperform_reading(system_name, inputs, processed_data)
+        error = result["metadata"]["llm_metadata"].get("error")
+        if error:
+            raise ReadingError(f"解读生成失败: {error}")
+        frontend_response = frontend_result(system_name, result, data, result_id, processed_data)
+        await asave_result(result_id, frontend_response)
+        return frontend_response
+
+
+def save_result(result_id: str, result: Dict[str, Any]) -> None:
+    """Save a result to storage."""
+    get_result_store().put(result_id, result)
+
+
+def load_result(result_id: str) -> Optional[Dict[str, Any]]:
+    """Get a saved result, or None if there is none."""
+    return get_result_store().get(result_id)
+
+
+async def asave_result(result_id: str, result: Dict[str, Any]) -> None:
+    """Async version of ``save_result``; the store is written on an executor thread."""
+    await asyncio.get_running_loop().run_in_executor(None, save_result, result_id, result)
+
+
+async def aload_result(result_id: str) -> Optional[Dict[str, Any]]:
+    """Async version of ``load_result``; the store is read on an executor thread."""
+    return await asyncio.get_running_loop().run_in_executor(None, load_result, result_id)
+
+
+# Response headers of Server-Sent Events streams; proxies must not buffer them
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event: str, data: Any) -> str:
+    """
+    Encode one Server-Sent Event with a JSON payload.
+    
+    Args:
+        event: Event name
+        data: JSON-serializable payload
+        
+    Returns:
+        Event text, terminated by a blank line
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class ReadingStreamEncoder:
+    """
+    Encodes the (event, data) pairs of ``FortuneTeller.stream_reading`` as
+    Server-Sent Events: "chart" with the processed chart (for BaZi the eight
+    characters and five elements), "delta" with each chunk of text and
+    "result" with the saved frontend result.
+    """
+    
+    def __init__(self, system_name: str, request_data: Dict[str, Any], result_id: str):
+        """
+        Initialize the encoder of one reading.
+        
+        Args:
+            system_name: Name of the fortune telling system
+            request_data: Request JSON in the frontend format
+            result_id: ID under which the final result is saved
+        """
+        self.system_name = system_name
+        self.request_data = request_data
+        self.result_id = result_id
+        self.processed_data = None
+    
+    def encode(self, event: str, data: Any) -> str:
+        """Encode one reading event."""
+        if event == "chart":
+            self.processed_data = data
+            return sse_event("chart", frontend_chart(self.system_name, data))
+        if event == "delta":
+            return sse_event("delta", {"text": data})
+        
+        frontend_response = self.frontend_result(data)
+        save_result(self.result_id, frontend_response)
+        return self.result_event(frontend_response)
+    
+    def frontend_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert the final reading to the frontend format."""
+        return frontend_result(self.system_name, result, self.request_data, self.result_id, self.processed_data)
+    
+    def result_event(self, frontend_response: Dict[str, Any]) -> str:
+        """Encode the saved frontend result."""
+        return sse_event("result", {"resultId": self.result_id, "result": frontend_response})
+    
+    def error(self, message: str) -> str:
+        """Encode an error that ended the stream."""
+        return sse_event("error", {"error": message})
+
+
+def replay_result_stream(result: Dict[str, Any]) -> Iterator[str]:
+    """
+    Send a stored result as the events of a streamed reading.
+    
+    Args:
+        result: Stored result in the frontend format
+        
+    Returns:
+        Iterator of Server-Sent Events
+    """
+    if "eightWords" in result:
+        yield sse_event("chart", {"eightWords": result.get("eightWords"), "fiveElements": result.get("fiveElements")})
+        yield sse_event("delta", {"text": result.get("analysis", {}).get("character", "")})
+    else:
+        yield sse_event("chart", result.get("chart", {}))
+        yield sse_event("delta", {"text": result.get("fullText", "")})
+    yield sse_event("result", {"resultId": result.get("id"), "result": result})
+
+
+def encode_reading_stream(events: Iterator[Tuple[str, Any]], encoder: ReadingStreamEncoder) -> Iterator[str]:
+    """
+    Encode a reading stream as Server-Sent Events.
+    
+    Args:
+        events: (event, data) pairs of the reading
+        encoder: Encoder of the reading
+        
+    Returns:
+        Iterator of Server-Sent Events
+    """
+    try:
+        for event, data in events:
+            yield encoder.encode(event, data)
+    except Exception as e:
+        logger.error(f"Error streaming reading: {e}", exc_info=True)
+        yield encoder.error(str(e))
+    finally:
+        events.close()
+
+
+async def aencode_reading_stream(events: AsyncIterator[Tuple[str, Any]],
+                                 encoder: ReadingStreamEncoder) -> AsyncIterator[str]:
+    """Async version of ``encode_reading_stream``; the result is saved off the event loop."""
+    try:
+        async for event, data in events:
+            if event == "result":
+                frontend_response = encoder.frontend_result(data)
+                await asave_result(encoder.result_id, frontend_response)
+                yield encoder.result_event(frontend_response)
+            else:
+                yield encoder.encode(event, data)
+    except Exception as e:
+        logger.error(f"Error streaming reading: {e}", exc_info=True)
+        yield encoder.error(str(e))
+    finally:
+        await events.aclose()
+
+
+def frontend_chart(system_name: str, processed_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Processed chart of a reading in the frontend format.
+    
+    Args:
+        system_name: Name of the fortune telling system
+        processed_data: Processed data of the reading
+        
+    Returns:
+        BaZi eight characters and five elements, or the processed data of other systems
+    """
+    if system_name == "bazi":
+        return bazi_chart(processed_data)
+    return processed_data
+
+
+def frontend_result(system_name: str,
+                    result: Dict[str, Any],
+                    request_data: Dict[str, Any],
+                    result_id: str,
+                    processed_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a reading to the frontend format. BaZi keeps its dedicated format;
+    other systems return their chart, sections and full text.
+    
+    Args:
+        system_name: Name of the fortune telling system
+        result: Reading returned by FortuneTeller
+        request_data: Request JSON
+        result_id: Result ID
+        processed_data: Processed data of the reading
+        
+    Returns:
+        Result in the frontend format
+    """
+    if system_name == "bazi":
+        return convert_to_frontend_format(result, request_data, result_id, processed_data)
+    
+    response = {
+        "id": result_id,
+        "system": system_name,
+        "generatedAt": datetime.datetime.now().isoformat(),
+        "chart": processed_data,
+        "sections": result.get("analysis") or result.get("reading") or {},
+        "fullText": result.get("full_text", "")
+    }
+    for field in ECHO_FIELDS:
+        response[field] = request_data.get(field, "")
+    # Charts may hold dates; return exactly what the result store gives back later
+    return json.loads(json.dumps(response, ensure_ascii=False, default=str))
+
+
+def convert_to_frontend_format(result, request_data, result_id, processed_data=None):
+    """
+    Convert the FortuneTeller result format to frontend expected format.
+    最简单的实现：将LLM的原始响应直接显示出来
+    """
+    # 提取LLM生成的文本
+    full_text = result.get("full_text", "")
+    if not full_text:
+        full_text = str(result)
+    
+    # 从结果中提取处理过的数据（八字、五行等）
+    if processed_data is None:
+        processed_data = {}
+        if "metadata" in result and isinstance(result["metadata"], dict):
+            if "processed_data" in result["metadata"]:
+                processed_data = result["metadata"]["processed_data"]
+    
+    # 创建基本的前端响应
+    frontend_response = {
+        "id": result_id,
+        "name": request_data.get("name", ""),
+        "birthDate": request_data.get("birthDate", ""),
+        "birthTime": request_data.get("birthTime", ""),
+        "gender": request_data.get("gender", ""),
+        "location": request_data.get("location", ""),
+        "question": request_data.get("question", ""),
+        "generatedAt": datetime.datetime.now().isoformat(),
+        "analysis": {
+            "character": full_text,  # 将完整的LLM响应放入character字段
+            "career": "",
+            "relationships": "",
+            "health": "",
+            "fortune": ""
+        }
+    }
+    
+    frontend_response.update(bazi_chart(processed_data))
+    return frontend_response
+
+
+def bazi_chart(processed_data):
+    """
+    Eight characters and five elements of a BaZi reading in the frontend format.
+    
+    Args:
+        processed_data: Processed data of the bazi plugin (empty for defaults)
+        
+    Returns:
+        Dictionary with eightWords and fiveElements
+    """
+    chart = {}
+    
+    # 添加八字信息（从processed_data中获取，如果不存在则使用默认值）
+    try:
+        year_stem = "甲"
+        year_branch = "子"
+        month_stem = "乙"
+        month_branch = "丑"
+        day_stem = "丙"
+        day_branch = "寅"
+        hour_stem = "丁"
+        hour_branch = "卯"
+        
+        # 如果有处理过的八字数据，优先使用
+        if processed_data and "year_pillar" in processed_data:
+            year_stem = processed_data["year_pillar"]["stem"]
+            year_branch = processed_data["year_pillar"]["branch"]
+            month_stem = processed_data["month_pillar"]["stem"]
+            month_branch = processed_data["month_pillar"]["branch"]
+            day_stem = processed_data["day_pillar"]["stem"]
+            day_branch = processed_data["day_pillar"]["branch"]
+            if processed_data.get("hour_pillar"):
+                hour_stem = processed_data["hour_pillar"]["stem"]
+                hour_branch = processed_data["hour_pillar"]["branch"]
+        
+        chart["eightWords"] = {
+            "year": {
+                "heavenlyStem": year_stem,
+                "earthlyBranch": year_branch
+            },
+            "month": {
+                "heavenlyStem": month_stem,
+                "earthlyBranch": month_branch
+            },
+            "day": {
+                "heavenlyStem": day_stem,
+                "earthlyBranch": day_branch
+            },
+            "hour": {
+                "heavenlyStem": hour_stem,
+                "earthlyBranch": hour_branch
+            }
+        }
+    except Exception as e:
+        logger.error(f"Error setting eight words: {e}")
+        # 提供默认的八字信息
+        chart["eightWords"] = {
+            "year": {"heavenlyStem": "甲", "earthlyBranch": "子"},
+            "month": {"heavenlyStem": "乙", "earthlyBranch": "丑"},
+            "day": {"heavenlyStem": "丙", "earthlyBranch": "寅"},
+            "hour": {"heavenlyStem": "丁", "earthlyBranch": "卯"}
+        }
+    
+    # 添加五行信息
+    try:
+        wood = "木"
+        fire = "火" 
+        earth = "土"
+        metal = "金"
+        water = "水"
+        
+        # 如果有处理过的五行数据，优先使用
+        if processed_data and "elements" in processed_data:
+            elements = processed_data["elements"]
+            dominant = elements["strongest"]
+            lacking = elements["weakest"]
+            balanced = [e for e in ["木", "火", "土", "金", "水"] 
+                      if e != dominant and e != lacking]
+        else:
+            # 使用默认值
+            dominant = wood
+            lacking = metal
+            balanced = [fire, earth, water]
+        
+        chart["fiveElements"] = {
+            "dominant": dominant,
+            "lacking": lacking,
+            "balanced": balanced
+        }
+    except Exception as e:
+        logger.error(f"Error setting five elements: {e}")
+        # 默认五行信息
+        chart["fiveElements"] = {
+            "dominant": "木",
+            "lacking": "金",
+            "balanced": ["火", "土", "水"]
+        }
+    
+    return chart
@@ -4,13 +4,20 @@ Uses the main FortuneTeller class to leverage the complete backend logic.
 """
 import json
 import logging
-import datetime
 import argparse
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
 # 导入主程序类
 from fortune_teller.main import FortuneTeller
+from fortune_teller.api_common import (
+    RESULTS_REUSED, SSE_HEADERS, ReadingError, ReadingRequests, ReadingStreamEncoder,
+    aget_or_create_result, configure_result_store, encode_reading_stream, load_result, replay_result_stream
+)
+from fortune_teller.core.async_runner import get_runner
+from fortune_teller.core.single_flight import SingleFlight
+from fortune_teller.core.metrics import get_metrics_registry
+from fortune_teller.core.structured_logging import configure_logging
 
 # Configure logging
 logging.basicConfig(
@@ -29,6 +36,10 @@ CORS(app)  # Enable CORS for all routes
 
 # 全局变量
 fortune_teller = None
+readings = None
+
+# Coalesces identical reading requests; only used on the shared runner loop
+_single_flight = SingleFlight()
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -39,18 +50,24 @@ def health_check():
         "availableSystems": [system["name"] for system in available_systems]
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """LLM call metrics in the Prometheus text exposition format."""
+    return Response(get_metrics_registry().render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/api/systems', methods=['GET'])
 def get_systems():
     """Get all available fortune telling systems."""
     systems = fortune_teller.get_available_systems()
     return jsonify({"systems": systems})
 
-@app.route('/api/fortune/bazi', methods=['POST'])
-def bazi_fortune():
+@app.route('/api/fortune/<system_name>', methods=['POST'])
+def fortune(system_name):
     """
-    Generate a BaZi (Chinese Eight Characters) fortune reading.
+    Generate a reading of any loaded fortune telling system.
     
-    Expected JSON input:
+    The JSON input holds the system's required inputs (see /api/systems),
+    under their names or camelCase forms, e.g. for BaZi:
     {
         "name": "User's name",
         "birthDate": "YYYY-MM-DD",
@@ -60,187 +77,80 @@ def bazi_fortune():
         "question": "User's question (optional)"
     }
     """
+    data = request.json or {}
+    logger.info(f"Received {system_name} request")
     try:
-        data = request.json
-        logger.info(f"Received BaZi request: {data}")
-        
-        # Convert frontend format to FortuneTeller format
-        gender_map = {"male": "男", "female": "女"}
-        
-        input_data = {
-            "birth_date": data.get("birthDate"),
-            "birth_time": data.get("birthTime"),
-            "gender": gender_map.get(data.get("gender")),
-            "location": data.get("location"),
-            "name": data.get("name", ""),
-            "question": data.get("question", "")
-        }
-        
-        # Use the FortuneTeller class to perform the reading
-        result = fortune_teller.perform_reading("bazi", input_data)
-        
-        # Save the reading with a unique ID
-        result_id = f"bazi-{hash(data.get('name', '') + data.get('birthDate', ''))}"
-        
-        # Create a response compatible with the frontend expectations
-        frontend_response = convert_to_frontend_format(result, data, result_id)
-        
-        # Save the result for later retrieval
-        save_result(result_id, frontend_response)
-        
-        # Return the response
-        logger.info("Successfully generated BaZi response")
-        return jsonify({
-            "resultId": result_id,
-            "result": frontend_response
-        })
-        
+        input_data, processed_data, result_id = readings.prepare(system_name, data)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        # Reuse the stored result, or join an identical request in flight
+        frontend_response = get_runner().run(aget_or_create_result(
+            _single_flight, result_id,
+            lambda: readings.acreate(system_name, data, input_data, processed_data, result_id)
+        ))
+    except ReadingError as e:
+        logger.error(f"Error generating {system_name} reading: {e}")
+        return jsonify({"error": str(e)}), 502
     except Exception as e:
-        logger.error(f"Error processing BaZi request: {e}", exc_info=True)
+        logger.error(f"Error processing {system_name} request: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 400
+    
+    logger.info(f"Successfully generated {system_name} response")
+    return jsonify({
+        "resultId": result_id,
+        "result": frontend_response
+    })
 
-# In-memory storage for results
-results_storage = {}
-
-def save_result(result_id, result):
-    """Save a result to storage."""
-    results_storage[result_id] = result
+@app.route('/api/fortune/<system_name>/stream', methods=['POST'])
+def stream_fortune(system_name):
+    """
+    Stream a reading as Server-Sent Events.
+    
+    Takes the same JSON input as the reading endpoint and sends a "chart" event
+    as soon as the inputs are processed, a "delta" event for each chunk of the
+    LLM response and a "result" event with the saved result and its ID.
+    """
+    data = request.json or {}
+    logger.info(f"Received streaming {system_name} request")
+    try:
+        # Invalid inputs are reported as an error response rather than inside the stream
+        input_data, processed_data, result_id = readings.prepare(system_name, data)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    stored = load_result(result_id)
+    if stored is not None:
+        RESULTS_REUSED.inc(source="store")
+        return Response(replay_result_stream(stored), mimetype="text/event-stream", headers=SSE_HEADERS)
+    
+    # Identical streams in flight share one provider stream in the connector
+    events = fortune_teller.stream_reading(system_name, input_data, processed_data)
+    encoder = ReadingStreamEncoder(system_name, data, result_id)
+    return Response(encode_reading_stream(events, encoder),
+                    mimetype="text/event-stream", headers=SSE_HEADERS)
 
 @app.route('/api/result/<result_id>', methods=['GET'])
 def get_result(result_id):
     """Get a saved result by ID."""
-    if result_id in results_storage:
-        return jsonify(results_storage[result_id])
+    result = load_result(result_id)
+    if result is not None:
+        return jsonify(result)
     else:
         return jsonify({"error": "结果不存在"}), 404
 
-def convert_to_frontend_format(result, request_data, result_id):
+def run_server(host='0.0.0.0', port=5000, debug=False):
     """
-    Convert the FortuneTeller result format to frontend expected format.
-    最简单的实现：将LLM的原始响应直接显示出来
+    Run the Flask development server.
+    For production use the ASGI app instead: python -m fortune_teller.asgi_app
     """
-    # 提取LLM生成的文本
-    full_text = result.get("full_text", "")
-    if not full_text:
-        full_text = str(result)
-    
-    # 从结果中提取处理过的数据（八字、五行等）
-    processed_data = {}
-    if "metadata" in result and isinstance(result["metadata"], dict):
-        if "processed_data" in result["metadata"]:
-            processed_data = result["metadata"]["processed_data"]
-    
-    # 创建基本的前端响应
-    frontend_response = {
-        "id": result_id,
-        "name": request_data.get("name", ""),
-        "birthDate": request_data.get("birthDate", ""),
-        "birthTime": request_data.get("birthTime", ""),
-        "gender": request_data.get("gender", ""),
-        "location": request_data.get("location", ""),
-        "question": request_data.get("question", ""),
-        "generatedAt": datetime.datetime.now().isoformat(),
-        "analysis": {
-            "character": full_text,  # 将完整的LLM响应放入character字段
-            "career": "",
-            "relationships": "",
-            "health": "",
-            "fortune": ""
-        }
-    }
-    
-    # 添加八字信息（从processed_data中获取，如果不存在则使用默认值）
-    try:
-        year_stem = "甲"
-        year_branch = "子"
-        month_stem = "乙"
-        month_branch = "丑"
-        day_stem = "丙"
-        day_branch = "寅"
-        hour_stem = "丁"
-        hour_branch = "卯"
-        
-        # 如果有处理过的八字数据，优先使用
-        if processed_data and "year_pillar" in processed_data:
-            year_stem = processed_data["year_pillar"]["stem"]
-            year_branch = processed_data["year_pillar"]["branch"]
-            month_stem = processed_data["month_pillar"]["stem"]
-            month_branch = processed_data["month_pillar"]["branch"]
-            day_stem = processed_data["day_pillar"]["stem"]
-            day_branch = processed_data["day_pillar"]["branch"]
-            if processed_data.get("hour_pillar"):
-                hour_stem = processed_data["hour_pillar"]["stem"]
-                hour_branch = processed_data["hour_pillar"]["branch"]
-        
-        frontend_response["eightWords"] = {
-            "year": {
-                "heavenlyStem": year_stem,
-                "earthlyBranch": year_branch
-            },
-            "month": {
-                "heavenlyStem": month_stem,
-                "earthlyBranch": month_branch
-            },
-            "day": {
-                "heavenlyStem": day_stem,
-                "earthlyBranch": day_branch
-            },
-            "hour": {
-                "heavenlyStem": hour_stem,
-                "earthlyBranch": hour_branch
-            }
-        }
-    except Exception as e:
-        logger.error(f"Error setting eight words: {e}")
-        # 提供默认的八字信息
-        frontend_response["eightWords"] = {
-            "year": {"heavenlyStem": "甲", "earthlyBranch": "子"},
-            "month": {"heavenlyStem": "乙", "earthlyBranch": "丑"},
-            "day": {"heavenlyStem": "丙", "earthlyBranch": "寅"},
-            "hour": {"heavenlyStem": "丁", "earthlyBranch": "卯"}
-        }
-    
-    # 添加五行信息
-    try:
-        wood = "木"
-        fire = "火" 
-        earth = "土"
-        metal = "金"
-        water = "水"
-        
-        # 如果有处理过的五行数据，优先使用
-        if processed_data and "elements" in processed_data:
-            elements = processed_data["elements"]
-            dominant = elements["strongest"]
-            lacking = elements["weakest"]
-            balanced = [e for e in ["木", "火", "土", "金", "水"] 
-                      if e != dominant and e != lacking]
-        else:
-            # 使用默认值
-            dominant = wood
-            lacking = metal
-            balanced = [fire, earth, water]
-        
-        frontend_response["fiveElements"] = {
-            "dominant": dominant,
-            "lacking": lacking,
-            "balanced": balanced
-        }
-    except Exception as e:
-        logger.error(f"Error setting five elements: {e}")
-        # 默认五行信息
-        frontend_response["fiveElements"] = {
-            "dominant": "木",
-            "lacking": "金",
-            "balanced": ["火", "土", "水"]
-        }
-    
-    return frontend_response
-
-def run_server(host='0.0.0.0', port=5000):
-    """Run the Flask API server."""
     logger.info(f"Starting Fortune Teller API server on {host}:{port}")
-    app.run(host=host, port=port, debug=True)
+    app.run(host=host, port=port, debug=debug, threaded=True)
 
 if __name__ == "__main__":
     # 解析命令行参数
@@ -248,11 +158,15 @@ if __name__ == "__main__":
     parser.add_argument("--config", help="配置文件路径")
     parser.add_argument("--host", default="0.0.0.0", help="监听主机 (默认: 0.0.0.0)")
     parser.add_argument("--port", type=int, default=5000, help="监听端口 (默认: 5000)")
+    parser.add_argument("--debug", action="store_true", help="开启Flask调试器和自动重载（仅限开发环境）")
     
     args = parser.parse_args()
     
     # 初始化主程序
     fortune_teller = FortuneTeller(args.config)
+    readings = ReadingRequests(fortune_teller)
+    configure_logging(fortune_teller.config_manager.get_config("logging"))
+    configure_result_store(fortune_teller.config_manager.get_value("api.result_store"))
     
     # 启动服务器
-    run_server(host=args.host, port=args.port)
+    run_server(host=args.host, port=args.port, debug=args.debug)
@@ -0,0 +1,336 @@
+"""
+ASGI app for serving the Fortune Teller API in production.
+Exposes the same endpoints as the Flask development server, with reading
+endpoints that await the LLM connector instead of blocking a worker thread.
+
+Each worker process creates its own FortuneTeller at startup:
+
+    python -m fortune_teller.asgi_app --workers 4
+    gunicorn -k uvicorn.workers.UvicornWorker -w 4 fortune_teller.asgi_app:app
+
+The configuration file is taken from the FORTUNE_TELLER_CONFIG environment
+variable (set by ``--config``).
+"""
+import os
+import re
+import sys
+import json
+import asyncio
+import logging
+import argparse
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional, Pattern, Tuple
+
+from fortune_teller.api_common import (
+    RESULTS_REUSED, SSE_HEADERS, ReadingError, ReadingRequests, ReadingStreamEncoder, aencode_reading_stream,
+    aget_or_create_result, aload_result, configure_result_store, replay_result_stream
+)
+from fortune_teller.core.single_flight import SingleFlight
+from fortune_teller.core.metrics import get_metrics_registry
+from fortune_teller.core.structured_logging import configure_logging
+
+logger = logging.getLogger("FortuneASGI")
+
+# Environment variable naming the configuration file of every worker
+CONFIG_ENV = "FORTUNE_TELLER_CONFIG"
+
+# Largest accepted request body in bytes
+MAX_BODY_BYTES = 1024 * 1024
+
+# Handler result: (status, JSON payload), (status, text, content type) or (status, StreamingBody)
+Response = Tuple[Any, ...]
+Handler = Callable[..., Awaitable[Response]]
+
+
+class HTTPError(Exception):
+    """Error answered with a JSON {"error": ...} response."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class StreamingBody:
+    """Response body sent chunk by chunk as the iterator produces it."""
+
+    def __init__(self, chunks: AsyncIterator[str], content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.chunks = chunks
+        self.content_type = content_type
+        self.headers = headers or {}
+
+
+class FortuneASGIApp:
+    """
+    ASGI application serving the Fortune Teller API.
+    """
+
+    def __init__(self, config_file: Optional[str] = None):
+        """
+        Initialize the app; the FortuneTeller is created at startup.
+
+        Args:
+            config_file: Configuration file, or None to use FORTUNE_TELLER_CONFIG
+        """
+        self.config_file = config_file
+        self.fortune_teller = None
+        self.readings = None
+        # Coalesces identical reading requests within this worker
+        self._single_flight = SingleFlight()
+        self.routes: List[Tuple[str, Pattern, Handler]] = [
+            ("GET", re.compile(r"^/health$"), self.health),
+            ("GET", re.compile(r"^/metrics$"), self.metrics),
+            ("GET", re.compile(r"^/api/systems$"), self.systems),
+            ("POST", re.compile(r"^/api/fortune/(?P<system_name>[^/]+)$"), self.fortune),
+            ("POST", re.compile(r"^/api/fortune/(?P<system_name>[^/]+)/stream$"), self.stream_fortune),
+            ("GET", re.compile(r"^/api/result/(?P<result_id>[^/]+)$"), self.result),
+        ]
+
+    def startup(self) -> None:
+        """Create this worker's FortuneTeller."""
+        if self.fortune_teller is not None:
+            return
+        from fortune_teller.main import FortuneTeller
+        self.fortune_teller = FortuneTeller(self.config_file or os.environ.get(CONFIG_ENV))
+        self.readings = ReadingRequests(self.fortune_teller)
+        configure_logging(self.fortune_teller.config_manager.get_config("logging"))
+        configure_result_store(self.fortune_teller.config_manager.get_value("api.result_store"))
+        logger.info(f"Worker {os.getpid()} ready")
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive: Callable, send: Callable) -> None:
+        """Handle the ASGI lifespan protocol."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    self.startup()
+                except Exception as e:
+                    logger.error(f"Startup failed: {e}", exc_info=True)
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        """Route an HTTP request and send the response."""
+        method, path = scope["method"], scope["path"]
+        if method == "OPTIONS":
+            # CORS preflight
+            await self._send(send, 204, b"", "text/plain", extra_headers=[
+                (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+                (b"access-control-allow-headers", b"Content-Type"),
+            ])
+            return
+
+        try:
+            handler, params = self._match(method, path)
+            if self.fortune_teller is None:
+                # Servers without lifespan support
+                self.startup()
+            if method == "POST":
+                params["data"] = await self._read_json(receive)
+            response = await handler(**params)
+        except HTTPError as e:
+            response = (e.status, {"error": str(e)})
+        except Exception as e:
+            logger.error(f"Error handling {method} {path}: {e}", exc_info=True)
+            response = (500, {"error": str(e)})
+
+        if isinstance(response[-1], StreamingBody):
+            status, body = response
+            await self._send_streaming(send, receive, status, body)
+        elif len(response) == 2:
+            status, payload = response
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+            await self._send(send, status, body, "application/json")
+        else:
+            status, text, content_type = response
+            await self._send(send, status, text.encode("utf-8"), content_type)
+
+    def _match(self, method: str, path: str) -> Tuple[Handler, Dict[str, Any]]:
+        """Find the handler of a request and its path parameters."""
+        path_found = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match is None:
+                continue
+            path_found = True
+            if route_method == method:
+                return handler, match.groupdict()
+        if path_found:
+            raise HTTPError(405, "不支持的请求方法")
+        raise HTTPError(404, "接口不存在")
+
+    @staticmethod
+    async def _read_json(receive: Callable) -> Dict[str, Any]:
+        """Read and parse a JSON request body."""
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if len(body) > MAX_BODY_BYTES:
+                raise HTTPError(413, "请求体过大")
+            if not message.get("more_body", False):
+                break
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "请求体不是有效的JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "请求体必须是JSON对象")
+        return data
+
+    @staticmethod
+    async def _send(send: Callable,
+                    status: int,
+                    body: bytes,
+                    content_type: str,
+                    extra_headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+        """Send a complete response."""
+        headers = [
+            (b"content-type", f"{content_type}; charset=utf-8".encode("ascii")),
+            (b"content-length", str(len(body)).encode("ascii")),
+            (b"access-control-allow-origin", b"*"),
+        ]
+        await send({"type": "http.response.start", "status": status, "headers": headers + (extra_headers or [])})
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _send_streaming(send: Callable, receive: Callable, status: int, body: StreamingBody) -> None:
+        """Send a streamed response, stopping early if the client disconnects."""
+        headers = [
+            (b"content-type", f"{body.content_type}; charset=utf-8".encode("ascii")),
+            (b"access-control-allow-origin", b"*"),
+        ]
+        headers.extend((name.lower().encode("ascii"), value.encode("ascii")) for name, value in body.headers.items())
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+
+        async def pump() -> None:
+            async for chunk in body.chunks:
+                await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def disconnected() -> None:
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        pump_task = asyncio.ensure_future(pump())
+        watch_task = asyncio.ensure_future(disconnected())
+        try:
+            await asyncio.wait([pump_task, watch_task], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            watch_task.cancel()
+            if not pump_task.done():
+                # Cancelling the pump closes the reading stream and with it the provider stream
+                logger.info("Client disconnected, stopping stream")
+                pump_task.cancel()
+            try:
+                await pump_task
+            except asyncio.CancelledError:
+                pass
+
+    async def health(self) -> Response:
+        """Health check endpoint."""
+        available_systems = self.fortune_teller.get_available_systems()
+        return 200, {
+            "status": "ok",
+            "availableSystems": [system["name"] for system in available_systems]
+        }
+
+    async def metrics(self) -> Response:
+        """LLM call metrics in the Prometheus text exposition format."""
+        return 200, get_metrics_registry().render_prometheus(), "text/plain; version=0.0.4"
+
+    async def systems(self) -> Response:
+        """Get all available fortune telling systems."""
+        return 200, {"systems": self.fortune_teller.get_available_systems()}
+
+    async def fortune(self, system_name: str, data: Dict[str, Any]) -> Response:
+        """Generate a reading of any loaded system; same request and response format as the Flask server."""
+        logger.info(f"Received {system_name} request")
+        inputs, processed_data, result_id = self._prepare(system_name, data)
+        try:
+            frontend_response = await aget_or_create_result(
+                self._single_flight, result_id,
+                lambda: self.readings.acreate(system_name, data, inputs, processed_data, result_id)
+            )
+        except ReadingError as e:
+            raise HTTPError(502, str(e))
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        return 200, {"resultId": result_id, "result": frontend_response}
+
+    async def stream_fortune(self, system_name: str, data: Dict[str, Any]) -> Response:
+        """Stream a reading as Server-Sent Events; same events as the Flask server."""
+        logger.info(f"Received streaming {system_name} request")
+        inputs, processed_data, result_id = self._prepare(system_name, data)
+
+        stored = await aload_result(result_id)
+        if stored is not None:
+            RESULTS_REUSED.inc(source="store")
+            return 200, StreamingBody(_replay(stored), "text/event-stream", SSE_HEADERS)
+
+        # Identical streams in flight share one provider stream in the connector
+        events = self.fortune_teller.astream_reading(system_name, inputs, processed_data)
+        encoder = ReadingStreamEncoder(system_name, data, result_id)
+        return 200, StreamingBody(aencode_reading_stream(events, encoder), "text/event-stream", SSE_HEADERS)
+
+    def _prepare(self, system_name: str, data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], str]:
+        """Validate and process a reading request, mapping failures to HTTP errors."""
+        try:
+            return self.readings.prepare(system_name, data)
+        except LookupError as e:
+            raise HTTPError(404, str(e))
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+    async def result(self, result_id: str) -> Response:
+        """Get a saved result by ID."""
+        result = await aload_result(result_id)
+        if result is None:
+            raise HTTPError(404, "结果不存在")
+        return 200, result
+
+
+async def _replay(result: Dict[str, Any]) -> AsyncIterator[str]:
+    """Events of a stored result as an async iterator."""
+    for event in replay_result_stream(result):
+        yield event
+
+
+# Application object for ASGI servers
+app = FortuneASGIApp()
+
+
+def main():
+    """Entry point: serve the ASGI app with uvicorn."""
+    # 解析命令行参数
+    parser = argparse.ArgumentParser(description="Fortune Teller API服务器 (ASGI 生产模式)")
+    parser.add_argument("--config", help="配置文件路径")
+    parser.add_argument("--host", default="0.0.0.0", help="监听主机 (默认: 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=5000, help="监听端口 (默认: 5000)")
+    parser.add_argument("--workers", type=int, default=1, help="工作进程数，每个进程各自初始化 (默认: 1)")
+
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("未安装uvicorn，请运行: pip install uvicorn")
+        sys.exit(1)
+
+    # Worker processes import the app afresh and read the configuration path from the environment
+    if args.config:
+        os.environ[CONFIG_ENV] = os.path.abspath(args.config)
+    uvicorn.run("fortune_teller.asgi_app:app", host=args.host, port=args.port,
+                workers=args.workers, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Offline batch pipeline for bulk readings.
+Turns a JSONL file of reading jobs into plugin prompts, runs them through a
+provider batch API instead of real-time calls, and ingests the answers into
+the response cache, the API result store and a results JSONL file.
+
+Job lines: {"id": "...", "system": "bazi", "inputs": {...}}
+
+Every stage is checkpointed in the working directory, so an interrupted run
+resumes where it stopped without resubmitting or re-ingesting anything.
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import datetime
+from typing import Dict, Any, Optional
+
+from fortune_teller.api_common import frontend_request, frontend_result, reading_model, reading_result_id
+from fortune_teller.core.batch_backend import (
+    BatchBackend, COMPLETED, FAILED, create_batch_backend, read_jsonl, write_jsonl
+)
+from fortune_teller.core.result_store import ResultStore, create_result_store
+from fortune_teller.core.structured_logging import configure_logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("BatchPipeline")
+
+# Pipeline stages, in order
+PREPARED = "prepared"
+SUBMITTED = "submitted"
+DOWNLOADED = "downloaded"
+DONE = "done"
+
+
+class BatchPipeline:
+    """
+    Runs reading jobs through a batch backend in resumable stages:
+    prepare prompts, submit, poll, download and ingest.
+    """
+
+    def __init__(self,
+                 fortune_teller: Any,
+                 backend: BatchBackend,
+                 work_dir: str,
+                 poll_interval: float = 60.0,
+                 timeout: Optional[float] = None,
+                 result_store: Optional[ResultStore] = None):
+        """
+        Initialize the pipeline.
+
+        Args:
+            fortune_teller: FortuneTeller providing the plugins and the LLM connector
+            backend: Batch backend to submit to
+            work_dir: Directory for the batch files and the checkpoint
+            poll_interval: Seconds between status polls
+            timeout: Seconds to wait for the batch, or None to wait forever
+            result_store: Store the API servers serve results from; created from
+                ``api.result_store`` by default
+        """
+        self.fortune_teller = fortune_teller
+        self.backend = backend
+        self.work_dir = work_dir
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        if result_store is None:
+            result_store = create_result_store(fortune_teller.config_manager.get_value("api.result_store"))
+        self.result_store = result_store
+        os.makedirs(work_dir, exist_ok=True)
+
+        self.checkpoint_path = os.path.join(work_dir, "checkpoint.json")
+        self.jobs_path = os.path.join(work_dir, "jobs.prepared.jsonl")
+        self.requests_path = os.path.join(work_dir, "requests.jsonl")
+        self.batch_output_path = os.path.join(work_dir, "batch_output.jsonl")
+        self.results_path = os.path.join(work_dir, "results.jsonl")
+
+    def load_checkpoint(self) -> Dict[str, Any]:
+        """
+        Load the checkpoint of the working directory.
+
+        Returns:
+            Checkpoint dictionary; empty if the pipeline has not started
+        """
+        if not os.path.isfile(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_checkpoint(self, checkpoint: Dict[str, Any]) -> None:
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def run(self, jobs_path: str) -> Dict[str, int]:
+        """
+        Run or resume the pipeline.
+
+        Args:
+            jobs_path: JSONL file of reading jobs; ignored when resuming
+
+        Returns:
+            Counts of "total", "succeeded", "failed" and "cached" jobs
+
+        Raises:
+            RuntimeError: If the batch fails or does not finish within the timeout
+        """
+        checkpoint = self.load_checkpoint()
+
+        if not checkpoint:
+            checkpoint = self.prepare(jobs_path)
+            self._save_checkpoint(checkpoint)
+
+        if checkpoint["stage"] == PREPARED:
+            if checkpoint["requests"]:
+                checkpoint["batch_id"] = self.backend.submit(self.requests_path)
+                logger.info(f"Submitted {checkpoint['requests']} requests as batch {checkpoint['batch_id']}")
+            checkpoint["stage"] = SUBMITTED
+            self._save_checkpoint(checkpoint)
+
+        if checkpoint["stage"] == SUBMITTED:
+            if checkpoint.get("batch_id"):
+                self._wait(checkpoint["batch_id"])
+                self.backend.download(checkpoint["batch_id"], self.batch_output_path)
+            else:
+                write_jsonl(self.batch_output_path, [])
+            checkpoint["stage"] = DOWNLOADED
+            self._save_checkpoint(checkpoint)
+
+        if checkpoint["stage"] == DOWNLOADED:
+            checkpoint["summary"] = self.ingest()
+            checkpoint["stage"] = DONE
+            self._save_checkpoint(checkpoint)
+
+        return checkpoint["summary"]
+
+    def prepare(self, jobs_path: str) -> Dict[str, Any]:
+        """
+        Build the prompts of every job with its plugin and write the batch
+        requests. Jobs whose response is already cached are not submitted.
+        The processed data and result ID are kept with each job, because some
+        plugins (tarot cards, zodiac dates) would process the inputs differently
+        at ingest time.
+
+        Args:
+            jobs_path: JSONL file of reading jobs
+
+        Returns:
+            Checkpoint of the prepared stage
+        """
+        connector = self.fortune_teller.llm_connector
+        jobs, requests = [], []
+        for index, job in enumerate(read_jsonl(jobs_path)):
+            job_id = str(job.get("id", index))
+            system_name = job.get("system")
+            inputs = job.get("inputs", {})
+            prepared = {"id": job_id, "system": system_name, "inputs": inputs}
+
+            try:
+                fortune_system = self.fortune_teller.plugin_manager.get_plugin(system_name)
+                if not fortune_system:
+                    raise ValueError(f"未找到占卜系统: {system_name}")
+                processed_data = fortune_system.process_data(fortune_system.validate_input(inputs))
+                prompts = fortune_system.generate_llm_prompt(processed_data)
+            except Exception as e:
+                logger.warning(f"Skipping job {job_id}: {e}")
+                prepared["error"] = str(e)
+                jobs.append(prepared)
+                continue
+
+            prepared["system_prompt"] = prompts["system_prompt"]
+            prepared["user_prompt"] = prompts["user_prompt"]
+            # The ID the API servers give the same request, so they serve the reading without calling the LLM
+            prepared["result_id"] = reading_result_id(system_name, processed_data, frontend_request(inputs),
+                                                      reading_model(self.fortune_teller))
+            prepared["processed_data"] = json.loads(json.dumps(processed_data, ensure_ascii=False, default=str))
+            prepared["cached"] = connector.is_cached(prompts["system_prompt"], prompts["user_prompt"])
+            jobs.append(prepared)
+
+            if not prepared["cached"]:
+                requests.append({
+                    "custom_id": job_id,
+                    "system_prompt": prompts["system_prompt"],
+                    "user_prompt": prompts["user_prompt"],
+                    "model": connector.model,
+                    "temperature": connector.temperature,
+                    "max_tokens": connector.max_tokens
+                })
+
+        write_jsonl(self.jobs_path, jobs)
+        write_jsonl(self.requests_path, requests)
+        logger.info(f"Prepared {len(jobs)} jobs, {len(requests)} to submit")
+        return {"stage": PREPARED, "jobs": len(jobs), "requests": len(requests)}
+
+    def _wait(self, batch_id: str) -> None:
+        """Poll the backend until the batch has completed."""
+        started = time.monotonic()
+        while True:
+            state = self.backend.status(batch_id)
+            if state == COMPLETED:
+                return
+            if state == FAILED:
+                raise RuntimeError(f"Batch {batch_id} failed")
+            if self.timeout is not None and time.monotonic() - started > self.timeout:
+                raise RuntimeError(f"Batch {batch_id} did not finish within {self.timeout}s")
+            logger.info(f"Batch {batch_id} is {state}, checking again in {self.poll_interval}s")
+            time.sleep(self.poll_interval)
+
+    def ingest(self) -> Dict[str, int]:
+        """
+        Cache the batch responses, save the readings to the result store and
+        append a result for every job to the results file. Jobs already in the results file are skipped, so an
+        interrupted ingest can be repeated.
+
+        Returns:
+            Counts of "total", "succeeded", "failed" and "cached" jobs
+        """
+        connector = self.fortune_teller.llm_connector
+        batch_results = {result["custom_id"]: result for result in read_jsonl(self.batch_output_path)}
+        done = set()
+        if os.path.isfile(self.results_path):
+            done = {record["id"] for record in read_jsonl(self.results_path)}
+
+        cached_jobs = set()
+        with open(self.results_path, "a", encoding="utf-8") as results_file:
+            for job in read_jsonl(self.jobs_path):
+                if job.get("cached"):
+                    cached_jobs.add(job["id"])
+                if job["id"] in done:
+                    # Written by an earlier, interrupted ingest
+                    continue
+                record = self._ingest_job(job, batch_results, connector)
+                results_file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                results_file.flush()
+
+        summary = {"total": 0, "succeeded": 0, "failed": 0, "cached": 0}
+        for record in read_jsonl(self.results_path):
+            summary["total"] += 1
+            if "error" in record:
+                summary["failed"] += 1
+            else:
+                summary["succeeded"] += 1
+                summary["cached"] += record["id"] in cached_jobs
+        logger.info(f"Ingested batch results: {summary}")
+        return summary
+
+    def _ingest_job(self,
+                    job: Dict[str, Any],
+                    batch_results: Dict[str, Dict[str, Any]],
+                    connector: Any) -> Dict[str, Any]:
+        """Build the result record of one job, caching a fresh batch response and saving the reading."""
+        record = {"id": job["id"], "system": job["system"]}
+        if "error" in job:
+            record["error"] = job["error"]
+            return record
+
+        if job.get("cached"):
+            cached = connector.get_cached_response(job["system_prompt"], job["user_prompt"])
+            if cached is None:
+                record["error"] = "缓存的响应已失效"
+                return record
+            response, metadata = cached
+        else:
+            result = batch_results.get(job["id"])
+            if result is None or "error" in result:
+                record["error"] = result["error"] if result else "批处理结果缺失"
+                return record
+            response, metadata = result["response"], result.get("metadata", {})
+            connector.cache_response(job["system_prompt"], job["user_prompt"], response, metadata)
+
+        fortune_system = self.fortune_teller.plugin_manager.get_plugin(job["system"])
+        reading = fortune_system.format_result(response)
+        reading["metadata"] = {
+            "system_name": job["system"],
+            "timestamp": datetime.datetime.now().isoformat(),
+            "llm_metadata": metadata,
+            "inputs": {k: str(v) for k, v in job["inputs"].items()}
+        }
+        record["result"] = reading
+
+        # Save the reading with the chart its prompt was built from
+        result_id = job["result_id"]
+        self.result_store.put(result_id, frontend_result(job["system"], reading, frontend_request(job["inputs"]),
+                                                         result_id, job["processed_data"]))
+        record["result_id"] = result_id
+        return record
+
+
+def main():
+    """Entry point of the batch pipeline command."""
+    # 解析命令行参数
+    parser = argparse.ArgumentParser(description="霄占批量离线解读 (提供商批处理接口)")
+    parser.add_argument("jobs", help="任务JSONL文件，每行包含 id、system 和 inputs")
+    parser.add_argument("--work-dir", default="batch_work", help="工作目录，保存批处理文件和断点 (默认: batch_work)")
+    parser.add_argument("--config", "-c", help="配置文件路径")
+    parser.add_argument("--poll-interval", type=float, default=60.0, help="轮询间隔秒数 (默认: 60)")
+    parser.add_argument("--timeout", type=float, help="等待批处理完成的最长秒数")
+
+    args = parser.parse_args()
+
+    from fortune_teller.main import FortuneTeller
+    fortune_teller = FortuneTeller(args.config)
+    configure_logging(fortune_teller.config_manager.get_config("logging"))
+    backend = create_batch_backend(fortune_teller.config_manager.get_config("llm"), args.work_dir)
+    pipeline = BatchPipeline(fortune_teller, backend, args.work_dir,
+                             poll_interval=args.poll_interval, timeout=args.timeout)
+
+    summary = pipeline.run(args.jobs)
+    print(f"完成: 共 {summary['total']} 个任务，成功 {summary['succeeded']} 个"
+          f"（其中缓存命中 {summary['cached']} 个），失败 {summary['failed']} 个")
+    print(f"结果文件: {pipeline.results_path}")
+
+
+if __name__ == "__main__":
+    main()
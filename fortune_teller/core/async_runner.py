@@ -0,0 +1,184 @@
+"""
+Background event loop shared by the LLM connectors.
+Lets synchronous callers (CLI, WSGI threads) and foreign event loops
+(ASGI servers) drive the same asyncio-based provider clients.
+"""
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from typing import Any, AsyncIterator, Awaitable, Generator, Optional
+
+# Configure logging
+logger = logging.getLogger("AsyncRunner")
+
+
+async def _anext(agen: AsyncIterator[Any]) -> Any:
+    """Wrap __anext__ in a coroutine so it can be scheduled across threads."""
+    return await agen.__anext__()
+
+
+async def _aclose(agen: AsyncIterator[Any]) -> None:
+    """Wrap aclose in a coroutine so it can be scheduled across threads."""
+    await agen.aclose()
+
+
+class AsyncRunner:
+    """
+    Runs coroutines on a dedicated daemon thread with its own event loop.
+    All provider I/O happens on this loop so async clients and their
+    connection pools are never shared between loops.
+    """
+
+    def __init__(self, name: str = "llm-event-loop"):
+        """
+        Initialize the runner. The loop thread is started on first use.
+
+        Args:
+            name: Name of the loop thread
+        """
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The runner's event loop, started lazily."""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    ready = threading.Event()
+                    self._thread = threading.Thread(
+                        target=self._run_loop, args=(loop, ready), name=self.name, daemon=True
+                    )
+                    self._thread.start()
+                    ready.wait()
+                    self._loop = loop
+                    logger.debug(f"Started event loop thread {self.name}")
+        return self._loop
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop, ready: threading.Event) -> None:
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        loop.run_forever()
+
+    def in_loop_thread(self) -> bool:
+        """Whether the caller is running on the runner's own thread."""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the loop and block until it finishes.
+
+        Args:
+            coro: Coroutine to run
+            timeout: Seconds to wait, or None to wait forever
+
+        Returns:
+            Result of the coroutine
+        """
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("AsyncRunner.run() cannot be called from the runner's own loop")
+
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except (KeyboardInterrupt, concurrent.futures.TimeoutError):
+            # Propagate the interruption to the coroutine and let it unwind
+            future.cancel()
+            concurrent.futures.wait([future], timeout=5)
+            raise
+
+    def iterate(self, agen: AsyncIterator[Any]) -> Generator[Any, None, None]:
+        """
+        Expose an async generator as a blocking generator.
+        Closing the returned generator closes the async generator as well.
+
+        Args:
+            agen: Async generator to drive on the loop
+
+        Returns:
+            Generator yielding the same items
+        """
+        try:
+            while True:
+                try:
+                    item = self.run(_anext(agen))
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            try:
+                self.run(_aclose(agen))
+            except Exception as e:
+                logger.debug(f"Error closing async generator: {e}")
+
+    async def bridge(self, coro: Awaitable[Any]) -> Any:
+        """
+        Await a coroutine on the runner's loop from any event loop.
+
+        Args:
+            coro: Coroutine to run
+
+        Returns:
+            Result of the coroutine
+        """
+        if self.in_loop_thread():
+            return await coro
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return await asyncio.wrap_future(future)
+
+    async def bridge_iter(self, agen: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """
+        Iterate an async generator on the runner's loop from any event loop.
+
+        Args:
+            agen: Async generator to drive on the loop
+
+        Returns:
+            Async generator yielding the same items
+        """
+        if self.in_loop_thread():
+            try:
+                async for item in agen:
+                    yield item
+            finally:
+                await agen.aclose()
+            return
+
+        try:
+            while True:
+                try:
+                    item = await self.bridge(_anext(agen))
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            try:
+                await self.bridge(_aclose(agen))
+            except Exception as e:
+                logger.debug(f"Error closing async generator: {e}")
+
+
+# Runner shared by every connector in the process
+_shared_runner: Optional[AsyncRunner] = None
+_shared_runner_lock = threading.Lock()
+
+
+def get_runner() -> AsyncRunner:
+    """
+    Get the process-wide runner used by the LLM connectors.
+
+    Returns:
+        Shared AsyncRunner instance
+    """
+    global _shared_runner
+    if _shared_runner is None:
+        with _shared_runner_lock:
+            if _shared_runner is None:
+                _shared_runner = AsyncRunner()
+    return _shared_runner
@@ -4,10 +4,13 @@ AWS Bedrock LLM Connector for Fortune Teller application.
 import os
 import json
 import logging
-import boto3
-import time
-import re
-from typing import Dict, Any, Tuple, Generator
+from .client_pool import get_bedrock_client, get_bedrock_executor
+from .llm_backend import EPHEMERAL_CACHE_CONTROL, log_prompt_cache_usage, prompt_cache_usage
+from .structured_logging import log_llm_request
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, Optional, Tuple, Generator, AsyncGenerator
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
@@ -33,77 +36,109 @@ class AWSBedrockConnector:
         self.temperature = self.config.get("temperature", 0.7)
         self.max_tokens = self.config.get("max_tokens", 2000)
         self.region = self.config.get("region", "us-west-2")
+        # Optional endpoint override, e.g. the local mock LLM server
+        self.endpoint_url = self.config.get("endpoint_url")
+        # Mark the system prompt as a cacheable prefix; turned off if the model rejects it
+        self.prompt_cache = self.config.get("prompt_cache", True)
         
         # AWS credentials from config or environment variables
         self.aws_access_key = self.config.get("aws_access_key") or os.environ.get("AWS_ACCESS_KEY_ID")
         self.aws_secret_key = self.config.get("aws_secret_key") or os.environ.get("AWS_SECRET_ACCESS_KEY")
         self.aws_session_token = self.config.get("aws_session_token") or os.environ.get("AWS_SESSION_TOKEN")
         
-        # Initialize boto3 client
+        # boto3 is blocking, so the async interface runs calls on a thread pool
+        # shared by every connector with the same concurrency
+        self.max_concurrency = self.config.get("max_concurrency", 64)
+        self._executor = get_bedrock_executor(self.max_concurrency)
+        
+        # The boto3 client is created in the background: resolving credentials can
+        # involve network calls (e.g. the instance metadata service), and startup
+        # should only pay for local work. The first request waits for it.
+        self._client = None
+        self._client_future: Optional[Future] = None
+        self._client_lock = threading.Lock()
         self._initialize_client()
         
         logger.info(f"AWS Bedrock connector initialized with model: {self.model}")
     
-    def _initialize_client(self):
-        """Initialize the boto3 client for AWS Bedrock."""
+    @property
+    def client(self) -> Any:
+        """
+        The bedrock-runtime client, waiting for its background creation if needed.
+        None if it could not be created; the outcome is cached until the region changes.
+        """
+        with self._client_lock:
+            future = self._client_future
+        if future is not None:
+            future.result()
+        return self._client
+    
+    @client.setter
+    def client(self, client: Any) -> None:
+        with self._client_lock:
+            self._client_future = None
+            self._client = client
+    
+    def _initialize_client(self) -> None:
+        """Start creating the boto3 client for the current region in the background."""
+        with self._client_lock:
+            self._client = None
+            self._client_future = self._executor.submit(self._create_client, self.region)
+    
+    def _create_client(self, region: str) -> None:
+        """Create (or reuse) the pooled bedrock-runtime client of a region."""
         try:
-            # Log the initialization attempt with more details
-            logger.info(f"Initializing AWS Bedrock client with region: {self.region}")
-            
-            # Create boto3 session
-            session_args = {
-                'region_name': self.region
-            }
-            
-            # Only add credentials if they are provided
-            if self.aws_access_key:
-                logger.debug("Using provided AWS access key")
-                session_args['aws_access_key_id'] = self.aws_access_key
-            
-            if self.aws_secret_key:
-                logger.debug("Using provided AWS secret key")
-                session_args['aws_secret_access_key'] = self.aws_secret_key
-                
-            if self.aws_session_token:
-                logger.debug("Using provided AWS session token")
-                session_args['aws_session_token'] = self.aws_session_token
-                
-            # Create the session
-            session = boto3.Session(**session_args)
-            
-            # Get credentials used by the session for debugging
-            creds = session.get_credentials()
-            if creds:
-                logger.debug(f"Session created with credentials from: {creds.method}")
-            else:
-                logger.warning("Session created but no credentials were found")
-            
-            # Create the bedrock-runtime client
-            self.client = session.client('bedrock-runtime')
+            logger.info(f"Initializing AWS Bedrock client with region: {region}")
+            if self.endpoint_url:
+                logger.info(f"Using Bedrock endpoint: {self.endpoint_url}")
             
-            # Verify the client by making a simple API call
-            try:
-                self.client.list_model_customization_jobs(maxResults=1)
-                logger.info("AWS Bedrock client verified and ready to use")
-            except Exception as verify_error:
-                # This is expected to fail with access denied if the user doesn't have permission,
-                # but it proves the client can make API calls
-                if "AccessDenied" in str(verify_error):
-                    logger.info("Client initialized (limited permissions detected)")
-                else:
-                    logger.warning(f"Client initialized but verification failed: {verify_error}")
-                    
+            # Shared pooled client: connectors and region switches reuse its connections,
+            # and the pool is sized for every worker thread of the executor
+            client = get_bedrock_client(
+                region,
+                endpoint_url=self.endpoint_url,
+                access_key=self.aws_access_key,
+                secret_key=self.aws_secret_key,
+                session_token=self.aws_session_token,
+                max_pool_connections=self.max_concurrency
+            )
+            logger.info("AWS Bedrock client ready")
         except Exception as e:
             logger.error(f"Failed to initialize AWS Bedrock client: {e}")
             import traceback
             logger.debug(f"AWS client initialization traceback: {traceback.format_exc()}")
-            self.client = None
+            client = None
+        
+        with self._client_lock:
+            # Ignore the result if the region changed in the meantime
+            if region == self.region:
+                self._client = client
     
     def generate_response(self, 
                          system_prompt: str, 
                          user_prompt: str) -> Tuple[str, Dict[str, Any]]:
         """
         Generate a response from the AWS-hosted Anthropic Claude model.
+        API errors are returned as an error message with an "error" metadata entry.
+        
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            
+        Returns:
+            Tuple of (text response, metadata)
+        """
+        try:
+            return self._invoke_model(system_prompt, user_prompt)
+        except Exception as e:
+            error_msg = f"AWS Bedrock API error: {str(e)}"
+            logger.error(error_msg)
+            return f"Error: {str(e)}", {"error": str(e)}
+    
+    def _invoke_model(self, system_prompt: str, user_prompt: str) -> Tuple[str, Dict[str, Any]]:
+        """
+        Call the non-streaming invoke API. API errors are raised so that the
+        caller can classify and retry them.
         
         Args:
             system_prompt: System prompt for the LLM
@@ -112,167 +147,209 @@ class AWSBedrockConnector:
         Returns:
             Tuple of (text response, metadata)
         """
-        # Log the prompts for AWS Bedrock debugging
-        logger.info("--- AWS BEDROCK REQUEST BEGIN ---")
-        logger.info(f"MODEL: {self.model}")
-        logger.info(f"REGION: {self.region}")
-        logger.info("SYSTEM PROMPT:")
-        logger.info(system_prompt)
-        logger.info("USER PROMPT:")
-        logger.info(user_prompt)
-        logger.info("--- AWS BEDROCK REQUEST END ---")
+        # Prompt hashes only; full prompts are logged at DEBUG or for sampled requests
+        log_llm_request(logger, "bedrock_request", system_prompt, user_prompt, model=self.model, region=self.region)
         
         if self.client is None:
-            return "Error: AWS Bedrock client not initialized", {"error": "Client not initialized"}
+            raise RuntimeError("AWS Bedrock client not initialized")
         
-        try:
-            # Format the request body for Claude model on AWS Bedrock
-            # Check if we're using Claude 3.7
-            is_claude_3_7 = "claude-3-7" in self.model.lower()
+        # Determine if this is a model ID or inference profile ARN
+        if self.model.startswith("arn:"):
+            # Use inference profile ARN
+            response = self._invoke(
+                self.client.invoke_model,
+                system_prompt,
+                user_prompt,
+                contentType="application/json",
+                accept="application/json"
+            )
             
-            if is_claude_3_7:
-                # Special format for Claude 3.7
-                request_body = {
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": self.max_tokens,
-                    "top_k": 250,
-                    "stop_sequences": [],
-                    "temperature": self.temperature,
-                    "top_p": 0.999,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": user_prompt
-                                }
-                            ]
-                        }
-                    ]
-                }
-                
-                # Add system prompt if provided
-                if system_prompt:
-                    request_body["system"] = system_prompt
-            else:
-                # Standard format for other Claude models
-                request_body = {
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": self.max_tokens,
-                    "temperature": self.temperature,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": user_prompt
-                        }
-                    ],
-                    "system": system_prompt  # For AWS Bedrock, system prompt is a separate field
-                }
+            # Parse the non-streaming response
+            raw_response = response['body'].read()
+            logger.debug("Raw response from AWS Bedrock: %s", raw_response)
             
-            # Determine if this is a model ID or inference profile ARN
-            if self.model.startswith("arn:"):
-                # Use inference profile ARN
-                response = self.client.invoke_model(
-                    modelId=self.model,
-                    body=json.dumps(request_body),
-                    contentType="application/json",
-                    accept="application/json"
-                )
-                
-                # Parse the non-streaming response
-                raw_response = response['body'].read()
-                logger.debug(f"Raw response from AWS Bedrock: {raw_response}")
-                
-                try:
-                    response_body = json.loads(raw_response)
-                    logger.debug(f"Parsed response body: {json.dumps(response_body, indent=2)}")
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse response as JSON: {e}")
-                    return f"Error parsing response from AWS Bedrock: {str(e)}", {"error": str(e)}
-                
-                # Debug log the entire response structure
-                logger.info(f"AWS Bedrock response structure: {json.dumps(response_body, indent=2)}")
-                
-                # Handle different response formats based on the model and response structure
-                if "completion" in response_body:
-                    # Some inference profiles return in this format
-                    text_response = response_body.get("completion", "")
-                    logger.info("Using 'completion' field from response")
-                elif "content" in response_body:
-                    if isinstance(response_body["content"], list):
-                        content_items = response_body["content"]
-                        text_pieces = []
-                        
-                        for item in content_items:
-                            if isinstance(item, dict):
-                                if item.get("type") == "text" and "text" in item:
-                                    text_pieces.append(item["text"])
-                            elif isinstance(item, str):
-                                text_pieces.append(item)
-                        
-                        if text_pieces:
-                            text_response = "\n".join(text_pieces)
-                            logger.info("Extracted text from content list items")
-                        else:
-                            text_response = f"Response format not recognized. Please check logs."
-                            logger.warning(f"Could not extract text from content: {response_body}")
-                    elif isinstance(response_body["content"], dict) and "text" in response_body["content"]:
-                        # Another potential format
-                        text_response = response_body["content"]["text"]
-                        logger.info("Using text from content dictionary")
+            try:
+                response_body = json.loads(raw_response)
+            except json.JSONDecodeError as e:
+                logger.error(f"Failed to parse response as JSON: {e}")
+                return f"Error parsing response from AWS Bedrock: {str(e)}", {"error": str(e)}
+            
+            # Debug log the response structure (keys only; the body can be large)
+            logger.debug("AWS Bedrock response fields: %s", list(response_body))
+            
+            # Handle different response formats based on the model and response structure
+            format_error = None
+            if "completion" in response_body:
+                # Some inference profiles return in this format
+                text_response = response_body.get("completion", "")
+                logger.info("Using 'completion' field from response")
+            elif "content" in response_body:
+                if isinstance(response_body["content"], list):
+                    content_items = response_body["content"]
+                    text_pieces = []
+                    
+                    for item in content_items:
+                        if isinstance(item, dict):
+                            if item.get("type") == "text" and "text" in item:
+                                text_pieces.append(item["text"])
+                        elif isinstance(item, str):
+                            text_pieces.append(item)
+                    
+                    if text_pieces:
+                        text_response = "\n".join(text_pieces)
+                        logger.info("Extracted text from content list items")
                     else:
-                        text_response = f"Unsupported response format: {response_body}"
-                        logger.warning(f"Unrecognized content format in response")
+                        text_response = f"Response format not recognized. Please check logs."
+                        format_error = "No text in response content"
+                        logger.warning(f"Could not extract text from content: {response_body}")
+                elif isinstance(response_body["content"], dict) and "text" in response_body["content"]:
+                    # Another potential format
+                    text_response = response_body["content"]["text"]
+                    logger.info("Using text from content dictionary")
                 else:
-                    # If we can't find any recognized structure, return raw body as string
-                    text_response = f"Unsupported response format from AWS Bedrock. Raw response: {raw_response}"
-                    logger.warning(f"Unrecognized response format from AWS Bedrock")
+                    text_response = f"Unsupported response format: {response_body}"
+                    format_error = "Unrecognized content format in response"
+                    logger.warning(f"Unrecognized content format in response")
+            else:
+                # If we can't find any recognized structure, return raw body as string
+                text_response = f"Unsupported response format from AWS Bedrock. Raw response: {raw_response}"
+                format_error = "Unrecognized response format from AWS Bedrock"
+                logger.warning(f"Unrecognized response format from AWS Bedrock")
+            
+            metadata = {
+                "model": self.model,
+                "finish_reason": response_body.get("stop_reason", "unknown"),
+                "usage": response_body.get("usage", {}),
+                "prompt_cache": prompt_cache_usage(response_body.get("usage", {}))
+            }
+            if format_error:
+                # Flagged like the other failures, so the text is never cached or saved as a reading
+                metadata["error"] = format_error
+        else:
+            # Use direct model ID
+            try:
+                response = self._invoke(self.client.invoke_model, system_prompt, user_prompt)
+                
+                # Parse the response
+                response_body = json.loads(response['body'].read())
+                text_response = response_body['content'][0]['text']
                 
                 metadata = {
                     "model": self.model,
-                    "finish_reason": "unknown",  # Streaming doesn't provide this directly
-                    "usage": {}  # Streaming doesn't provide usage information
+                    "finish_reason": response_body.get('stop_reason', 'unknown'),
+                    "usage": response_body.get('usage', {}),
+                    "prompt_cache": prompt_cache_usage(response_body.get('usage', {}))
                 }
-            else:
-                # Use direct model ID
-                try:
-                    response = self.client.invoke_model(
-                        modelId=self.model,
-                        body=json.dumps(request_body)
+            except Exception as e:
+                # If direct invocation fails, suggest using inference profiles
+                if "on-demand throughput isn't supported" in str(e):
+                    error_msg = (
+                        f"Error: 无法直接调用模型 {self.model}。AWS Bedrock 要求使用推理配置文件。\n"
+                        f"您需要在 AWS Bedrock 中创建一个推理配置文件，并使用该配置文件的 ARN 而不是直接使用模型 ID。\n"
+                        f"请参考项目根目录下的 INFERENCE_PROFILE_SETUP.md 文件了解如何创建推理配置文件。\n\n"
+                        f"推理配置文件 ARN 格式应为: arn:aws:bedrock:[region]:[account]:inference-profile/[profile-name]\n"
+                        f"请在 config.yaml 文件中更新 model 参数以使用推理配置文件 ARN。"
                     )
-                    
-                    # Parse the response
-                    response_body = json.loads(response['body'].read())
-                    text_response = response_body['content'][0]['text']
-                    
-                    metadata = {
-                        "model": self.model,
-                        "finish_reason": response_body.get('stop_reason', 'unknown'),
-                        "usage": response_body.get('usage', {})
+                    logger.error(error_msg)
+                    return error_msg, {"error": str(e)}
+                else:
+                    # Re-raise if it's a different error
+                    raise
+        
+        return text_response, metadata
+    
+    def _build_request_body(self, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
+        """
+        Build the Anthropic Messages request body for AWS Bedrock.
+        
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            
+        Returns:
+            Request body dictionary
+        """
+        # Check if we're using Claude 3.7
+        is_claude_3_7 = "claude-3-7" in self.model.lower()
+        
+        if is_claude_3_7:
+            # Special format for Claude 3.7
+            request_body = {
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": self.max_tokens,
+                "top_k": 250,
+                "stop_sequences": [],
+                "temperature": self.temperature,
+                "top_p": 0.999,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": user_prompt
+                            }
+                        ]
                     }
-                except Exception as e:
-                    # If direct invocation fails, suggest using inference profiles
-                    if "on-demand throughput isn't supported" in str(e):
-                        error_msg = (
-                            f"Error: 无法直接调用模型 {self.model}。AWS Bedrock 要求使用推理配置文件。\n"
-                            f"您需要在 AWS Bedrock 中创建一个推理配置文件，并使用该配置文件的 ARN 而不是直接使用模型 ID。\n"
-                            f"请参考项目根目录下的 INFERENCE_PROFILE_SETUP.md 文件了解如何创建推理配置文件。\n\n"
-                            f"推理配置文件 ARN 格式应为: arn:aws:bedrock:[region]:[account]:inference-profile/[profile-name]\n"
-                            f"请在 config.yaml 文件中更新 model 参数以使用推理配置文件 ARN。"
-                        )
-                        logger.error(error_msg)
-                        return error_msg, {"error": str(e)}
-                    else:
-                        # Re-raise if it's a different error
-                        raise
+                ]
+            }
             
-            return text_response, metadata
+            # Add system prompt if provided
+            if system_prompt:
+                request_body["system"] = self._system_field(system_prompt)
+        else:
+            # Standard format for other Claude models
+            request_body = {
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": self.max_tokens,
+                "temperature": self.temperature,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": user_prompt
+                    }
+                ],
+                "system": self._system_field(system_prompt)  # For AWS Bedrock, system prompt is a separate field
+            }
+        
+        return request_body
+    
+    def _system_field(self, system_prompt: str) -> Any:
+        """System prompt, as a cacheable content block when prompt caching is enabled."""
+        if self.prompt_cache and system_prompt:
+            return [{"type": "text", "text": system_prompt, "cache_control": EPHEMERAL_CACHE_CONTROL}]
+        return system_prompt
+    
+    def _invoke(self, operation: Callable[..., Any], system_prompt: str, user_prompt: str, **kwargs) -> Any:
+        """
+        Call a Bedrock invoke operation. If the model rejects prompt caching,
+        caching is turned off for this connector and the call is repeated once.
+        
+        Args:
+            operation: invoke_model or invoke_model_with_response_stream
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            **kwargs: Extra arguments for the operation
             
+        Returns:
+            Operation response
+        """
+        try:
+            return operation(
+                modelId=self.model,
+                body=json.dumps(self._build_request_body(system_prompt, user_prompt)),
+                **kwargs
+            )
         except Exception as e:
-            error_msg = f"AWS Bedrock API error: {str(e)}"
-            logger.error(error_msg)
-            return f"Error: {str(e)}", {"error": str(e)}
+            if not (self.prompt_cache and "ValidationException" in str(e) and "cach" in str(e).lower()):
+                raise
+            logger.warning(f"Model {self.model} does not accept prompt caching, disabling it: {e}")
+            self.prompt_cache = False
+            return operation(
+                modelId=self.model,
+                body=json.dumps(self._build_request_body(system_prompt, user_prompt)),
+                **kwargs
+            )
     
     def set_model(self, model: str) -> None:
         """
@@ -292,7 +369,7 @@ class AWSBedrockConnector:
             region: AWS region name
         """
         self.region = region
-        # Re-initialize the client with new region
+        # Switch to the pooled client of the new region (created on first use)
         self._initialize_client()
         logger.info(f"AWS region changed to {region}")
         
@@ -301,186 +378,195 @@ class AWSBedrockConnector:
                                    user_prompt: str) -> Generator[str, None, None]:
         """
         Generate a streaming response from AWS Bedrock.
+        Both plain model IDs and inference profile ARNs use the response-stream API,
+        and each content delta is yielded as soon as it arrives. API errors are
+        yielded as an error message.
+        
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            
+        Returns:
+            Generator yielding text chunks as they become available
+        """
+        try:
+            for chunk in self._stream_model(system_prompt, user_prompt):
+                yield chunk
+        except Exception as e:
+            error_msg = f"AWS Bedrock streaming API error: {str(e)}"
+            logger.error(error_msg)
+            yield f"\nError during streaming: {str(e)}"
+    
+    def _stream_model(self,
+                      system_prompt: str,
+                      user_prompt: str,
+                      on_open: Optional[Callable[[Any], None]] = None) -> Generator[str, None, None]:
+        """
+        Call the response-stream API. API errors, including errors raised in the
+        middle of the stream, are raised so that the caller can classify them.
+        Closing the generator closes the event stream and its HTTP connection.
         
         Args:
             system_prompt: System prompt for the LLM
             user_prompt: User prompt for the LLM
+            on_open: Called with the event stream once it is open
             
         Returns:
             Generator yielding text chunks as they become available
         """
-        # Log the prompts for AWS Bedrock debugging
-        logger.info("--- AWS BEDROCK STREAMING REQUEST BEGIN ---")
-        logger.info(f"MODEL: {self.model}")
-        logger.info(f"REGION: {self.region}")
-        logger.info("SYSTEM PROMPT:")
-        logger.info(system_prompt)
-        logger.info("USER PROMPT:")
-        logger.info(user_prompt)
-        logger.info("--- AWS BEDROCK STREAMING REQUEST END ---")
+        # Prompt hashes only; full prompts are logged at DEBUG or for sampled requests
+        log_llm_request(logger, "bedrock_stream_request", system_prompt, user_prompt, model=self.model, region=self.region)
         
         if self.client is None:
-            yield "Error: AWS Bedrock client not initialized"
-            return
+            raise RuntimeError("AWS Bedrock client not initialized")
         
         try:
-            # Format the request body for Claude model on AWS Bedrock
-            # Check if we're using Claude 3.7
-            is_claude_3_7 = "claude-3-7" in self.model.lower()
-            
-            if is_claude_3_7:
-                # Special format for Claude 3.7
-                request_body = {
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": self.max_tokens,
-                    "top_k": 250,
-                    "stop_sequences": [],
-                    "temperature": self.temperature,
-                    "top_p": 0.999,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": user_prompt
-                                }
-                            ]
-                        }
-                    ]
-                }
+            logger.debug(f"Starting response stream for model: {self.model}")
+            response_stream = self._invoke(
+                self.client.invoke_model_with_response_stream,
+                system_prompt,
+                user_prompt,
+                contentType="application/json",
+                accept="application/json"
+            )
+        except Exception as e:
+            logger.error(f"Error initiating streaming: {str(e)}")
+            if "on-demand throughput isn't supported" in str(e) or \
+                    "not supported" in str(e).lower() or "unsupported" in str(e).lower():
+                logger.warning("This model may not support streaming. Falling back to non-streaming method.")
+                text_response, metadata = self._invoke_model(system_prompt, user_prompt)
+                if "error" in metadata:
+                    # Raised rather than streamed so the text is never cached as a reading;
+                    # for on-demand models it explains how to set up an inference profile
+                    raise RuntimeError(text_response) from e
+                yield text_response
+                return
+            # Re-raise if it's a different error
+            raise
+        
+        # Process the streaming response
+        event_stream = response_stream.get("body", [])
+        if on_open is not None:
+            on_open(event_stream)
+        try:
+            for event in event_stream:
+                if "chunk" not in event:
+                    continue
                 
-                # Add system prompt if provided
-                if system_prompt:
-                    request_body["system"] = system_prompt
-            else:
-                # Standard format for other Claude models
-                request_body = {
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": self.max_tokens,
-                    "temperature": self.temperature,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": user_prompt
-                        }
-                    ],
-                    "system": system_prompt  # For AWS Bedrock, system prompt is a separate field
-                }
-            
-            # Determine if this is a model ID or inference profile ARN
-            if self.model.startswith("arn:"):
-                # Use inference profile ARN with streaming
+                raw_bytes = event["chunk"]["bytes"]
                 try:
-                    logger.debug(f"Attempting streaming with inference profile ARN: {self.model}")
-                    logger.debug(f"Request body: {json.dumps(request_body, indent=2)}")
-                    
+                    chunk_data = json.loads(raw_bytes)
+                except json.JSONDecodeError:
+                    # Don't yield raw bytes to avoid showing gibberish to users
+                    logger.warning(f"Failed to parse chunk as JSON: {raw_bytes[:200]}")
+                    continue
+                
+                if chunk_data.get("type") == "message_start":
+                    log_prompt_cache_usage(prompt_cache_usage(chunk_data.get("message", {}).get("usage", {})))
+                
+                text = self._extract_stream_text(chunk_data)
+                if text:
+                    yield text
+        finally:
+            # Stop the model generating further tokens if the consumer went away
+            if hasattr(event_stream, "close"):
+                event_stream.close()
+
+    def _extract_stream_text(self, chunk_data: Dict[str, Any]) -> str:
+        """
+        Extract the text delta from a decoded response-stream chunk.
+        
+        Args:
+            chunk_data: Decoded JSON chunk
+            
+        Returns:
+            Text contained in the chunk, or an empty string
+        """
+        # Messages API event stream (Claude 3 and later)
+        if "type" in chunk_data:
+            if chunk_data["type"] == "content_block_delta":
+                return chunk_data.get("delta", {}).get("text", "")
+            # Skip other message types like message_start, content_block_start, etc.
+            return ""
+        
+        # Handle older response formats
+        if "completion" in chunk_data:
+            # Claude 1/2 style
+            return chunk_data["completion"]
+        
+        if "content" in chunk_data:
+            content = chunk_data["content"]
+            if isinstance(content, list):
+                # Claude 3 style with content list
+                pieces = []
+                for content_item in content:
+                    if isinstance(content_item, dict) and content_item.get("type") == "text":
+                        pieces.append(content_item["text"])
+                    elif isinstance(content_item, str):
+                        pieces.append(content_item)
+                return "".join(pieces)
+            if isinstance(content, str):
+                return content
+            if isinstance(content, dict) and "text" in content:
+                return content["text"]
+        
+        # Log the unknown format but don't yield it to avoid showing JSON to users
+        logger.warning(f"Unknown chunk format: {json.dumps(chunk_data)[:200]}")
+        return ""
+
+    async def agenerate_response(self,
+                                 system_prompt: str,
+                                 user_prompt: str) -> Tuple[str, Dict[str, Any]]:
+        """
+        Generate a response without blocking the event loop.
+        API errors are raised so that the caller can classify and retry them.
+        
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            
+        Returns:
+            Tuple of (text response, metadata)
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._invoke_model, system_prompt, user_prompt
+        )
+
+    async def agenerate_response_streaming(self,
+                                           system_prompt: str,
+                                           user_prompt: str) -> AsyncGenerator[str, None]:
+        """
+        Generate a streaming response without blocking the event loop.
+        Each blocking read from the response stream runs on the connector's thread pool.
+        API errors are raised, also when they arrive in the middle of the stream.
+        
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            
+        Returns:
+            Async generator yielding text chunks as they become available
+        """
+        loop = asyncio.get_running_loop()
+        event_streams = []
+        stream = self._stream_model(system_prompt, user_prompt, on_open=event_streams.append)
+        finished = object()
+        try:
+            while True:
+                chunk = await loop.run_in_executor(self._executor, next, stream, finished)
+                if chunk is finished:
+                    break
+                yield chunk
+        finally:
+            try:
+                stream.close()
+            except ValueError:
+                # A worker thread is blocked reading the stream: closing the event
+                # stream underneath it drops the connection and ends the read
+                logger.debug("Bedrock stream still busy, closing its connection")
+                for event_stream in event_streams:
                     try:
-                        response_stream = self.client.invoke_model_with_response_stream(
-                            modelId=self.model,
-                            body=json.dumps(request_body),
-                            contentType="application/json",
-                            accept="application/json"
-                        )
-                        logger.debug("Successfully initiated streaming response")
+                        event_stream.close()
                     except Exception as e:
-                        logger.error(f"Error initiating streaming: {str(e)}")
-                        if "not supported" in str(e).lower() or "unsupported" in str(e).lower():
-                            logger.warning("This inference profile may not support streaming. Falling back to non-streaming method.")
-                            yield "【提示：此推理配置文件不支持流式输出，已退化为模拟流式】\n\n"
-                            
-                            # Fall back to non-streaming method and simulate streaming
-                            text_response, _ = self.generate_response(system_prompt, user_prompt)
-                            sentences = re.split(r'([.!?。！？]+\s*)', text_response)
-                            for i in range(0, len(sentences), 2):
-                                if i < len(sentences):
-                                    chunk = sentences[i]
-                                    if i+1 < len(sentences):
-                                        chunk += sentences[i+1]
-                                    if chunk.strip():
-                                        yield chunk
-                                        time.sleep(0.05)
-                            return
-                        else:
-                            # Re-raise if it's a different error
-                            raise
-                    
-                    # Process the streaming response
-                    logger.debug("Processing streaming response events")
-                    event_count = 0
-                    for event in response_stream.get("body", []):
-                        event_count += 1
-                        if "chunk" in event:
-                            try:
-                                raw_bytes = event["chunk"]["bytes"]
-                                logger.debug(f"Received chunk {event_count}: {raw_bytes[:100]}...")
-                                chunk_data = json.loads(raw_bytes)
-                                
-                                # Handle Claude 3.7+ JSON streaming format
-                                if "type" in chunk_data:
-                                    # This is the newer JSON streaming format
-                                    if chunk_data["type"] == "content_block_delta":
-                                        if "delta" in chunk_data and "text" in chunk_data["delta"]:
-                                            yield chunk_data["delta"]["text"]
-                                    # Skip other message types like message_start, content_block_start, etc.
-                                    continue
-                                
-                                # Handle older response formats
-                                if "completion" in chunk_data:
-                                    # Claude 1/2 style
-                                    yield chunk_data["completion"]
-                                elif "content" in chunk_data:
-                                    if isinstance(chunk_data["content"], list):
-                                        # Claude 3 style with content list
-                                        for content_item in chunk_data["content"]:
-                                            if isinstance(content_item, dict) and content_item.get("type") == "text":
-                                                yield content_item["text"]
-                                            elif isinstance(content_item, str):
-                                                yield content_item
-                                    elif isinstance(chunk_data["content"], str):
-                                        # Some formats might have direct string content
-                                        yield chunk_data["content"]
-                                    elif isinstance(chunk_data["content"], dict) and "text" in chunk_data["content"]:
-                                        # Yet another possible format
-                                        yield chunk_data["content"]["text"]
-                                else:
-                                    # Log the unknown format but don't yield it to avoid showing JSON to users
-                                    logger.warning(f"Unknown chunk format: {json.dumps(chunk_data)[:200]}")
-                            except json.JSONDecodeError:
-                                logger.warning(f"Failed to parse chunk as JSON: {event['chunk']['bytes'][:200]}")
-                                # Don't yield raw bytes to avoid showing gibberish to users
-                except Exception as e:
-                    error_msg = f"Error during AWS Bedrock streaming: {str(e)}"
-                    logger.error(error_msg)
-                    yield f"\n{error_msg}"
-            else:
-                
-                # Try to use non-streaming API and simulate streaming
-                try:
-                    # Get complete response
-                    text_response, _ = self.generate_response(system_prompt, user_prompt)
-                    
-                    # Simulate streaming by yielding chunks of the response
-                    import re
-                    # Split by sentences for Chinese and English
-                    sentences = re.split(r'([.!?。！？]+\s*)', text_response)
-                    
-                    # Yield each sentence (with its punctuation if available)
-                    for i in range(0, len(sentences), 2):
-                        if i < len(sentences):
-                            chunk = sentences[i]
-                            if i+1 < len(sentences):  # Add punctuation if available
-                                chunk += sentences[i+1]
-                            if chunk.strip():  # Only yield non-empty chunks
-                                yield chunk
-                                # Small delay to simulate streaming
-                                import time
-                                time.sleep(0.05)
-                except Exception as e:
-                    error_msg = f"Error during simulated streaming: {str(e)}"
-                    logger.error(error_msg)
-                    yield f"\n{error_msg}"
-        except Exception as e:
-            error_msg = f"AWS Bedrock streaming API error: {str(e)}"
-            logger.error(error_msg)
-            yield f"\nError during streaming: {str(e)}"
+                        logger.debug(f"Error closing Bedrock event stream: {e}")
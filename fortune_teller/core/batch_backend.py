@@ -0,0 +1,335 @@
+"""
+Batch inference backends for offline jobs.
+A batch is a JSONL file of prompt requests that a provider processes
+asynchronously, usually at a lower price than real-time calls. Backends
+translate the common request format to the provider's batch API and
+normalize the results back.
+
+Request lines: {"custom_id", "system_prompt", "user_prompt", "model",
+"temperature", "max_tokens"}
+Result lines: {"custom_id", "response", "metadata"} or {"custom_id", "error"}
+"""
+import os
+import json
+import uuid
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Iterator, List
+
+from .mock_connector import MockConnector
+
+# Configure logging
+logger = logging.getLogger("BatchBackend")
+
+# Normalized batch states
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read the records of a JSONL file, skipping blank lines.
+
+    Args:
+        path: File path
+
+    Returns:
+        Iterator of records
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_jsonl(path: str, records: List[Dict[str, Any]]) -> None:
+    """
+    Write records to a JSONL file atomically.
+
+    Args:
+        path: File path
+        records: Records to write
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(temp_path, path)
+
+
+class BatchBackend(ABC):
+    """Base class for batch inference backends."""
+
+    @abstractmethod
+    def submit(self, input_path: str) -> str:
+        """
+        Submit a batch.
+
+        Args:
+            input_path: JSONL file of request lines
+
+        Returns:
+            Batch ID
+        """
+
+    @abstractmethod
+    def status(self, batch_id: str) -> str:
+        """
+        Get the state of a batch.
+
+        Args:
+            batch_id: Batch ID
+
+        Returns:
+            IN_PROGRESS, COMPLETED or FAILED
+        """
+
+    @abstractmethod
+    def download(self, batch_id: str, output_path: str) -> int:
+        """
+        Write the results of a completed batch as result lines.
+
+        Args:
+            batch_id: Batch ID
+            output_path: JSONL file to write
+
+        Returns:
+            Number of results written
+        """
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    File-based stand-in for a provider batch API, answering with mock
+    responses. Batches are processed on the first status poll after
+    ``polls_until_done`` polls, so polling and resuming can be exercised.
+    """
+
+    def __init__(self, work_dir: str, mock_config: Dict[str, Any] = None, polls_until_done: int = 0):
+        """
+        Initialize the local batch backend.
+
+        Args:
+            work_dir: Directory holding submitted batches and their results
+            mock_config: Mock connector configuration (``llm.mock``)
+            polls_until_done: Number of polls that report the batch as in progress
+        """
+        self.work_dir = work_dir
+        self.polls_until_done = polls_until_done
+        self._mock = MockConnector(mock_config)
+        os.makedirs(work_dir, exist_ok=True)
+
+    def _path(self, batch_id: str, suffix: str) -> str:
+        return os.path.join(self.work_dir, f"{batch_id}.{suffix}")
+
+    def _load_state(self, batch_id: str) -> Dict[str, Any]:
+        with open(self._path(batch_id, "state.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_state(self, batch_id: str, state: Dict[str, Any]) -> None:
+        with open(self._path(batch_id, "state.json"), "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+    def submit(self, input_path: str) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        write_jsonl(self._path(batch_id, "input.jsonl"), list(read_jsonl(input_path)))
+        self._save_state(batch_id, {"status": IN_PROGRESS, "polls": 0})
+        logger.info(f"Submitted local batch {batch_id}")
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        state = self._load_state(batch_id)
+        if state["status"] != IN_PROGRESS:
+            return state["status"]
+
+        state["polls"] += 1
+        if state["polls"] > self.polls_until_done:
+            results = []
+            for request in read_jsonl(self._path(batch_id, "input.jsonl")):
+                response, metadata = self._mock.generate_response(request["system_prompt"], request["user_prompt"])
+                results.append({"custom_id": request["custom_id"], "response": response, "metadata": metadata})
+            write_jsonl(self._path(batch_id, "output.jsonl"), results)
+            state["status"] = COMPLETED
+        self._save_state(batch_id, state)
+        return state["status"]
+
+    def download(self, batch_id: str, output_path: str) -> int:
+        results = list(read_jsonl(self._path(batch_id, "output.jsonl")))
+        write_jsonl(output_path, results)
+        return len(results)
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """OpenAI Batch API (chat completions, 24 hour completion window)."""
+
+    # Normalized states of the final OpenAI batch statuses
+    _STATES = {
+        "completed": COMPLETED,
+        "failed": FAILED,
+        "expired": FAILED,
+        "cancelled": FAILED,
+    }
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Initialize the OpenAI batch backend.
+
+        Args:
+            config: LLM configuration (api_key, base_url)
+        """
+        from openai import OpenAI
+        api_key = config.get("api_key") or os.environ.get("OPENAI_API_KEY")
+        self.client = OpenAI(api_key=api_key, base_url=config.get("base_url"))
+
+    def submit(self, input_path: str) -> str:
+        provider_path = f"{input_path}.openai"
+        write_jsonl(provider_path, [
+            {
+                "custom_id": request["custom_id"],
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": request["model"],
+                    "messages": [
+                        {"role": "system", "content": request["system_prompt"]},
+                        {"role": "user", "content": request["user_prompt"]}
+                    ],
+                    "temperature": request["temperature"],
+                    "max_tokens": request["max_tokens"]
+                }
+            }
+            for request in read_jsonl(input_path)
+        ])
+        with open(provider_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        logger.info(f"Submitted OpenAI batch {batch.id}")
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self._STATES.get(self.client.batches.retrieve(batch_id).status, IN_PROGRESS)
+
+    def download(self, batch_id: str, output_path: str) -> int:
+        batch = self.client.batches.retrieve(batch_id)
+        results = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if line.strip():
+                    results.append(self._normalize(json.loads(line)))
+        write_jsonl(output_path, results)
+        return len(results)
+
+    @staticmethod
+    def _normalize(line: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert an OpenAI batch output line to a result line."""
+        response = line.get("response") or {}
+        body = response.get("body") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or body.get("error") or {}
+            return {"custom_id": line["custom_id"], "error": error.get("message", str(error))}
+        choice = body["choices"][0]
+        return {
+            "custom_id": line["custom_id"],
+            "response": choice["message"]["content"],
+            "metadata": {
+                "model": body.get("model"),
+                "usage": body.get("usage"),
+                "finish_reason": choice.get("finish_reason"),
+                "batch": True
+            }
+        }
+
+
+class AnthropicBatchBackend(BatchBackend):
+    """Anthropic Message Batches API."""
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Initialize the Anthropic batch backend.
+
+        Args:
+            config: LLM configuration (api_key, base_url)
+        """
+        import anthropic
+        api_key = config.get("api_key") or os.environ.get("ANTHROPIC_API_KEY")
+        self.client = anthropic.Anthropic(api_key=api_key, base_url=config.get("base_url"))
+
+    def submit(self, input_path: str) -> str:
+        batch = self.client.messages.batches.create(requests=[
+            {
+                "custom_id": request["custom_id"],
+                "params": {
+                    "model": request["model"],
+                    "max_tokens": request["max_tokens"],
+                    "temperature": request["temperature"],
+                    "system": request["system_prompt"],
+                    "messages": [{"role": "user", "content": request["user_prompt"]}]
+                }
+            }
+            for request in read_jsonl(input_path)
+        ])
+        logger.info(f"Submitted Anthropic message batch {batch.id}")
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        batch = self.client.messages.batches.retrieve(batch_id)
+        if batch.processing_status != "ended":
+            return IN_PROGRESS
+        # Individual failures are reported per request in the results
+        return COMPLETED
+
+    def download(self, batch_id: str, output_path: str) -> int:
+        results = []
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type != "succeeded":
+                error = getattr(entry.result, "error", None)
+                results.append({"custom_id": entry.custom_id, "error": str(error or entry.result.type)})
+                continue
+            message = entry.result.message
+            results.append({
+                "custom_id": entry.custom_id,
+                "response": message.content[0].text,
+                "metadata": {
+                    "model": message.model,
+                    "usage": {
+                        "input_tokens": message.usage.input_tokens,
+                        "output_tokens": message.usage.output_tokens
+                    },
+                    "finish_reason": message.stop_reason,
+                    "batch": True
+                }
+            })
+        write_jsonl(output_path, results)
+        return len(results)
+
+
+def create_batch_backend(config: Dict[str, Any], work_dir: str) -> BatchBackend:
+    """
+    Create the batch backend for an LLM configuration.
+
+    Args:
+        config: LLM configuration; ``provider`` selects the backend ("mock" or
+            "local" use the file-based stand-in) and ``mock`` configures it
+        work_dir: Working directory of the batch job
+
+    Returns:
+        Batch backend
+
+    Raises:
+        ValueError: If the provider has no batch API support
+    """
+    provider = config.get("provider", "mock")
+    if provider in ("mock", "local"):
+        return LocalBatchBackend(os.path.join(work_dir, "local_batches"), config.get("mock"))
+    if provider == "openai":
+        return OpenAIBatchBackend(config)
+    if provider == "anthropic":
+        return AnthropicBatchBackend(config)
+    raise ValueError(f"Batch inference is not supported for provider: {provider}")
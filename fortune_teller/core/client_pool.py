@@ -0,0 +1,223 @@
+"""
+Shared, pooled provider clients.
+Clients are created once per provider, endpoint, credentials and pool
+settings and reused by every backend and connector in the process, so
+their keep-alive connections (and the TLS sessions on them) are shared
+instead of being set up again for each connector or provider switch.
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger("ClientPool")
+
+# Connection pool defaults (llm.http_pool)
+DEFAULT_MAX_CONNECTIONS = 64
+DEFAULT_MAX_KEEPALIVE = 32
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+
+
+def pool_settings(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Read the connection pool settings.
+
+    Args:
+        config: ``llm.http_pool`` section; missing keys use the defaults
+
+    Returns:
+        Dictionary with max_connections, max_keepalive and keepalive_expiry
+    """
+    config = config or {}
+    return {
+        "max_connections": int(config.get("max_connections", DEFAULT_MAX_CONNECTIONS)),
+        "max_keepalive": int(config.get("max_keepalive", DEFAULT_MAX_KEEPALIVE)),
+        "keepalive_expiry": float(config.get("keepalive_expiry", DEFAULT_KEEPALIVE_EXPIRY)),
+    }
+
+
+def secret_fingerprint(secret: Optional[str]) -> str:
+    """Identify a credential in a registry key without keeping the credential itself."""
+    if not secret:
+        return ""
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()[:16]
+
+
+class ClientRegistry:
+    """
+    Process-wide clients keyed by everything that makes two clients differ.
+    """
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._clients: Dict[Tuple[Any, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[Any, ...], factory: Callable[[], Any]) -> Any:
+        """
+        Get the client for a key, creating it on first use.
+
+        Args:
+            key: Hashable client identity
+            factory: Creates the client; called at most once per key
+
+        Returns:
+            Shared client
+        """
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = factory()
+                self._clients[key] = client
+                logger.info(f"Created pooled client for {key[0]}")
+            return client
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._clients)
+
+
+# Registry shared by every backend in the process
+_registry = ClientRegistry()
+
+
+def get_client_registry() -> ClientRegistry:
+    """
+    Get the process-wide client registry.
+
+    Returns:
+        Shared ClientRegistry instance
+    """
+    return _registry
+
+
+def _httpx_client(settings: Dict[str, Any]) -> Any:
+    """Async HTTP client with an explicitly sized keep-alive pool (httpx ships with the SDKs)."""
+    import httpx
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings["max_connections"],
+            max_keepalive_connections=settings["max_keepalive"],
+            keepalive_expiry=settings["keepalive_expiry"],
+        ),
+        timeout=httpx.Timeout(600.0, connect=10.0),
+    )
+
+
+def get_openai_client(api_key: Optional[str], base_url: Optional[str], pool: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Shared AsyncOpenAI client (also used for OpenAI-compatible providers such as DeepSeek).
+
+    Args:
+        api_key: API key
+        base_url: API base URL, or None for the OpenAI default
+        pool: ``llm.http_pool`` settings
+
+    Returns:
+        AsyncOpenAI client
+
+    Raises:
+        ImportError: If the openai package is not installed
+    """
+    from openai import AsyncOpenAI
+    settings = pool_settings(pool)
+    key = ("openai", base_url, secret_fingerprint(api_key), tuple(sorted(settings.items())))
+    return _registry.get(key, lambda: AsyncOpenAI(
+        api_key=api_key, base_url=base_url, max_retries=0, http_client=_httpx_client(settings)
+    ))
+
+
+def get_anthropic_client(api_key: Optional[str], base_url: Optional[str], pool: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Shared AsyncAnthropic client.
+
+    Args:
+        api_key: API key
+        base_url: API base URL, or None for the Anthropic default
+        pool: ``llm.http_pool`` settings
+
+    Returns:
+        AsyncAnthropic client
+
+    Raises:
+        ImportError: If the anthropic package is not installed
+    """
+    import anthropic
+    settings = pool_settings(pool)
+    key = ("anthropic", base_url, secret_fingerprint(api_key), tuple(sorted(settings.items())))
+    return _registry.get(key, lambda: anthropic.AsyncAnthropic(
+        api_key=api_key, base_url=base_url, max_retries=0, http_client=_httpx_client(settings)
+    ))
+
+
+def get_bedrock_client(region: str,
+                       endpoint_url: Optional[str] = None,
+                       access_key: Optional[str] = None,
+                       secret_key: Optional[str] = None,
+                       session_token: Optional[str] = None,
+                       max_pool_connections: int = DEFAULT_MAX_CONNECTIONS) -> Any:
+    """
+    Shared bedrock-runtime client. boto3 clients are thread-safe, so the
+    connector's worker threads share its urllib3 pool; the pool must be at
+    least as large as the number of workers or they queue for connections.
+
+    Args:
+        region: AWS region
+        endpoint_url: Endpoint override, e.g. the local mock LLM server
+        access_key: AWS access key ID, or None for the default credential chain
+        secret_key: AWS secret access key
+        session_token: AWS session token for temporary credentials
+        max_pool_connections: Size of the HTTP connection pool
+
+    Returns:
+        boto3 bedrock-runtime client
+
+    Raises:
+        ImportError: If boto3 is not installed
+    """
+    import boto3
+    from botocore.config import Config
+
+    def create() -> Any:
+        session_args = {"region_name": region}
+        if access_key:
+            session_args["aws_access_key_id"] = access_key
+        if secret_key:
+            session_args["aws_secret_access_key"] = secret_key
+        if session_token:
+            session_args["aws_session_token"] = session_token
+        session = boto3.Session(**session_args)
+
+        # Retries are handled by the connector layer (see core/resilience.py)
+        client_args = {"config": Config(
+            retries={"total_max_attempts": 1, "mode": "standard"},
+            max_pool_connections=max_pool_connections,
+            tcp_keepalive=True,
+        )}
+        if endpoint_url:
+            client_args["endpoint_url"] = endpoint_url
+        return session.client("bedrock-runtime", **client_args)
+
+    key = ("aws_bedrock", region, endpoint_url, secret_fingerprint(access_key),
+           secret_fingerprint(secret_key), secret_fingerprint(session_token), max_pool_connections)
+    return _registry.get(key, create)
+
+
+def get_bedrock_executor(max_workers: int = DEFAULT_MAX_CONNECTIONS) -> ThreadPoolExecutor:
+    """
+    Shared thread pool running the blocking boto3 calls of Bedrock connectors.
+    Connectors with the same concurrency share one pool, so re-initializing a
+    client or switching providers does not leave idle worker threads behind.
+
+    Args:
+        max_workers: Maximum number of concurrent calls
+
+    Returns:
+        Shared thread pool
+    """
+    def create() -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bedrock")
+
+    return _registry.get(("bedrock_executor", max_workers), create)
@@ -0,0 +1,356 @@
+"""
+A single LLM provider/model pair and its client.
+LLMConnector holds an ordered list of backends for hedging and failover.
+"""
+import os
+import logging
+from typing import Dict, Any, Optional, Tuple, AsyncGenerator
+
+from .client_pool import get_anthropic_client, get_openai_client
+from .mock_connector import MockConnector
+
+# Configure logging
+logger = logging.getLogger("LLMBackend")
+
+# Marks the end of a cacheable prompt prefix (Anthropic and Bedrock)
+EPHEMERAL_CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def prompt_cache_usage(usage: Any) -> Dict[str, int]:
+    """
+    Normalize provider prompt-cache token counts.
+    Anthropic and Bedrock report cache_read_input_tokens and cache_creation_input_tokens,
+    OpenAI reports prompt_tokens_details.cached_tokens and DeepSeek prompt_cache_hit_tokens.
+    
+    Args:
+        usage: Usage object or dictionary from a provider response
+        
+    Returns:
+        Dictionary with read_tokens and write_tokens
+    """
+    def field(source: Any, name: str) -> Any:
+        if source is None:
+            return None
+        return source.get(name) if isinstance(source, dict) else getattr(source, name, None)
+
+    read_tokens = (field(usage, "cache_read_input_tokens")
+                   or field(usage, "prompt_cache_hit_tokens")
+                   or field(field(usage, "prompt_tokens_details"), "cached_tokens")
+                   or 0)
+    write_tokens = field(usage, "cache_creation_input_tokens") or 0
+    return {"read_tokens": read_tokens, "write_tokens": write_tokens}
+
+
+def log_prompt_cache_usage(cache_usage: Dict[str, int]) -> None:
+    """Log the prompt-cache token counts of a streamed response."""
+    if cache_usage["read_tokens"] or cache_usage["write_tokens"]:
+        logger.info(f"Prompt cache: {cache_usage['read_tokens']} tokens read, "
+                    f"{cache_usage['write_tokens']} tokens written")
+
+
+class LLMBackend:
+    """
+    One provider/model pair. Makes single provider calls; retries, caching,
+    coalescing and hedging are handled by LLMConnector.
+    """
+
+    def __init__(self, config: Dict[str, Any] = None, mock: Optional[MockConnector] = None):
+        """
+        Initialize the backend.
+        
+        Args:
+            config: Backend configuration (provider, model, api_key, provider settings)
+            mock: Mock connector used for the "mock" provider and as a fallback
+        """
+        self.config = config or {}
+        self.provider = self.config.get("provider", "openai")
+        self.model = self.config.get("model", "gpt-4")
+        self.api_key = self.config.get("api_key") or os.environ.get(f"{self.provider.upper()}_API_KEY")
+        self.temperature = self.config.get("temperature", 0.7)
+        self.max_tokens = self.config.get("max_tokens", 2000)
+        # Mark the static system prompt as a cacheable prefix (Anthropic; OpenAI caches automatically)
+        self.prompt_cache = self.config.get("prompt_cache", True)
+        self._mock = mock or MockConnector(self.config.get("mock"))
+
+        # Initialize the appropriate client based on the provider
+        self.initialize_client()
+
+    @property
+    def name(self) -> str:
+        """Identity of the backend, e.g. "openai:gpt-4"."""
+        return f"{self.provider}:{self.model}"
+
+    def initialize_client(self) -> None:
+        """
+        Initialize the appropriate client based on the provider. HTTP clients
+        come from the shared client registry, so backends and connectors with
+        the same provider settings reuse one connection pool.
+        """
+        logger.info(f"Initializing client for provider: {self.provider}")
+        
+        if self.provider == "openai":
+            try:
+                self.client = get_openai_client(self.api_key, self.config.get("base_url"),
+                                                self.config.get("http_pool"))
+                logger.info("OpenAI client initialized successfully")
+            except ImportError:
+                logger.error("OpenAI package not installed. Install with: pip install openai")
+                self.client = None
+        elif self.provider == "deepseek":
+            try:
+                base_url = self.config.get("base_url", "https://api.deepseek.com")
+                self.client = get_openai_client(self.api_key, base_url, self.config.get("http_pool"))
+                logger.info("DeepSeek client initialized successfully")
+            except ImportError:
+                logger.error("OpenAI package not installed. Install with: pip install openai")
+                self.client = None
+        elif self.provider == "anthropic":
+            try:
+                self.client = get_anthropic_client(self.api_key, self.config.get("base_url"),
+                                                   self.config.get("http_pool"))
+                logger.info("Anthropic client initialized successfully")
+            except ImportError:
+                logger.error("Anthropic package not installed. Install with: pip install anthropic")
+                self.client = None
+        elif self.provider == "aws_bedrock":
+            try:
+                # Try to import and initialize AWSBedrockConnector
+                logger.debug("Attempting to import AWS Bedrock connector...")
+                from .aws_connector import AWSBedrockConnector
+                logger.debug("Import successful, initializing AWS Bedrock connector...")
+                self.client = AWSBedrockConnector(self.config)
+                logger.info("AWS Bedrock client initialized successfully")
+            except ImportError as e:
+                logger.error(f"AWS Bedrock connector import error: {str(e)}")
+                self.client = None
+            except Exception as e:
+                logger.error(f"AWS Bedrock connector initialization error: {str(e)}")
+                self.client = None
+        else:
+            logger.warning(f"Unsupported provider: {self.provider}. Using mock client.")
+            self.client = None
+        
+        # Final check to ensure client was properly initialized
+        if self.client is None:
+            logger.warning(f"Failed to initialize client for provider: {self.provider}")
+
+    async def acall(self, system_prompt: str, user_prompt: str) -> Tuple[str, Dict[str, Any]]:
+        """Make a single call to the configured provider. Provider errors are raised."""
+        # Handle provider-specific cases
+        if self.provider == "openai":
+            if self.client is None:
+                logger.warning("OpenAI client not initialized, falling back to mock connector")
+                return self._mock_response(system_prompt, user_prompt)
+            return await self._acall_openai(system_prompt, user_prompt)
+        elif self.provider == "deepseek":
+            if self.client is None:
+                logger.warning("DeepSeek client not initialized, falling back to mock connector")
+                return self._mock_response(system_prompt, user_prompt)
+            return await self._acall_openai(system_prompt, user_prompt)
+        elif self.provider == "anthropic":
+            if self.client is None:
+                logger.warning("Anthropic client not initialized, falling back to mock connector")
+                return self._mock_response(system_prompt, user_prompt)
+            return await self._acall_anthropic(system_prompt, user_prompt)
+        elif self.provider == "aws_bedrock":
+            if self.client is None:
+                logger.warning("AWS Bedrock client not initialized, falling back to mock connector")
+                return self._mock_response(system_prompt, user_prompt)
+            return await self.client.agenerate_response(system_prompt, user_prompt)
+        else:
+            # Default to mock responses for unknown providers
+            logger.info(f"Using mock connector for provider: {self.provider}")
+            return self._mock_response(system_prompt, user_prompt)
+
+    async def astream(self, system_prompt: str, user_prompt: str) -> AsyncGenerator[str, None]:
+        """
+        Stream a single request from the configured provider. Provider errors are raised.
+        Closing the generator closes the provider stream and its HTTP connection
+        right away, so an abandoned response stops generating tokens.
+        """
+        stream = self._open_stream(system_prompt, user_prompt)
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    def _open_stream(self, system_prompt: str, user_prompt: str) -> AsyncGenerator[str, None]:
+        """Pick the streaming implementation for the configured provider."""
+        # Handle provider-specific cases - check AWS first since that's what our config is using
+        if self.provider == "aws_bedrock":
+            logger.info("Using AWS Bedrock streaming client")
+            if self.client is None:
+                logger.warning("AWS Bedrock client not initialized, falling back to mock streaming")
+                return self._amock_response_streaming(system_prompt, user_prompt)
+            if hasattr(self.client, 'agenerate_response_streaming'):
+                logger.info("AWS Bedrock client has streaming support, using it")
+                return self.client.agenerate_response_streaming(system_prompt, user_prompt)
+            logger.warning("AWS Bedrock client doesn't support streaming, using mock streaming")
+            return self._amock_response_streaming(system_prompt, user_prompt)
+        if self.provider in ("openai", "deepseek"):
+            label = "OpenAI" if self.provider == "openai" else "DeepSeek"
+            logger.info(f"Using {label} streaming client")
+            if self.client is None:
+                logger.warning(f"{label} client not initialized, falling back to mock streaming")
+                return self._amock_response_streaming(system_prompt, user_prompt)
+            return self._acall_openai_streaming(system_prompt, user_prompt)
+        if self.provider == "anthropic":
+            logger.info("Using Anthropic streaming client")
+            if self.client is None:
+                logger.warning("Anthropic client not initialized, falling back to mock streaming")
+                return self._amock_response_streaming(system_prompt, user_prompt)
+            return self._acall_anthropic_streaming(system_prompt, user_prompt)
+        # Default to mock streaming responses for unsupported providers
+        logger.info(f"Streaming not supported for provider: {self.provider}, using mock streaming")
+        return self._amock_response_streaming(system_prompt, user_prompt)
+
+    async def _acall_openai(self, system_prompt: str, user_prompt: str) -> Tuple[str, Dict[str, Any]]:
+        """Call the OpenAI-compatible chat completions API with the given prompts."""
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+        )
+
+        text_response = response.choices[0].message.content
+        metadata = {
+            "finish_reason": response.choices[0].finish_reason,
+            "usage": response.usage.to_dict() if hasattr(response.usage, "to_dict") else vars(response.usage),
+            "prompt_cache": prompt_cache_usage(response.usage),
+            "model": response.model
+        }
+
+        return text_response, metadata
+
+    async def _acall_openai_streaming(self, system_prompt: str, user_prompt: str) -> AsyncGenerator[str, None]:
+        """
+        Call the OpenAI-compatible chat completions API with streaming enabled.
+        
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            
+        Returns:
+            Async generator yielding text chunks
+        """
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        
+        # Create a streaming response
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            stream=True  # Enable streaming
+        )
+        
+        # Process the streaming response
+        try:
+            async for chunk in response:
+                if hasattr(chunk, 'choices') and chunk.choices:
+                    choice = chunk.choices[0]
+                    if hasattr(choice, 'delta') and hasattr(choice.delta, 'content'):
+                        content = choice.delta.content
+                        if content is not None:
+                            yield content
+        finally:
+            # Drop the HTTP connection if the consumer stopped early
+            await response.close()
+
+    def _anthropic_request(self, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
+        """Build the keyword arguments for an Anthropic Messages API request."""
+        request = {
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "messages": [
+                {"role": "user", "content": user_prompt}
+            ]
+        }
+        if system_prompt and self.prompt_cache:
+            # The system prompt is static per fortune system, so it is cached as a prefix
+            request["system"] = [
+                {"type": "text", "text": system_prompt, "cache_control": EPHEMERAL_CACHE_CONTROL}
+            ]
+        elif system_prompt:
+            request["system"] = system_prompt
+        return request
+
+    async def _acall_anthropic(self, system_prompt: str, user_prompt: str) -> Tuple[str, Dict[str, Any]]:
+        """Call the Anthropic Messages API with the given prompts."""
+        response = await self.client.messages.create(
+            **self._anthropic_request(system_prompt, user_prompt)
+        )
+
+        text_response = "".join(
+            block.text for block in response.content if getattr(block, "type", None) == "text"
+        )
+        cache_usage = prompt_cache_usage(response.usage)
+        metadata = {
+            "stop_reason": response.stop_reason,
+            "model": response.model,
+            "usage": {
+                "input_tokens": response.usage.input_tokens,
+                "output_tokens": response.usage.output_tokens,
+                "cache_read_input_tokens": cache_usage["read_tokens"],
+                "cache_creation_input_tokens": cache_usage["write_tokens"]
+            },
+            "prompt_cache": cache_usage
+        }
+
+        return text_response, metadata
+
+    async def _acall_anthropic_streaming(self, system_prompt: str, user_prompt: str) -> AsyncGenerator[str, None]:
+        """
+        Call the Anthropic Messages API with streaming enabled.
+        
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            
+        Returns:
+            Async generator yielding text deltas as they arrive
+        """
+        stream = await self.client.messages.create(
+            stream=True,
+            **self._anthropic_request(system_prompt, user_prompt)
+        )
+        
+        try:
+            async for event in stream:
+                if event.type == "content_block_delta" and getattr(event.delta, "type", None) == "text_delta":
+                    yield event.delta.text
+                elif event.type == "message_start":
+                    log_prompt_cache_usage(prompt_cache_usage(event.message.usage))
+        finally:
+            # Drop the HTTP connection if the consumer stopped early
+            await stream.close()
+
+    def _mock_response(self, system_prompt: str, user_prompt: str) -> Tuple[str, Dict[str, Any]]:
+        """Generate a mock response using the MockConnector."""
+        return self._mock.generate_response(system_prompt, user_prompt)
+
+    async def _amock_response_streaming(self, system_prompt: str, user_prompt: str) -> AsyncGenerator[str, None]:
+        """
+        Generate a mock streaming response, timed by the configured latency profile.
+        
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            
+        Returns:
+            Async generator yielding text chunks
+        """
+        logger.info("Using mock streaming response generator")
+        async for chunk in self._mock.agenerate_response_streaming(system_prompt, user_prompt):
+            yield chunk
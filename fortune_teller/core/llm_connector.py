@@ -7,21 +7,135 @@ import json
 import logging
 import time
 import re
-import random
-from typing import Dict, Any, Optional, List, Tuple, Callable, Generator, Iterator
+import asyncio
+from typing import Dict, Any, Optional, List, Tuple, Callable, Generator, Iterable, Iterator, AsyncGenerator
 
+from .async_runner import get_runner
+from .llm_backend import LLMBackend
+from .metrics import get_metrics_registry
 from .mock_connector import MockConnector
+from .resilience import (
+    CircuitBreaker, RetryPolicy, call_with_retry, stream_with_retry, get_circuit_breaker
+)
+from .rate_limiter import BULK, NORMAL, RateLimiter, estimate_tokens, get_rate_limiter
+from .response_cache import create_response_cache, make_cache_key
+from .single_flight import SingleFlight
+from .structured_logging import log_llm_request
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("LLMConnector")
 
+# Per-attempt telemetry of provider calls, labelled by provider, model and plugin
+METRIC_LABELS = ("provider", "model", "plugin")
+
+# Streams stopped early because the consumer went away (or lost a hedge)
+STREAM_CANCELLATIONS = get_metrics_registry().counter(
+    "llm_stream_cancellations_total",
+    "Provider streams closed before the response was complete",
+    METRIC_LABELS
+)
+STREAM_TOKENS_SAVED = get_metrics_registry().counter(
+    "llm_stream_tokens_saved_total",
+    "Upper bound of output tokens not generated because streams were closed early "
+    "(max_tokens minus the estimated tokens already streamed)",
+    METRIC_LABELS
+)
+QUEUE_WAIT = get_metrics_registry().histogram(
+    "llm_queue_wait_seconds",
+    "Time a request waited for the rate limiter",
+    METRIC_LABELS
+)
+TIME_TO_FIRST_TOKEN = get_metrics_registry().histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from sending a streaming request to its first chunk",
+    METRIC_LABELS
+)
+INTER_CHUNK_GAP = get_metrics_registry().histogram(
+    "llm_inter_chunk_gap_seconds",
+    "Time between consecutive chunks of a stream",
+    METRIC_LABELS,
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+REQUEST_DURATION = get_metrics_registry().histogram(
+    "llm_request_duration_seconds",
+    "Time from sending a request to its last token, excluding the queue wait",
+    METRIC_LABELS
+)
+OUTPUT_TOKENS_PER_SECOND = get_metrics_registry().histogram(
+    "llm_output_tokens_per_second",
+    "Output tokens divided by the request duration",
+    METRIC_LABELS,
+    buckets=(1, 5, 10, 25, 50, 100, 200, 400, 800, 1600)
+)
+INPUT_TOKENS = get_metrics_registry().counter(
+    "llm_input_tokens_total",
+    "Input tokens of completed requests, as reported by the provider or estimated",
+    METRIC_LABELS
+)
+OUTPUT_TOKENS = get_metrics_registry().counter(
+    "llm_output_tokens_total",
+    "Output tokens of completed requests, as reported by the provider or estimated",
+    METRIC_LABELS
+)
+
+
+def _metric_labels(backend: LLMBackend, plugin: Optional[str]) -> Dict[str, str]:
+    """Metric labels of a call to a backend."""
+    return {"provider": backend.provider, "model": backend.model, "plugin": plugin or ""}
+
+
+def _usage_tokens(metadata: Dict[str, Any], system_prompt: str, user_prompt: str, text: str) -> Tuple[int, int]:
+    """
+    Input and output token counts of a response. Provider-reported usage
+    (Anthropic/Bedrock or OpenAI field names) is preferred over estimates.
+    """
+    usage = metadata.get("usage")
+    if not isinstance(usage, dict):
+        usage = {}
+    input_tokens = usage.get("input_tokens", usage.get("prompt_tokens"))
+    output_tokens = usage.get("output_tokens", usage.get("completion_tokens"))
+    if input_tokens is None:
+        input_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+    if output_tokens is None:
+        output_tokens = estimate_tokens(text)
+    return input_tokens, output_tokens
+
+
+def _record_request(labels: Dict[str, str], duration: float, input_tokens: int, output_tokens: int) -> None:
+    """Record the duration, throughput and token counts of a completed call."""
+    REQUEST_DURATION.observe(duration, **labels)
+    INPUT_TOKENS.inc(input_tokens, **labels)
+    OUTPUT_TOKENS.inc(output_tokens, **labels)
+    if duration > 0 and output_tokens:
+        OUTPUT_TOKENS_PER_SECOND.observe(output_tokens / duration, **labels)
+
+
+async def _first_chunk(stream: AsyncGenerator[str, None]) -> str:
+    """Wait for the next chunk of a stream."""
+    return await stream.__anext__()
+
+
+def _inline_stream_errors(stream: Iterator[str]) -> Iterator[str]:
+    """Show the failure of a streaming response as its last chunk, for display in the CLI."""
+    try:
+        yield from stream
+    except Exception as e:
+        yield f"Error generating streaming response: {str(e)}"
+
 
 class LLMConnector:
     """
     Connector for Language Learning Models (LLMs).
     Handles sending prompts to LLMs and processing their responses.
+
+    Provider calls are implemented once as coroutines on a shared background
+    event loop; the synchronous methods are thin wrappers around them.
+
+    Requests go to an ordered list of backends (``llm.backends``). A slow call
+    is hedged to the next backend after ``llm.hedge_after`` seconds, and a
+    failed call or open circuit fails over to the next backend.
     """
 
     def __init__(self, config: Dict[str, Any] = None):
@@ -32,74 +146,95 @@ class LLMConnector:
             config: Configuration dictionary for the LLM connector
         """
         self.config = config or {}
-        self.provider = self.config.get("provider", "openai")
-        self.model = self.config.get("model", "gpt-4")
-        self.api_key = self.config.get("api_key") or os.environ.get(f"{self.provider.upper()}_API_KEY")
         self.temperature = self.config.get("temperature", 0.7)
         self.max_tokens = self.config.get("max_tokens", 2000)
 
-        # Cache for responses
-        self.cache = {}
+        # Cache for responses: bounded in-memory LRU, optionally in front of a shared persistent tier
+        self.cache = create_response_cache(self.config.get("cache"))
 
-        # Initialize the appropriate client based on the provider
-        self._initialize_client()
+        # Event loop that owns the async provider clients
+        self._runner = get_runner()
 
-        logger.info(f"LLM Connector initialized with provider: {self.provider}, model: {self.model}")
+        # Identical concurrent requests share one upstream call
+        self._single_flight = SingleFlight()
 
-    def _initialize_client(self):
-        """Initialize the appropriate client based on the provider."""
-        logger.info(f"Initializing client for provider: {self.provider}")
-        
-        if self.provider == "openai":
-            try:
-                import openai
-                self.client = openai
-                logger.info("OpenAI client initialized successfully")
-            except ImportError:
-                logger.error("OpenAI package not installed. Install with: pip install openai")
-                self.client = None
-        elif self.provider == "deepseek":
-            try:
-                from openai import OpenAI
-                self.client = OpenAI(api_key=self.api_key, base_url="https://api.deepseek.com")
-                logger.info("DeepSeek client initialized successfully")
-            except ImportError:
-                logger.error("OpenAI package not installed. Install with: pip install openai")
-                self.client = None
-        elif self.provider == "anthropic":
-            try:
-                import anthropic
-                self.client = anthropic.Anthropic(api_key=self.api_key)
-                logger.info("Anthropic client initialized successfully")
-            except ImportError:
-                logger.error("Anthropic package not installed. Install with: pip install anthropic")
-                self.client = None
-        elif self.provider == "aws_bedrock":
-            try:
-                # Try to import and initialize AWSBedrockConnector
-                logger.debug("Attempting to import AWS Bedrock connector...")
-                from .aws_connector import AWSBedrockConnector
-                logger.debug("Import successful, initializing AWS Bedrock connector...")
-                self.client = AWSBedrockConnector(self.config)
-                logger.info("AWS Bedrock client initialized successfully")
-            except ImportError as e:
-                logger.error(f"AWS Bedrock connector import error: {str(e)}")
-                self.client = None
-            except Exception as e:
-                logger.error(f"AWS Bedrock connector initialization error: {str(e)}")
-                self.client = None
-        else:
-            logger.warning(f"Unsupported provider: {self.provider}. Using mock client.")
-            self.client = None
+        # Throttling, 5xx and timeout errors are retried with backoff; a circuit
+        # breaker per provider/model fails fast while the upstream is down
+        self.retry_policy = RetryPolicy.from_config(self.config.get("retry"))
+
+        # Seconds before a slow call is duplicated to the next backend; None disables hedging
+        self.hedge_after = self.config.get("hedge_after")
+
+        # Mock backend used for the "mock" provider and as a fallback
+        self._mock = MockConnector(self.config.get("mock"))
+
+        # Ordered provider/model backends; the first one is the primary
+        self.backends = [
+            LLMBackend(self._backend_config(entry), self._mock)
+            for entry in (self.config.get("backends") or [{}])
+        ]
+
+        logger.info(f"LLM Connector initialized with backends: {', '.join(b.name for b in self.backends)}")
+
+    def _backend_config(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the configuration of one backend. Entries inherit the top-level
+        settings, except the API key when they name a different provider.
         
-        # Final check to ensure client was properly initialized
-        if self.client is None:
-            logger.warning(f"Failed to initialize client for provider: {self.provider}")
+        Args:
+            entry: Item of ``llm.backends``
+            
+        Returns:
+            Backend configuration dictionary
+        """
+        backend_config = {k: v for k, v in self.config.items() if k != "backends"}
+        if entry.get("provider", backend_config.get("provider")) != backend_config.get("provider"):
+            backend_config.pop("api_key", None)
+        backend_config.update(entry)
+        return backend_config
+
+    @property
+    def provider(self) -> str:
+        """Provider of the primary backend."""
+        return self.backends[0].provider
+
+    @provider.setter
+    def provider(self, provider: str) -> None:
+        self.backends[0].provider = provider
+
+    @property
+    def model(self) -> str:
+        """Model of the primary backend."""
+        return self.backends[0].model
+
+    @model.setter
+    def model(self, model: str) -> None:
+        self.backends[0].model = model
+
+    @property
+    def client(self) -> Any:
+        """Client of the primary backend."""
+        return self.backends[0].client
+
+    @client.setter
+    def client(self, client: Any) -> None:
+        self.backends[0].client = client
+
+    @property
+    def api_key(self) -> Optional[str]:
+        """API key of the primary backend."""
+        return self.backends[0].api_key
+
+    @api_key.setter
+    def api_key(self, api_key: Optional[str]) -> None:
+        self.backends[0].api_key = api_key
 
     def generate_response(self, 
                         system_prompt: str, 
                         user_prompt: str, 
-                        use_cache: bool = True) -> Tuple[str, Dict[str, Any]]:
+                        use_cache: bool = True,
+                        priority: str = NORMAL,
+                        plugin: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
         """
         Generate a response from the LLM.
         
@@ -107,142 +242,342 @@ class LLMConnector:
             system_prompt: System prompt for the LLM
             user_prompt: User prompt for the LLM
             use_cache: Whether to use cached responses
+            priority: Rate-limiter priority class ("interactive", "normal", "bulk" or "prefetch")
+            plugin: Name of the fortune telling system making the request, used as a metrics label
+            
+        Returns:
+            Tuple of (text response, metadata)
+        """
+        return self._runner.run(self._agenerate_response(system_prompt, user_prompt, use_cache, priority, plugin))
+
+    async def agenerate_response(self,
+                                 system_prompt: str,
+                                 user_prompt: str,
+                                 use_cache: bool = True,
+                                 priority: str = NORMAL,
+                                 plugin: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Generate a response from the LLM without blocking the caller's event loop.
+        
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            use_cache: Whether to use cached responses
+            priority: Rate-limiter priority class ("interactive", "normal", "bulk" or "prefetch")
+            plugin: Name of the fortune telling system making the request, used as a metrics label
             
         Returns:
             Tuple of (text response, metadata)
         """
-        # Log the prompts for debugging
-        logger.info("--- LLM REQUEST BEGIN ---")
-        logger.info(f"PROVIDER: {self.provider}")
-        logger.info(f"MODEL: {self.model}")
-        logger.info("SYSTEM PROMPT:")
-        logger.info(system_prompt)
-        logger.info("USER PROMPT:")
-        logger.info(user_prompt)
-        logger.info("--- LLM REQUEST END ---")
+        return await self._runner.bridge(self._agenerate_response(system_prompt, user_prompt, use_cache, priority, plugin))
+
+    async def _agenerate_response(self,
+                                  system_prompt: str,
+                                  user_prompt: str,
+                                  use_cache: bool,
+                                  priority: str = NORMAL,
+                                  plugin: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        """Generate a response on the runner's event loop."""
+        # Prompt hashes only; full prompts are logged at DEBUG or for sampled requests
+        log_llm_request(logger, "llm_request", system_prompt, user_prompt,
+                        provider=self.provider, model=self.model, plugin=plugin, priority=priority)
         
         # Generate a cache key
         cache_key = self._generate_cache_key(system_prompt, user_prompt)
 
         # Check cache if enabled
-        if use_cache and cache_key in self.cache:
-            logger.info("Using cached response")
-            return self.cache[cache_key]
-
-        try:
-            # Handle provider-specific cases
-            if self.provider == "openai":
-                if self.client is None:
-                    logger.warning("OpenAI client not initialized, falling back to mock connector")
-                    response = self._mock_response(system_prompt, user_prompt)
-                else:
-                    response = self._call_openai(system_prompt, user_prompt)
-            elif self.provider == "deepseek":
-                if self.client is None:
-                    logger.warning("DeepSeek client not initialized, falling back to mock connector")
-                    response = self._mock_response(system_prompt, user_prompt)
-                else:
-                    response = self._call_openai(system_prompt, user_prompt)
-            elif self.provider == "anthropic":
-                if self.client is None:
-                    logger.warning("Anthropic client not initialized, falling back to mock connector")
-                    response = self._mock_response(system_prompt, user_prompt)
-                else:
-                    response = self._call_anthropic(system_prompt, user_prompt)
-            elif self.provider == "aws_bedrock":
-                if self.client is None:
-                    logger.warning("AWS Bedrock client not initialized, falling back to mock connector")
-                    response = self._mock_response(system_prompt, user_prompt)
-                else:
-                    response = self.client.generate_response(system_prompt, user_prompt)
-            else:
-                # Default to mock responses for unknown providers
-                logger.info(f"Using mock connector for provider: {self.provider}")
-                response = self._mock_response(system_prompt, user_prompt)
-
-            # Cache the response
-            if use_cache:
-                self.cache[cache_key] = response
+        if use_cache:
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                logger.info("Using cached response")
+                return cached
+
+            # Concurrent callers with the same key wait on a single provider call
+            return await self._single_flight.do(
+                cache_key,
+                lambda: self._afetch_response(system_prompt, user_prompt, cache_key, use_cache, priority, plugin)
+            )
 
-            return response
+        return await self._afetch_response(system_prompt, user_prompt, cache_key, use_cache, priority, plugin)
 
+    def generate_responses(self,
+                           batch: Iterable[Tuple[str, str]],
+                           max_concurrency: int = 8,
+                           use_cache: bool = True,
+                           priority: str = BULK,
+                           plugin: Optional[str] = None) -> Iterator[Tuple[int, str, Dict[str, Any]]]:
+        """
+        Generate responses for many prompt pairs concurrently.
+        
+        Every item goes through the cache, request coalescing and rate limits
+        like a single generate_response call. Items are read from ``batch``
+        lazily, so large batches need not be held in memory.
+        
+        Args:
+            batch: Iterable of (system prompt, user prompt) pairs
+            max_concurrency: Maximum number of requests in flight
+            use_cache: Whether to use cached responses
+            priority: Rate-limiter priority class
+            plugin: Name of the fortune telling system making the requests, used as a metrics label
+            
+        Returns:
+            Iterator of (index in batch, text response, metadata), in completion order
+        """
+        return self._runner.iterate(self._agenerate_responses(batch, max_concurrency, use_cache, priority, plugin))
+
+    async def agenerate_responses(self,
+                                  batch: Iterable[Tuple[str, str]],
+                                  max_concurrency: int = 8,
+                                  use_cache: bool = True,
+                                  priority: str = BULK,
+                                  plugin: Optional[str] = None) -> AsyncGenerator[Tuple[int, str, Dict[str, Any]], None]:
+        """
+        Generate responses for many prompt pairs concurrently without blocking
+        the caller's event loop.
+        
+        Args:
+            batch: Iterable of (system prompt, user prompt) pairs
+            max_concurrency: Maximum number of requests in flight
+            use_cache: Whether to use cached responses
+            priority: Rate-limiter priority class
+            plugin: Name of the fortune telling system making the requests, used as a metrics label
+            
+        Returns:
+            Async generator of (index in batch, text response, metadata), in completion order
+        """
+        results = self._agenerate_responses(batch, max_concurrency, use_cache, priority, plugin)
+        async for result in self._runner.bridge_iter(results):
+            yield result
+
+    async def _agenerate_responses(self,
+                                   batch: Iterable[Tuple[str, str]],
+                                   max_concurrency: int,
+                                   use_cache: bool,
+                                   priority: str,
+                                   plugin: Optional[str] = None) -> AsyncGenerator[Tuple[int, str, Dict[str, Any]], None]:
+        """Run a batch on the runner's event loop with a fixed number of workers."""
+        items = enumerate(batch)
+        finished = asyncio.Queue()
+
+        async def worker() -> None:
+            try:
+                # Workers share the iterator; each takes the next item when it is free
+                for index, (system_prompt, user_prompt) in items:
+                    response, metadata = await self._agenerate_response(
+                        system_prompt, user_prompt, use_cache, priority, plugin
+                    )
+                    finished.put_nowait((index, response, metadata))
+            finally:
+                finished.put_nowait(None)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(max(1, max_concurrency))]
+        running = len(workers)
+        try:
+            while running:
+                result = await finished.get()
+                if result is not None:
+                    yield result
+                    continue
+                running -= 1
+                # A malformed item or failing batch iterator stops the whole batch
+                for task in workers:
+                    if task.done() and not task.cancelled() and task.exception() is not None:
+                        raise task.exception()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _afetch_response(self,
+                               system_prompt: str,
+                               user_prompt: str,
+                               cache_key: str,
+                               use_cache: bool,
+                               priority: str = NORMAL,
+                               plugin: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        """Call the backends with retries, hedging and failover, and cache the response."""
+        try:
+            backend, response = await self._afetch_from_backends(system_prompt, user_prompt, priority, plugin)
         except Exception as e:
             logger.error(f"Error generating LLM response: {e}")
             return f"Error: {str(e)}", {"error": str(e)}
 
-    def _generate_cache_key(self, system_prompt: str, user_prompt: str) -> str:
-        """Generate a cache key for the given prompts."""
-        combined = f"{self.provider}_{self.model}_{system_prompt}_{user_prompt}"
-        return str(hash(combined))
-
-
-    def _call_openai(self, system_prompt: str, user_prompt: str) -> Tuple[str, Dict[str, Any]]:
-        """Call the OpenAI API with the given prompts."""
-        if self.client is None:
-            return "Error: OpenAI client not initialized", {"error": "Client not initialized"}
-
-        try:
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-            )
-
-            text_response = response.choices[0].message.content
-            metadata = {
-                "finish_reason": response.choices[0].finish_reason,
-                "usage": response.usage.to_dict() if hasattr(response.usage, "to_dict") else vars(response.usage),
-                "model": response.model
-            }
+        # Cache the response (never cache errors)
+        if use_cache and "error" not in response[1]:
+            await self._acache_backend_response(backend, cache_key, system_prompt, user_prompt, response)
 
-            return text_response, metadata
-
-        except Exception as e:
-            logger.error(f"OpenAI API error: {e}")
-            return f"Error: {str(e)}", {"error": str(e)}
+        return response
 
-    def _call_anthropic(self, system_prompt: str, user_prompt: str) -> Tuple[str, Dict[str, Any]]:
-        """Call the Anthropic API with the given prompts."""
-        if self.client is None:
-            return "Error: Anthropic client not initialized", {"error": "Client not initialized"}
+    async def _acache_backend_response(self,
+                                       backend: LLMBackend,
+                                       cache_key: str,
+                                       system_prompt: str,
+                                       user_prompt: str,
+                                       response: Tuple[str, Dict[str, Any]]) -> None:
+        """
+        Cache a response under the key of the backend that produced it. A hedged
+        or failover answer comes from another model, so it must not answer later
+        requests for the primary's key.
+        """
+        if backend is not self.backends[0]:
+            cache_key = self._generate_cache_key(system_prompt, user_prompt, backend)
+        await self.cache.aset(cache_key, response, model=backend.model)
+
+    async def _afetch_from_backends(self,
+                                    system_prompt: str,
+                                    user_prompt: str,
+                                    priority: str = NORMAL,
+                                    plugin: Optional[str] = None) -> Tuple[LLMBackend, Tuple[str, Dict[str, Any]]]:
+        """
+        Get a response from the first backend to answer.
+        
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            priority: Rate-limiter priority class
+            plugin: Metrics label of the requesting fortune telling system
+            
+        Returns:
+            Tuple of (answering backend, (text response, metadata))
+            
+        Raises:
+            Exception: The last backend error when every backend failed
+        """
+        if len(self.backends) == 1:
+            backend = self.backends[0]
+            return backend, await self._acall_backend(backend, system_prompt, user_prompt, priority, plugin)
 
+        remaining = list(self.backends)
+        running: Dict[asyncio.Future, LLMBackend] = {}
+        last_error: Optional[BaseException] = None
         try:
-            prompt = f"{self.client.HUMAN_PROMPT} {user_prompt} {self.client.AI_PROMPT}"
-
-            response = self.client.completions.create(
-                prompt=prompt,
-                model=self.model,
-                max_tokens_to_sample=self.max_tokens,
-                temperature=self.temperature
-            )
+            while True:
+                if not running:
+                    if not remaining:
+                        raise last_error
+                    self._launch_backend(remaining.pop(0), running, system_prompt, user_prompt, priority, plugin)
+
+                # Only wait for the hedge deadline while there is a backend left to hedge to
+                timeout = self.hedge_after if remaining else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    backend = remaining.pop(0)
+                    logger.info(f"No response after {self.hedge_after}s, hedging to {backend.name}")
+                    self._launch_backend(backend, running, system_prompt, user_prompt, priority, plugin)
+                    continue
+
+                for task in done:
+                    backend = running.pop(task)
+                    if task.exception() is None:
+                        text, metadata = task.result()
+                        return backend, (text, dict(metadata, backend=backend.name))
+                    last_error = task.exception()
+                    logger.warning(f"Backend {backend.name} failed: {last_error}")
+        finally:
+            # Cancel the losers
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    def _launch_backend(self,
+                        backend: LLMBackend,
+                        running: Dict[asyncio.Future, LLMBackend],
+                        system_prompt: str,
+                        user_prompt: str,
+                        priority: str,
+                        plugin: Optional[str] = None) -> None:
+        """Start a call to a backend and track it in ``running``."""
+        task = asyncio.ensure_future(self._acall_backend(backend, system_prompt, user_prompt, priority, plugin))
+        running[task] = backend
+
+    async def _acall_backend(self,
+                             backend: LLMBackend,
+                             system_prompt: str,
+                             user_prompt: str,
+                             priority: str,
+                             plugin: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        """Call one backend within its rate limits, retrying behind its circuit breaker."""
+        limiter = get_rate_limiter(backend.name, backend.config)
+        tokens = self._estimate_request_tokens(backend, system_prompt, user_prompt)
+        labels = _metric_labels(backend, plugin)
+
+        async def attempt() -> Tuple[str, Dict[str, Any]]:
+            # Every attempt, including retries, is charged to the budget
+            queued = time.monotonic()
+            await limiter.acquire(tokens, priority)
+            started = time.monotonic()
+            QUEUE_WAIT.observe(started - queued, **labels)
+
+            text, metadata = await backend.acall(system_prompt, user_prompt)
+            input_tokens, output_tokens = _usage_tokens(metadata, system_prompt, user_prompt, text)
+            _record_request(labels, time.monotonic() - started, input_tokens, output_tokens)
+            return text, metadata
+
+        return await call_with_retry(attempt, self.retry_policy, self._circuit_breaker(backend))
+
+    @staticmethod
+    def _estimate_request_tokens(backend: LLMBackend, system_prompt: str, user_prompt: str) -> int:
+        """Tokens a request counts against a tokens-per-minute limit: prompt plus max output."""
+        return estimate_tokens(system_prompt) + estimate_tokens(user_prompt) + backend.max_tokens
+
+    def _circuit_breaker(self, backend: LLMBackend) -> CircuitBreaker:
+        """Circuit breaker shared by all connectors calling the backend's provider and model."""
+        return get_circuit_breaker(backend.name, self.config.get("circuit_breaker"))
+
+    def is_cached(self, system_prompt: str, user_prompt: str) -> bool:
+        """
+        Check whether a response for the prompts is already cached.
+        
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            
+        Returns:
+            True if a cached response exists
+        """
+        return self.get_cached_response(system_prompt, user_prompt) is not None
 
-            text_response = response.completion
-            metadata = {
-                "stop_reason": response.stop_reason,
-                "model": response.model
-            }
+    def get_cached_response(self, system_prompt: str, user_prompt: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Look up the cached response for the prompts without calling the provider.
+        
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            
+        Returns:
+            Tuple of (text response, metadata), or None if not cached
+        """
+        return self.cache.get(self._generate_cache_key(system_prompt, user_prompt))
 
-            return text_response, metadata
+    def cache_response(self,
+                       system_prompt: str,
+                       user_prompt: str,
+                       response: str,
+                       metadata: Dict[str, Any]) -> None:
+        """
+        Store a response obtained elsewhere (e.g. from a batch job) in the cache,
+        so later requests for the same prompts are served from it.
+        
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            response: Text response
+            metadata: Response metadata
+        """
+        self.cache.set(self._generate_cache_key(system_prompt, user_prompt), (response, metadata), model=self.model)
 
-        except Exception as e:
-            logger.error(f"Anthropic API error: {e}")
-            return f"Error: {str(e)}", {"error": str(e)}
+    def _generate_cache_key(self, system_prompt: str, user_prompt: str, backend: Optional[LLMBackend] = None) -> str:
+        """Generate a cache key for the given prompts, for the primary backend unless another is given."""
+        if backend is None or backend is self.backends[0]:
+            return make_cache_key(self.provider, self.model, self.temperature, system_prompt, user_prompt)
+        return make_cache_key(backend.provider, backend.model, backend.temperature, system_prompt, user_prompt)
 
-    def _mock_response(self, system_prompt: str, user_prompt: str) -> Tuple[str, Dict[str, Any]]:
-        """Generate a mock response using the MockConnector."""
-        # Use the more sophisticated mock connector
-        mock = MockConnector()
-        return mock.generate_response(system_prompt, user_prompt)
 
     def set_provider(self, provider: str, api_key: Optional[str] = None) -> bool:
         """
-        Change the LLM provider.
+        Change the LLM provider of the primary backend.
         
         Args:
             provider: Name of the provider
@@ -257,144 +592,310 @@ class LLMConnector:
         else:
             self.api_key = os.environ.get(f"{provider.upper()}_API_KEY")
 
-        # Clear cache when changing provider
-        self.cache = {}
-
         # Re-initialize client
-        self._initialize_client()
+        self.backends[0].initialize_client()
 
         logger.info(f"Provider changed to {provider}")
         return self.client is not None
 
     def set_model(self, model: str) -> None:
         """
-        Change the model name.
+        Change the model name of the primary backend.
         
         Args:
             model: Name of the model
         """
+        previous_model = self.model
         self.model = model
+        if hasattr(self.client, "set_model"):
+            # The Bedrock connector keeps its own model ID
+            self.client.set_model(model)
         logger.info(f"Model changed to {model}")
 
-        # Clear cache when changing model
-        self.cache = {}
+        # Free in-memory entries of the previous model; other models stay cached
+        if previous_model != model:
+            self.cache.invalidate_model(previous_model)
         
     def generate_response_streaming(self, 
                                    system_prompt: str, 
-                                   user_prompt: str) -> Generator[str, None, None]:
+                                   user_prompt: str,
+                                   use_cache: bool = True,
+                                   priority: str = NORMAL,
+                                   plugin: Optional[str] = None) -> Generator[str, None, None]:
         """
         Generate a streaming response from the LLM, yielding chunks as they become available.
         
         Args:
             system_prompt: System prompt for the LLM
             user_prompt: User prompt for the LLM
+            use_cache: Whether to use cached responses
+            priority: Rate-limiter priority class ("interactive", "normal", "bulk" or "prefetch")
+            plugin: Name of the fortune telling system making the request, used as a metrics label
             
         Returns:
             Generator yielding text chunks as they're received
-        """
-        # Log the prompts for debugging
-        logger.info("--- LLM STREAMING REQUEST BEGIN ---")
-        logger.info(f"PROVIDER: {self.provider}")
-        logger.info(f"MODEL: {self.model}")
-        logger.info("SYSTEM PROMPT:")
-        logger.info(system_prompt)
-        logger.info("USER PROMPT:")
-        logger.info(user_prompt)
-        logger.info("--- LLM STREAMING REQUEST END ---")
-        
-        try:
-            # Handle provider-specific cases - check AWS first since that's what our config is using
-            if self.provider == "aws_bedrock":
-                logger.info("Using AWS Bedrock streaming client")
-                if self.client is None:
-                    logger.warning("AWS Bedrock client not initialized, falling back to mock streaming")
-                    yield from self._mock_response_streaming(system_prompt, user_prompt)
-                elif hasattr(self.client, 'generate_response_streaming'):
-                    logger.info("AWS Bedrock client has streaming support, using it")
-                    yield from self.client.generate_response_streaming(system_prompt, user_prompt)
-                else:
-                    logger.warning("AWS Bedrock client doesn't support streaming, using mock streaming")
-                    yield from self._mock_response_streaming(system_prompt, user_prompt)
-            elif self.provider == "openai":
-                logger.info("Using OpenAI streaming client")
-                if self.client is None:
-                    logger.warning("OpenAI client not initialized, falling back to mock streaming")
-                    yield from self._mock_response_streaming(system_prompt, user_prompt)
-                else:
-                    yield from self._call_openai_streaming(system_prompt, user_prompt)
-            elif self.provider == "deepseek":
-                logger.info("Using DeepSeek streaming client")
-                if self.client is None:
-                    logger.warning("DeepSeek client not initialized, falling back to mock streaming")
-                    yield from self._mock_response_streaming(system_prompt, user_prompt)
-                else:
-                    yield from self._call_openai_streaming(system_prompt, user_prompt)
-            elif self.provider == "anthropic" or self.provider == "deepseek":
-                logger.info(f"{self.provider} streaming not directly supported, falling back to mock streaming")
-                yield from self._mock_response_streaming(system_prompt, user_prompt)
-            else:
-                # Default to mock streaming responses for unsupported providers
-                logger.info(f"Streaming not supported for provider: {self.provider}, using mock streaming")
-                yield from self._mock_response_streaming(system_prompt, user_prompt)
-                
-        except Exception as e:
-            logger.error(f"Error generating streaming LLM response: {e}")
-            logger.error(f"Exception details: {str(e)}", exc_info=True)
-            yield f"Error generating streaming response: {str(e)}"
             
-    def _mock_response_streaming(self, system_prompt: str, user_prompt: str) -> Generator[str, None, None]:
+        Raises:
+            Exception: If the response fails, after any chunks already yielded
         """
-        Generate a mock streaming response, simulating chunks being received over time.
+        return self._runner.iterate(self._agenerate_response_streaming(system_prompt, user_prompt, use_cache, priority, plugin))
+
+    async def agenerate_response_streaming(self,
+                                           system_prompt: str,
+                                           user_prompt: str,
+                                           use_cache: bool = True,
+                                           priority: str = NORMAL,
+                                           plugin: Optional[str] = None) -> AsyncGenerator[str, None]:
+        """
+        Generate a streaming response from the LLM without blocking the caller's event loop.
         
         Args:
             system_prompt: System prompt for the LLM
             user_prompt: User prompt for the LLM
+            use_cache: Whether to use cached responses
+            priority: Rate-limiter priority class ("interactive", "normal", "bulk" or "prefetch")
+            plugin: Name of the fortune telling system making the request, used as a metrics label
             
         Returns:
-            Generator yielding text chunks
+            Async generator yielding text chunks as they're received
+            
+        Raises:
+            Exception: If the response fails, after any chunks already yielded
         """
-        logger.info("Using mock streaming response generator")
+        stream = self._agenerate_response_streaming(system_prompt, user_prompt, use_cache, priority, plugin)
+        async for chunk in self._runner.bridge_iter(stream):
+            yield chunk
+
+    async def _agenerate_response_streaming(self,
+                                            system_prompt: str,
+                                            user_prompt: str,
+                                            use_cache: bool,
+                                            priority: str = NORMAL,
+                                            plugin: Optional[str] = None) -> AsyncGenerator[str, None]:
+        """Generate a streaming response on the runner's event loop."""
+        # Prompt hashes only; full prompts are logged at DEBUG or for sampled requests
+        log_llm_request(logger, "llm_stream_request", system_prompt, user_prompt,
+                        provider=self.provider, model=self.model, plugin=plugin, priority=priority)
         
-        # First get the complete response
-        mock = MockConnector()
-        full_response, _ = mock.generate_response(system_prompt, user_prompt)
+        cache_key = self._generate_cache_key(system_prompt, user_prompt)
         
-        # Add a header indicating this is a mock response - send in two separate chunks
-        yield "【注意："
-        time.sleep(0.2)
-        yield "使用模拟流式输出】"
-        time.sleep(0.2)
-        yield "\n\n"
-        time.sleep(0.3)
+        # A cached response is replayed as a single chunk
+        if use_cache:
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                logger.info("Using cached response for streaming request")
+                yield cached[0]
+                return
+
+            # A non-streaming call for the same prompts (e.g. a prefetch) is already
+            # running; wait for it instead of starting a second provider call
+            if self._single_flight.in_flight(cache_key):
+                logger.info("Joining in-flight request for streaming request")
+                response, metadata = await self._single_flight.do(
+                    cache_key,
+                    lambda: self._afetch_response(system_prompt, user_prompt, cache_key, use_cache, priority, plugin)
+                )
+                if "error" not in metadata:
+                    yield response
+                    return
+            
+            # Concurrent callers with the same key share one provider stream
+            source = self._single_flight.stream(
+                f"stream:{cache_key}",
+                lambda: self._astream_and_cache(system_prompt, user_prompt, cache_key, priority, plugin)
+            )
+        else:
+            source = self._astream_from_provider(system_prompt, user_prompt, priority, plugin)
         
-        # First approach: Character by character with small batches
-        # This ensures we have many small chunks for debugging
-        response_chars = list(full_response)
+        try:
+            async for chunk in source:
+                yield chunk
+                
+        except Exception as e:
+            # Raised rather than yielded, so callers never take the failure for text of the response
+            logger.error(f"Error generating streaming LLM response: {e}", exc_info=True)
+            raise
+    
+    async def _astream_and_cache(self,
+                                 system_prompt: str,
+                                 user_prompt: str,
+                                 cache_key: str,
+                                 priority: str = NORMAL,
+                                 plugin: Optional[str] = None) -> AsyncGenerator[str, None]:
+        """Stream from the provider and cache the full text once the stream completes."""
+        chunks = []
+        winners = []
+        async for chunk in self._astream_from_provider(system_prompt, user_prompt, priority, plugin,
+                                                       on_backend=winners.append):
+            chunks.append(chunk)
+            yield chunk
         
-        # Group into small chunks (2-5 characters)
-        batch_size_options = [1, 2, 3, 4, 5]
-        position = 0
+        # Only cache streams that completed without raising
+        if chunks:
+            backend = winners[0]
+            metadata = {"model": backend.model, "streamed": True}
+            if len(self.backends) > 1:
+                metadata["backend"] = backend.name
+            await self._acache_backend_response(backend, cache_key, system_prompt, user_prompt,
+                                                ("".join(chunks), metadata))
+    
+    async def _astream_from_provider(self,
+                                     system_prompt: str,
+                                     user_prompt: str,
+                                     priority: str = NORMAL,
+                                     plugin: Optional[str] = None,
+                                     on_backend: Optional[Callable[[LLMBackend], None]] = None) -> AsyncGenerator[str, None]:
+        """
+        Stream from the first backend to produce a chunk. Slow first chunks are
+        hedged and failures before the first chunk fail over, like non-streaming
+        requests; once a backend has won, its errors are raised.
         
-        while position < len(response_chars):
-            # Vary the batch size for more realistic effect
-            batch_size = min(random.choice(batch_size_options), len(response_chars) - position)
-            
-            # Extract and yield the next chunk
-            current_chunk = ''.join(response_chars[position:position+batch_size])
-            yield current_chunk
-            
-            # Move position forward
-            position += batch_size
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            priority: Rate-limiter priority class
+            plugin: Metrics label of the requesting fortune telling system
+            on_backend: Called with the winning backend before its first chunk is yielded
             
-            # Random delay between chunks, increased for smoother reading experience
-            time.sleep(random.uniform(0.1, 0.2))  # Increased from 0.05-0.15 range
-                
+        Returns:
+            Async generator yielding text chunks of the winning backend
+        """
+        if len(self.backends) == 1:
+            if on_backend is not None:
+                on_backend(self.backends[0])
+            stream = self._astream_backend(self.backends[0], system_prompt, user_prompt, priority, plugin)
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await stream.aclose()
+            return
+
+        remaining = list(self.backends)
+        running: Dict[asyncio.Future, Tuple[LLMBackend, AsyncGenerator[str, None]]] = {}
+        last_error: Optional[BaseException] = None
+        winner = None
+        try:
+            while winner is None:
+                if not running:
+                    if not remaining:
+                        raise last_error
+                    self._launch_backend_stream(remaining.pop(0), running, system_prompt, user_prompt, priority, plugin)
+
+                timeout = self.hedge_after if remaining else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    backend = remaining.pop(0)
+                    logger.info(f"No chunk after {self.hedge_after}s, hedging stream to {backend.name}")
+                    self._launch_backend_stream(backend, running, system_prompt, user_prompt, priority, plugin)
+                    continue
+
+                for task in done:
+                    backend, stream = running.pop(task)
+                    error = task.exception()
+                    # An empty stream also counts as an answer
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        winner = (task, stream)
+                        if on_backend is not None:
+                            on_backend(backend)
+                        break
+                    last_error = error
+                    logger.warning(f"Backend {backend.name} failed: {error}")
+                    await stream.aclose()
+        finally:
+            # Cancel the losers; a stream can only be closed once its pending read has finished
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+            for _, stream in running.values():
+                await stream.aclose()
+
+        task, stream = winner
+        try:
+            if task.exception() is None:
+                yield task.result()
+                async for chunk in stream:
+                    yield chunk
+        finally:
+            await stream.aclose()
+
+    def _launch_backend_stream(self,
+                               backend: LLMBackend,
+                               running: Dict[asyncio.Future, Tuple[LLMBackend, AsyncGenerator[str, None]]],
+                               system_prompt: str,
+                               user_prompt: str,
+                               priority: str,
+                               plugin: Optional[str] = None) -> None:
+        """Start a backend stream, wait for its first chunk in a task and track it in ``running``."""
+        stream = self._astream_backend(backend, system_prompt, user_prompt, priority, plugin)
+        task = asyncio.ensure_future(_first_chunk(stream))
+        running[task] = (backend, stream)
+
+    def _astream_backend(self,
+                         backend: LLMBackend,
+                         system_prompt: str,
+                         user_prompt: str,
+                         priority: str,
+                         plugin: Optional[str] = None) -> AsyncGenerator[str, None]:
+        """Stream from one backend within its rate limits, retrying behind its circuit breaker."""
+        limiter = get_rate_limiter(backend.name, backend.config)
+        tokens = self._estimate_request_tokens(backend, system_prompt, user_prompt)
+        return stream_with_retry(
+            lambda: self._alimited_stream(backend, limiter, tokens, priority, plugin, system_prompt, user_prompt),
+            self.retry_policy,
+            self._circuit_breaker(backend)
+        )
+
+    @staticmethod
+    async def _alimited_stream(backend: LLMBackend,
+                               limiter: RateLimiter,
+                               tokens: int,
+                               priority: str,
+                               plugin: Optional[str],
+                               system_prompt: str,
+                               user_prompt: str) -> AsyncGenerator[str, None]:
+        """Wait for the rate limiter, then stream one attempt from the backend."""
+        labels = _metric_labels(backend, plugin)
+        queued = time.monotonic()
+        await limiter.acquire(tokens, priority)
+        started = time.monotonic()
+        QUEUE_WAIT.observe(started - queued, **labels)
+
+        stream = backend.astream(system_prompt, user_prompt)
+        streamed_tokens = 0
+        # Time the next chunk was asked for; the consumer's own time between chunks is not counted
+        requested = None
+        try:
+            async for chunk in stream:
+                received = time.monotonic()
+                if requested is None:
+                    TIME_TO_FIRST_TOKEN.observe(received - started, **labels)
+                else:
+                    INTER_CHUNK_GAP.observe(received - requested, **labels)
+                streamed_tokens += estimate_tokens(chunk)
+                yield chunk
+                requested = time.monotonic()
+        except (GeneratorExit, asyncio.CancelledError):
+            # The consumer went away: closing the provider stream stops generation
+            STREAM_CANCELLATIONS.inc(**labels)
+            STREAM_TOKENS_SAVED.inc(max(0, backend.max_tokens - streamed_tokens), **labels)
+            logger.info(f"Stream from {backend.name} cancelled after ~{streamed_tokens} tokens")
+            raise
+        finally:
+            await stream.aclose()
+
+        input_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+        _record_request(labels, time.monotonic() - started, input_tokens, streamed_tokens)
+
     def generate_best_response(
         self, 
         system_prompt: str, 
         user_prompt: str, 
         streaming_handler: Callable = None, 
-        non_streaming_handler: Callable = None
+        non_streaming_handler: Callable = None,
+        priority: str = NORMAL,
+        plugin: Optional[str] = None
     ) -> Any:
         """
         智能选择最佳响应生成方式 - 优先使用流式输出，如不可用则退化到标准方式
@@ -404,6 +905,8 @@ class LLMConnector:
             user_prompt: 用户提示
             streaming_handler: 处理流式输出的回调函数，接收(response_generator, start_time)参数
             non_streaming_handler: 处理非流式输出的回调函数，接收(response, metadata)参数
+            priority: 限流队列中的优先级（"interactive"、"normal"、"bulk"或"prefetch"）
+            plugin: 发起请求的占卜系统名称，用作指标标签
         
         Returns:
             完整响应文本或处理后的结果
@@ -422,14 +925,16 @@ class LLMConnector:
                 
                 # 获取流式生成器
                 logger.info("使用流式输出生成响应")
-                response_generator = self.generate_response_streaming(system_prompt, user_prompt)
+                response_generator = _inline_stream_errors(self.generate_response_streaming(
+                    system_prompt, user_prompt, priority=priority, plugin=plugin
+                ))
                 
                 # 使用提供的处理函数处理流式输出
                 return streaming_handler(response_generator, start_time)
             else:
                 # 使用标准方式
                 logger.info("使用标准方式生成响应")
-                response, metadata = self.generate_response(system_prompt, user_prompt)
+                response, metadata = self.generate_response(system_prompt, user_prompt, priority=priority, plugin=plugin)
                 
                 # 如果提供了非流式处理函数，使用它
                 if non_streaming_handler is not None:
@@ -439,46 +944,3 @@ class LLMConnector:
             logger.error(f"响应生成出错: {e}", exc_info=True)
             error_message = f"生成响应时出现错误: {str(e)}"
             return error_message
-
-    def _call_openai_streaming(self, system_prompt: str, user_prompt: str) -> Generator[str, None, None]:
-        """
-        Call the OpenAI API with streaming enabled.
-        
-        Args:
-            system_prompt: System prompt for the LLM
-            user_prompt: User prompt for the LLM
-            
-        Returns:
-            Generator yielding text chunks
-        """
-        if self.client is None:
-            yield "Error: OpenAI client not initialized"
-            return
-            
-        try:
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-            
-            # Create a streaming response
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                stream=True  # Enable streaming
-            )
-            
-            # Process the streaming response
-            for chunk in response:
-                if hasattr(chunk, 'choices') and chunk.choices:
-                    choice = chunk.choices[0]
-                    if hasattr(choice, 'delta') and hasattr(choice.delta, 'content'):
-                        content = choice.delta.content
-                        if content is not None:
-                            yield content
-                            
-        except Exception as e:
-            logger.error(f"OpenAI streaming API error: {e}")
-            yield f"\nError during streaming: {str(e)}"
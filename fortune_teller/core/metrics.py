@@ -0,0 +1,256 @@
+"""
+In-process metrics for the LLM connectors.
+Metrics are keyed by label values and collected in a process-wide registry
+that the CLI and the API server export in the Prometheus text format.
+"""
+import bisect
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Default histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Counter:
+    """
+    Monotonically increasing value per label combination.
+    """
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        """
+        Initialize the counter.
+
+        Args:
+            name: Metric name, e.g. "llm_stream_cancellations_total"
+            description: One-line description
+            label_names: Names of the labels every sample carries
+        """
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """
+        Increase the counter.
+
+        Args:
+            amount: Non-negative increment
+            **labels: Label values
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        """Current value for the given label values."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[Dict[str, str], float]]:
+        """All (labels, value) pairs recorded so far."""
+        with self._lock:
+            return [(dict(zip(self.label_names, key)), value) for key, value in self._values.items()]
+
+
+class Histogram:
+    """
+    Distribution of observed values per label combination, counted in
+    cumulative buckets like a Prometheus histogram.
+    """
+
+    def __init__(self,
+                 name: str,
+                 description: str,
+                 label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Initialize the histogram.
+
+        Args:
+            name: Metric name, e.g. "llm_request_duration_seconds"
+            description: One-line description
+            label_names: Names of the labels every sample carries
+            buckets: Increasing upper bounds of the buckets; +Inf is implied
+        """
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label combination: [bucket counts..., +Inf count], sum
+        self._values: Dict[LabelValues, Tuple[List[int], float]] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """
+        Record one value.
+
+        Args:
+            value: Observed value
+            **labels: Label values
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels: Any) -> int:
+        """Number of values observed for the given label values."""
+        with self._lock:
+            counts, _ = self._values.get(self._key(labels), ([], 0.0))
+            return sum(counts)
+
+    def samples(self) -> List[Tuple[Dict[str, str], Dict[str, Any]]]:
+        """
+        All (labels, value) pairs recorded so far. Values hold the cumulative
+        "buckets" as (upper bound, count) pairs, the "sum" and the "count".
+        """
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+
+        samples = []
+        for key, counts, total in values:
+            cumulative, running = [], 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                running += bucket_count
+                cumulative.append((bound, running))
+            samples.append((dict(zip(self.label_names, key)),
+                            {"buckets": cumulative, "sum": total, "count": running}))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Named metrics shared by every component in the process.
+    """
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str, label_names: Sequence[str] = ()) -> Counter:
+        """
+        Get or create a counter.
+
+        Args:
+            name: Metric name
+            description: One-line description, used when the counter is created
+            label_names: Label names, used when the counter is created
+
+        Returns:
+            Counter registered under the name
+        """
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = Counter(name, description, label_names)
+                self._metrics[name] = metric
+            return metric
+
+    def histogram(self,
+                  name: str,
+                  description: str,
+                  label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """
+        Get or create a histogram.
+
+        Args:
+            name: Metric name
+            description: One-line description, used when the histogram is created
+            label_names: Label names, used when the histogram is created
+            buckets: Bucket upper bounds, used when the histogram is created
+
+        Returns:
+            Histogram registered under the name
+        """
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = Histogram(name, description, label_names, buckets)
+                self._metrics[name] = metric
+            return metric
+
+    def snapshot(self) -> Dict[str, List[Tuple[Dict[str, str], Any]]]:
+        """
+        Read every metric.
+
+        Returns:
+            Dictionary of metric name to its (labels, value) samples
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.samples() for metric in metrics}
+
+    def render_prometheus(self) -> str:
+        """
+        Export every metric in the Prometheus text exposition format.
+
+        Returns:
+            Exposition text, ending with a newline
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+
+        lines = []
+        for metric in metrics:
+            kind = "histogram" if isinstance(metric, Histogram) else "counter"
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {kind}")
+            for labels, value in metric.samples():
+                if kind == "counter":
+                    lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                for bound, count in value["buckets"]:
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    lines.append(f"{metric.name}_bucket{_format_labels(labels, le=le)} {count}")
+                lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+                lines.append(f"{metric.name}_count{_format_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Dict[str, str], le: Optional[str] = None) -> str:
+    """Format label values as a Prometheus label set."""
+    pairs = list(labels.items())
+    if le is not None:
+        pairs.append(("le", le))
+    if not pairs:
+        return ""
+    formatted = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        formatted.append(f'{name}="{value}"')
+    return "{" + ",".join(formatted) + "}"
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value without a trailing ".0" on whole numbers."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# Registry shared by every connector in the process
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """
+    Get the process-wide metrics registry.
+
+    Returns:
+        Shared MetricsRegistry instance
+    """
+    return _registry
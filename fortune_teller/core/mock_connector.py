@@ -2,10 +2,13 @@
 Mock LLM Connector for fortune telling systems.
 Used as a fallback when no real LLM is available.
 """
+import os
+import asyncio
+import hashlib
 import logging
 import random
 import time
-from typing import Dict, Any, Tuple, Generator
+from typing import Dict, Any, Tuple, Generator, AsyncGenerator, Iterator, Optional
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
@@ -13,15 +16,132 @@ logging.basicConfig(level=logging.INFO,
 logger = logging.getLogger("MockConnector")
 
 
+# Header sent before every mock stream
+MOCK_STREAM_HEADER = "【注意：使用模拟流式输出】\n\n"
+
+# Options for chunk sizes (how many characters per chunk), biased toward smaller chunks
+CHUNK_SIZE_OPTIONS = [1, 1, 1, 2, 2, 3, 5]
+
+
+class MockLatencyProfile:
+    """
+    Timing model for mock responses.
+
+    Modes:
+        zero: no delays at all, for load tests and CI
+        fixed: constant time-to-first-token and inter-chunk gap
+        sampled: delays drawn from a uniform or exponential distribution
+    """
+
+    MODES = ("zero", "fixed", "sampled")
+
+    def __init__(self,
+                 mode: str = "sampled",
+                 ttft: float = 0.5,
+                 inter_token: float = 0.1,
+                 distribution: str = "uniform",
+                 ttft_range: Tuple[float, float] = (0.2, 0.7),
+                 inter_token_range: Tuple[float, float] = (0.05, 0.2),
+                 token_rate: Optional[float] = None):
+        """
+        Initialize the latency profile.
+
+        Args:
+            mode: One of "zero", "fixed" or "sampled"
+            ttft: Time to first token in seconds (fixed mode, or mean for exponential sampling)
+            inter_token: Gap between chunks in seconds (fixed mode, or mean for exponential sampling)
+            distribution: "uniform" or "exponential" (sampled mode)
+            ttft_range: (min, max) time to first token for uniform sampling
+            inter_token_range: (min, max) gap between chunks for uniform sampling
+            token_rate: Output characters per second; when set, the gap after
+                the first chunk is proportional to the chunk length (fixed and
+                sampled modes)
+        """
+        if mode not in self.MODES:
+            logger.warning(f"Unsupported mock latency mode: {mode}. Using sampled.")
+            mode = "sampled"
+        self.mode = mode
+        self.ttft = ttft
+        self.inter_token = inter_token
+        self.distribution = distribution
+        self.ttft_range = tuple(ttft_range)
+        self.inter_token_range = tuple(inter_token_range)
+        self.token_rate = token_rate
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any] = None) -> "MockLatencyProfile":
+        """
+        Create a profile from the ``llm.mock`` configuration section.
+        The FORTUNE_TELLER_MOCK_LATENCY environment variable overrides the mode.
+
+        Args:
+            config: Mock configuration dictionary
+
+        Returns:
+            Latency profile
+        """
+        config = config or {}
+        defaults = cls()
+        return cls(
+            mode=os.environ.get("FORTUNE_TELLER_MOCK_LATENCY") or config.get("latency", defaults.mode),
+            ttft=config.get("ttft", defaults.ttft),
+            inter_token=config.get("inter_token", defaults.inter_token),
+            distribution=config.get("distribution", defaults.distribution),
+            ttft_range=config.get("ttft_range", defaults.ttft_range),
+            inter_token_range=config.get("inter_token_range", defaults.inter_token_range),
+            token_rate=config.get("token_rate")
+        )
+
+    def first_token_delay(self, rng: random.Random) -> float:
+        """Seconds to wait before the first chunk."""
+        return self._delay(rng, self.ttft, self.ttft_range)
+
+    def inter_token_delay(self, rng: random.Random, chunk: str = "") -> float:
+        """Seconds to wait before a chunk that is not the first one."""
+        if self.token_rate and self.mode != "zero":
+            return len(chunk) / self.token_rate
+        return self._delay(rng, self.inter_token, self.inter_token_range)
+
+    def _delay(self, rng: random.Random, mean: float, bounds: Tuple[float, float]) -> float:
+        if self.mode == "zero":
+            return 0.0
+        if self.mode == "fixed":
+            return mean
+        if self.distribution == "exponential":
+            return rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+        return rng.uniform(*bounds)
+
+
 class MockConnector:
     """
     Mock connector that simulates LLM responses.
     Used for testing or when no LLM provider is available.
     """
     
-    def __init__(self):
-        """Initialize the mock connector."""
-        logger.info("Mock LLM connector initialized")
+    def __init__(self, config: Dict[str, Any] = None):
+        """
+        Initialize the mock connector.
+        
+        Args:
+            config: Mock configuration (``llm.mock``): latency profile settings and
+                an optional ``seed`` that makes response selection and chunking
+                reproducible
+        """
+        self.config = config or {}
+        self.latency = MockLatencyProfile.from_config(self.config)
+        self.seed = self.config.get("seed")
+        logger.info(f"Mock LLM connector initialized (latency: {self.latency.mode}, seed: {self.seed})")
+    
+    def _rng(self, system_prompt: str, user_prompt: str) -> random.Random:
+        """
+        Get the random source for one request.
+        With a seed, it is derived from the seed and the prompts, so results do
+        not depend on the order in which concurrent requests are served.
+        """
+        if self.seed is None:
+            return random.Random()
+        digest = hashlib.sha256(f"{system_prompt}\x00{user_prompt}".encode("utf-8")).hexdigest()
+        return random.Random(f"{self.seed}:{digest}")
     
     def generate_response(self, 
                         system_prompt: str, 
@@ -48,7 +168,7 @@ class MockConnector:
             system_name = "星座占星"
         
         # Get the appropriate mock response
-        response = self._get_mock_response(system_name, user_prompt)
+        response = self._get_mock_response(system_name, user_prompt, self._rng(system_prompt, user_prompt))
         
         metadata = {
             "mock": True,
@@ -59,7 +179,7 @@ class MockConnector:
         
         return response, metadata
 
-    def _get_mock_response(self, system_name: str, user_prompt: str) -> str:
+    def _get_mock_response(self, system_name: str, user_prompt: str, rng: random.Random) -> str:
         """Get an appropriate mock response based on the system and prompt."""
         
         # Check if this is for a tarot reading
@@ -74,7 +194,7 @@ class MockConnector:
             "## 模拟解读\n\n由于未能连接到LLM服务，系统正在使用模拟数据。请检查API密钥设置或网络连接，然后重试。"
         ]
         
-        return random.choice(responses)
+        return rng.choice(responses)
     
     def _generate_mock_tarot_reading(self) -> str:
         """Generate a more detailed mock tarot card reading."""
@@ -114,6 +234,45 @@ class MockConnector:
 
 记住,塔罗牌提供的是可能性而非绝对的预言,最终如何行动和选择始终掌握在你自己手中。"""
 
+    def _iter_chunks(self, text: str, rng: random.Random) -> Iterator[str]:
+        """Split a response into small chunks of random size."""
+        position = 0
+        while position < len(text):
+            # Random chunk size for more realistic streaming
+            chunk_size = min(rng.choice(CHUNK_SIZE_OPTIONS), len(text) - position)
+            yield text[position:position + chunk_size]
+            position += chunk_size
+    
+    def iter_timed_chunks(self,
+                          system_prompt: str,
+                          user_prompt: str,
+                          include_header: bool = True) -> Iterator[Tuple[float, str]]:
+        """
+        Plan a mock stream as (delay before the chunk, chunk) pairs.
+        
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
+            include_header: Whether to start with the mock-stream notice
+            
+        Returns:
+            Iterator of (seconds to wait, text chunk) pairs
+        """
+        full_response, _ = self.generate_response(system_prompt, user_prompt)
+        rng = self._rng(system_prompt, user_prompt)
+        
+        delay = self.latency.first_token_delay(rng)
+        if include_header:
+            # Add a header indicating this is a mock response
+            yield delay, MOCK_STREAM_HEADER
+            delay = None
+        
+        for chunk in self._iter_chunks(full_response, rng):
+            if delay is None:
+                delay = self.latency.inter_token_delay(rng, chunk)
+            yield delay, chunk
+            delay = None
+    
     def generate_response_streaming(self, 
                                    system_prompt: str, 
                                    user_prompt: str) -> Generator[str, None, None]:
@@ -129,30 +288,27 @@ class MockConnector:
         """
         logger.warning("Using mock streaming response - this is only for testing!")
         
-        # Get the full response first
-        full_response, _ = self.generate_response(system_prompt, user_prompt)
-        
-        # Add a header indicating this is a mock response
-        yield "【注意：使用模拟流式输出】\n\n"
-        time.sleep(0.2)
-        
-        # Determine chunking strategy - character by character is good for testing
-        chars = list(full_response)
-        
-        # Options for chunk sizes (how many characters per chunk)
-        chunk_size_options = [1, 1, 1, 2, 2, 3, 5]  # Bias toward smaller chunks
+        for delay, chunk in self.iter_timed_chunks(system_prompt, user_prompt):
+            if delay:
+                time.sleep(delay)
+            yield chunk
+    
+    async def agenerate_response_streaming(self,
+                                           system_prompt: str,
+                                           user_prompt: str) -> AsyncGenerator[str, None]:
+        """
+        Generate a streaming mock response without blocking the event loop.
         
-        position = 0
-        while position < len(chars):
-            # Random chunk size for more realistic streaming
-            chunk_size = min(random.choice(chunk_size_options), len(chars) - position)
+        Args:
+            system_prompt: System prompt for the LLM
+            user_prompt: User prompt for the LLM
             
-            # Get the next chunk
-            chunk = ''.join(chars[position:position+chunk_size])
+        Returns:
+            Async generator yielding text chunks
+        """
+        logger.warning("Using mock streaming response - this is only for testing!")
+        
+        for delay, chunk in self.iter_timed_chunks(system_prompt, user_prompt):
+            # Always yield control to the loop, even with zero latency
+            await asyncio.sleep(delay)
             yield chunk
-            
-            # Move position forward
-            position += chunk_size
-            
-            # Random delay between chunks (50-150ms)
-            time.sleep(random.uniform(0.05, 0.15))
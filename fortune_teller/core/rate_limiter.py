@@ -0,0 +1,240 @@
+"""
+Client-side rate limiting for LLM providers.
+Token buckets for requests per minute and estimated tokens per minute, shared
+by every connector in the process, with a priority queue for excess work.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Configure logging
+logger = logging.getLogger("RateLimiter")
+
+# Priority classes, most urgent first
+INTERACTIVE = "interactive"
+NORMAL = "normal"
+BULK = "bulk"
+PREFETCH = "prefetch"
+
+PRIORITIES = {INTERACTIVE: 0, NORMAL: 1, BULK: 2, PREFETCH: 3}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count of a text: about four ASCII characters per token and
+    one token per CJK or other non-ASCII character.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Estimated number of tokens
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+class TokenBucket:
+    """
+    Continuously refilled bucket holding up to one minute's worth of capacity.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize a full bucket.
+
+        Args:
+            per_minute: Refill rate and capacity
+            clock: Monotonic time source
+        """
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.available = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` is available (amounts are capped at the capacity)."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.available
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float) -> None:
+        """Remove ``amount`` from the bucket."""
+        self._refill()
+        self.available -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Limits the request and estimated token rate to one provider/model.
+
+    Requests that cannot start right away wait in a priority queue: a waiting
+    interactive request is always served before bulk or prefetch work.
+    Instances must only be used from a single event loop.
+    """
+
+    def __init__(self,
+                 name: str,
+                 requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the rate limiter.
+
+        Args:
+            name: Name used in logs, e.g. "openai:gpt-4"
+            requests_per_minute: Request budget, or None for no request limit
+            tokens_per_minute: Estimated token budget, or None for no token limit
+            clock: Monotonic time source
+        """
+        self.name = name
+        self._clock = clock
+        self._requests = TokenBucket(requests_per_minute, clock) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute, clock) if tokens_per_minute else None
+
+        # Heap of [rank, sequence, tokens, future]
+        self._waiters: List[List[Any]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        # Requests that had to queue, and their total wait in seconds
+        self.queued = 0
+        self.total_wait = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any limit is configured."""
+        return self._requests is not None or self._tokens is not None
+
+    @property
+    def queue_length(self) -> int:
+        """Number of requests currently waiting."""
+        return sum(1 for waiter in self._waiters if not waiter[3].done())
+
+    async def acquire(self, tokens: int = 0, priority: str = NORMAL) -> float:
+        """
+        Wait until a request with the given token estimate may start.
+
+        Args:
+            tokens: Estimated tokens of the request (prompt plus max output)
+            priority: One of the priority classes
+
+        Returns:
+            Seconds spent waiting
+        """
+        if not self.enabled:
+            return 0.0
+        if not self._waiters and self._wait_time(tokens) == 0:
+            self._take(tokens)
+            return 0.0
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        rank = PRIORITIES.get(priority, PRIORITIES[NORMAL])
+        heapq.heappush(self._waiters, [rank, next(self._sequence), tokens, future])
+        self.queued += 1
+        logger.debug(f"Queued {priority} request for {self.name} ({len(self._waiters)} waiting)")
+        self._reschedule()
+
+        started = self._clock()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just before the cancellation: hand the budget back
+                self._give_back(tokens)
+            self._reschedule()
+            raise
+        waited = self._clock() - started
+        self.total_wait += waited
+        return waited
+
+    def _wait_time(self, tokens: int) -> float:
+        wait = 0.0
+        if self._requests is not None:
+            wait = max(wait, self._requests.wait_time(1))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.wait_time(tokens))
+        return wait
+
+    def _take(self, tokens: int) -> None:
+        if self._requests is not None:
+            self._requests.take(1)
+        if self._tokens is not None:
+            self._tokens.take(tokens)
+
+    def _give_back(self, tokens: int) -> None:
+        if self._requests is not None:
+            self._requests.take(-1)
+        if self._tokens is not None:
+            self._tokens.take(-tokens)
+
+    def _dispatch(self) -> None:
+        """Grant budget to waiters in priority order while it lasts."""
+        self._timer = None
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                # Cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            if self._wait_time(tokens) > 0:
+                break
+            heapq.heappop(self._waiters)
+            self._take(tokens)
+            future.set_result(None)
+        self._reschedule()
+
+    def _reschedule(self) -> None:
+        """Arm a timer for when the first waiter can be served."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters and self._waiters[0][3].done():
+            heapq.heappop(self._waiters)
+        if not self._waiters:
+            return
+        delay = self._wait_time(self._waiters[0][2])
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+
+# Limiters shared by every connector in the process, keyed by provider and model
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str, config: Dict[str, Any] = None) -> RateLimiter:
+    """
+    Get the process-wide rate limiter for an upstream.
+
+    Args:
+        name: Upstream name, e.g. "openai:gpt-4"
+        config: Backend settings; ``requests_per_minute`` and ``tokens_per_minute``
+            are used when the limiter is created
+
+    Returns:
+        Shared RateLimiter instance
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            config = config or {}
+            limiter = RateLimiter(
+                name,
+                requests_per_minute=config.get("requests_per_minute"),
+                tokens_per_minute=config.get("tokens_per_minute")
+            )
+            _limiters[name] = limiter
+        return limiter
@@ -0,0 +1,366 @@
+"""
+Retry and circuit-breaking policies for LLM provider calls.
+Provider errors are classified without importing the provider SDKs, so the
+same policies apply to OpenAI, DeepSeek, Anthropic and AWS Bedrock.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+# Configure logging
+logger = logging.getLogger("Resilience")
+
+# Error classes
+THROTTLED = "throttled"
+SERVER_ERROR = "server_error"
+TIMEOUT = "timeout"
+CLIENT_ERROR = "client_error"
+
+# Classes worth retrying; they also count toward opening a circuit
+RETRYABLE = (THROTTLED, SERVER_ERROR, TIMEOUT)
+
+# Exception class names and AWS error codes, lower-cased, by error class
+_THROTTLED_NAMES = {
+    "ratelimiterror", "throttlingexception", "toomanyrequestsexception",
+    "servicequotaexceededexception",
+}
+_SERVER_ERROR_NAMES = {
+    "internalservererror", "internalserverexception", "serviceunavailableexception",
+    "serviceunavailableerror", "modelnotreadyexception", "modelstreamerrorexception",
+    "apiconnectionerror", "endpointconnectionerror", "connectionclosederror",
+    "overloadederror",
+}
+_TIMEOUT_NAMES = {
+    "timeouterror", "apitimeouterror", "readtimeouterror", "connecttimeouterror",
+    "modeltimeoutexception",
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit for {name} is open; retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """HTTP status of a provider error, if it carries one."""
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status
+    # botocore ClientError
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def _error_code(error: BaseException) -> str:
+    """AWS error code of a botocore ClientError, lower-cased, or an empty string."""
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        return str(response.get("Error", {}).get("Code", "")).lower()
+    return ""
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Classify a provider error.
+
+    Args:
+        error: Exception raised by a provider call
+
+    Returns:
+        One of THROTTLED, SERVER_ERROR, TIMEOUT or CLIENT_ERROR
+    """
+    names = {type(error).__name__.lower(), _error_code(error)}
+    if names & _THROTTLED_NAMES:
+        return THROTTLED
+    if names & _TIMEOUT_NAMES or isinstance(error, asyncio.TimeoutError):
+        return TIMEOUT
+    if names & _SERVER_ERROR_NAMES:
+        return SERVER_ERROR
+
+    status = _status_code(error)
+    if status == 429:
+        return THROTTLED
+    if status in (408, 504):
+        return TIMEOUT
+    if status is not None and status >= 500:
+        return SERVER_ERROR
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return TIMEOUT if isinstance(error, TimeoutError) else SERVER_ERROR
+    return CLIENT_ERROR
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a provider error is worth retrying."""
+    return classify_error(error) in RETRYABLE
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+    """
+
+    def __init__(self,
+                 max_attempts: int = 3,
+                 base_delay: float = 0.5,
+                 max_delay: float = 8.0):
+        """
+        Initialize the retry policy.
+
+        Args:
+            max_attempts: Total attempts, including the first one
+            base_delay: Backoff before the first retry, in seconds
+            max_delay: Upper bound for a single backoff, in seconds
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any] = None) -> "RetryPolicy":
+        """
+        Create a policy from the ``llm.retry`` configuration section.
+
+        Args:
+            config: Retry configuration dictionary
+
+        Returns:
+            Retry policy
+        """
+        config = config or {}
+        defaults = cls()
+        return cls(
+            max_attempts=config.get("max_attempts", defaults.max_attempts),
+            base_delay=config.get("base_delay", defaults.base_delay),
+            max_delay=config.get("max_delay", defaults.max_delay)
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Seconds to wait after a failed attempt.
+
+        Args:
+            attempt: Number of the failed attempt, starting at 1
+
+        Returns:
+            Randomized delay in seconds
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """
+    Fails fast while an upstream keeps failing.
+
+    closed: calls pass; consecutive retryable failures are counted
+    open: calls are rejected with CircuitOpenError until the recovery timeout passes
+    half-open: a single probe call is let through; its outcome closes or reopens the circuit
+    """
+
+    def __init__(self,
+                 name: str,
+                 failure_threshold: int = 5,
+                 recovery_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the circuit breaker.
+
+        Args:
+            name: Name used in logs and errors, e.g. "openai:gpt-4"
+            failure_threshold: Consecutive failures that open the circuit
+            recovery_timeout: Seconds to stay open before letting a probe through
+            clock: Monotonic time source
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+
+    def before_call(self) -> None:
+        """
+        Check that a call may proceed.
+
+        Raises:
+            CircuitOpenError: If the circuit is open or a probe is already in flight
+        """
+        with self._lock:
+            if self.state == "closed":
+                return
+            now = self._clock()
+            if self.state == "open":
+                remaining = self._opened_at + self.recovery_timeout - now
+                if remaining > 0:
+                    raise CircuitOpenError(self.name, remaining)
+                logger.info(f"Circuit {self.name} half-open, probing upstream")
+                self.state = "half_open"
+                self._probe_started = now
+                return
+            # Half-open: one probe at a time; a probe that never reported is replaced
+            if self._probe_started is not None and now - self._probe_started < self.recovery_timeout:
+                raise CircuitOpenError(self.name, self._probe_started + self.recovery_timeout - now)
+            self._probe_started = now
+
+    def record_success(self) -> None:
+        """Record a successful call and close the circuit."""
+        with self._lock:
+            if self.state != "closed":
+                logger.info(f"Circuit {self.name} closed")
+            self.state = "closed"
+            self.failures = 0
+            self._probe_started = None
+
+    def record_failure(self) -> None:
+        """Record a failed call, opening the circuit when the threshold is reached."""
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"Circuit {self.name} opened after {self.failures} failures")
+                self.state = "open"
+                self._opened_at = self._clock()
+                self._probe_started = None
+
+
+# Breakers shared by every connector in the process, keyed by provider and model
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str, config: Dict[str, Any] = None) -> CircuitBreaker:
+    """
+    Get the process-wide circuit breaker for an upstream.
+
+    Args:
+        name: Upstream name, e.g. "openai:gpt-4"
+        config: ``llm.circuit_breaker`` settings used when the breaker is created
+
+    Returns:
+        Shared CircuitBreaker instance
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            config = config or {}
+            breaker = CircuitBreaker(
+                name,
+                failure_threshold=config.get("failure_threshold", 5),
+                recovery_timeout=config.get("recovery_timeout", 30.0)
+            )
+            _breakers[name] = breaker
+        return breaker
+
+
+def _record_outcome(breaker: Optional[CircuitBreaker], error: Exception) -> str:
+    """Classify an error and count it against the breaker when it is the upstream's fault."""
+    kind = classify_error(error)
+    if breaker is not None:
+        if kind in RETRYABLE:
+            breaker.record_failure()
+        else:
+            # The upstream answered; the request itself was bad
+            breaker.record_success()
+    return kind
+
+
+async def call_with_retry(factory: Callable[[], Awaitable[Any]],
+                          policy: RetryPolicy,
+                          breaker: Optional[CircuitBreaker] = None) -> Any:
+    """
+    Await ``factory()``, retrying throttling, 5xx and timeout errors with backoff.
+
+    Args:
+        factory: Creates the coroutine for one attempt
+        policy: Retry policy
+        breaker: Circuit breaker guarding the upstream
+
+    Returns:
+        Result of the first successful attempt
+
+    Raises:
+        CircuitOpenError: If the circuit is open
+        Exception: The last provider error once retries are exhausted
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            kind = _record_outcome(breaker, e)
+            if kind not in RETRYABLE or attempt >= policy.max_attempts:
+                raise
+            delay = policy.backoff(attempt)
+            logger.warning(f"Attempt {attempt} failed ({kind}: {e}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+
+async def stream_with_retry(factory: Callable[[], AsyncIterator[Any]],
+                            policy: RetryPolicy,
+                            breaker: Optional[CircuitBreaker] = None) -> AsyncIterator[Any]:
+    """
+    Iterate ``factory()``, retrying like call_with_retry as long as nothing
+    has been yielded yet. Errors after the first chunk are raised, since a
+    retry would repeat text the caller has already received.
+
+    Args:
+        factory: Creates the async iterator for one attempt
+        policy: Retry policy
+        breaker: Circuit breaker guarding the upstream
+
+    Returns:
+        Async generator yielding the chunks of the successful attempt
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        if breaker is not None:
+            breaker.before_call()
+        started = False
+        source = factory()
+        try:
+            async for chunk in source:
+                started = True
+                yield chunk
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            kind = _record_outcome(breaker, e)
+            if started or kind not in RETRYABLE or attempt >= policy.max_attempts:
+                raise
+            delay = policy.backoff(attempt)
+            logger.warning(f"Stream attempt {attempt} failed ({kind}: {e}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        finally:
+            if hasattr(source, "aclose"):
+                await source.aclose()
+
+        if breaker is not None:
+            breaker.record_success()
+        return
@@ -0,0 +1,533 @@
+"""
+Response cache for LLM connectors.
+Provides stable cache keys and pluggable cache backends so that identical
+readings can be served without calling the LLM provider again.
+"""
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger("ResponseCache")
+
+# Default location of the on-disk cache
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "fortune_teller", "llm_cache.sqlite3"
+)
+
+# Default limits of the in-memory tier
+DEFAULT_MEMORY_MAX_ENTRIES = 1024
+DEFAULT_MEMORY_MAX_BYTES = 32 * 1024 * 1024
+
+# Seconds between writes of the access times of SQLite cache hits
+DEFAULT_ACCESS_FLUSH_INTERVAL = 60.0
+
+
+def make_cache_key(provider: str,
+                   model: str,
+                   temperature: float,
+                   system_prompt: str,
+                   user_prompt: str) -> str:
+    """
+    Build a cache key that is stable across processes and restarts.
+
+    Args:
+        provider: Name of the LLM provider
+        model: Name of the model
+        temperature: Sampling temperature
+        system_prompt: System prompt for the LLM
+        user_prompt: User prompt for the LLM
+
+    Returns:
+        Hex digest identifying the request
+    """
+    payload = json.dumps(
+        [provider, model, temperature, system_prompt, user_prompt],
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _response_size(response: Tuple[str, Dict[str, Any]]) -> int:
+    """Approximate the memory footprint of a cached response in bytes."""
+    text, metadata = response
+    return len(text.encode("utf-8")) + len(json.dumps(metadata, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class ResponseCache(ABC):
+    """Base class for LLM response cache backends."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Look up a cached response.
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            Tuple of (text response, metadata), or None on a miss
+        """
+        pass
+
+    @abstractmethod
+    def set(self, key: str, response: Tuple[str, Dict[str, Any]], model: str = None) -> None:
+        """
+        Store a response.
+
+        Args:
+            key: Cache key from make_cache_key
+            response: Tuple of (text response, metadata)
+            model: Model that produced the response
+        """
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+        pass
+
+    def lookup(self, key: str) -> Optional[Tuple[Tuple[str, Dict[str, Any]], Optional[str]]]:
+        """
+        Look up a cached response together with the model that produced it.
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            Tuple of (response, model), or None on a miss
+        """
+        response = self.get(key)
+        return None if response is None else (response, None)
+
+    async def aget(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Async version of ``get``; backends doing I/O keep it off the event loop."""
+        return self.get(key)
+
+    async def alookup(self, key: str) -> Optional[Tuple[Tuple[str, Dict[str, Any]], Optional[str]]]:
+        """Async version of ``lookup``; backends doing I/O keep it off the event loop."""
+        return self.lookup(key)
+
+    async def aset(self, key: str, response: Tuple[str, Dict[str, Any]], model: str = None) -> None:
+        """Async version of ``set``; backends doing I/O keep it off the event loop."""
+        self.set(key, response, model=model)
+
+    def invalidate_model(self, model: str) -> int:
+        """
+        Drop entries produced by a model.
+
+        Args:
+            model: Name of the model
+
+        Returns:
+            Number of entries removed
+        """
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get usage counters for the cache.
+
+        Returns:
+            Dictionary of counters
+        """
+        return {}
+
+    def close(self) -> None:
+        """Release any resources held by the cache."""
+        pass
+
+
+class MemoryResponseCache(ResponseCache):
+    """
+    Per-process LRU cache bounded by entry count and total size.
+    Keeps hit/miss/eviction counters for monitoring.
+    """
+
+    def __init__(self,
+                 ttl: Optional[float] = None,
+                 max_entries: Optional[int] = DEFAULT_MEMORY_MAX_ENTRIES,
+                 max_bytes: Optional[int] = DEFAULT_MEMORY_MAX_BYTES):
+        """
+        Initialize the in-memory cache.
+
+        Args:
+            ttl: Seconds an entry stays valid, or None for no expiry
+            max_entries: Maximum number of entries, or None for no limit
+            max_bytes: Maximum total size of entries in bytes, or None for no limit
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        # key -> (created_at, model, size, response), ordered from least to most recently used
+        self._entries: "OrderedDict[str, Tuple[float, Optional[str], int, Tuple[str, Dict[str, Any]]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            created_at, _, _, response = entry
+            if self.ttl is not None and time.time() - created_at > self.ttl:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def set(self, key: str, response: Tuple[str, Dict[str, Any]], model: str = None) -> None:
+        size = _response_size(response)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            # Entries larger than the whole budget are not worth keeping
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+
+            self._entries[key] = (time.time(), model, size, response)
+            self._bytes += size
+
+            while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries) or
+                (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_model(self, model: str) -> int:
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry[1] == model]
+            for key in keys:
+                self._remove(key)
+        if keys:
+            logger.debug(f"Invalidated {len(keys)} cached responses for model {model}")
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def _remove(self, key: str) -> None:
+        """Remove an entry and update the byte count. Caller holds the lock."""
+        entry = self._entries.pop(key)
+        self._bytes -= entry[2]
+
+
+class SQLiteResponseCache(ResponseCache):
+    """
+    On-disk cache backed by SQLite.
+    Safe to share between processes (e.g. several API server workers).
+    Reads only write to the database when a batch of access times is due;
+    the async methods run on an executor thread.
+    """
+
+    def __init__(self,
+                 path: str = DEFAULT_CACHE_PATH,
+                 ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 access_flush_interval: float = DEFAULT_ACCESS_FLUSH_INTERVAL):
+        """
+        Initialize the SQLite cache.
+
+        Args:
+            path: Path of the database file
+            ttl: Seconds an entry stays valid, or None for no expiry
+            max_entries: Maximum number of stored entries, or None for no limit
+            max_bytes: Maximum total size of stored values, or None for no limit
+            access_flush_interval: Seconds between writes of the access times of hits;
+                pending access times are also written before every write
+        """
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.access_flush_interval = access_flush_interval
+
+        # key -> time of the last hit not yet written to accessed_at
+        self._accessed: Dict[str, float] = {}
+        self._accessed_flushed_at = time.monotonic()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)"
+        )
+        self._conn.commit()
+
+        logger.info(f"SQLite response cache opened at {self.path}")
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        entry = self.lookup(key)
+        return None if entry is None else entry[0]
+
+    def lookup(self, key: str) -> Optional[Tuple[Tuple[str, Dict[str, Any]], Optional[str]]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at, model FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                # Expired entries are deleted on the next write
+                self.misses += 1
+                return None
+
+            value, _, model = row
+            self.hits += 1
+            self._accessed[key] = now
+            if time.monotonic() - self._accessed_flushed_at >= self.access_flush_interval:
+                self._flush_accessed()
+                self._conn.commit()
+
+        text, metadata = json.loads(value)
+        return (text, metadata), model
+
+    async def aget(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, key)
+
+    async def alookup(self, key: str) -> Optional[Tuple[Tuple[str, Dict[str, Any]], Optional[str]]]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.lookup, key)
+
+    async def aset(self, key: str, response: Tuple[str, Dict[str, Any]], model: str = None) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.set, key, response, model)
+
+    def _flush_accessed(self) -> None:
+        """Write the pending access times of hits. Caller holds the lock and commits."""
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()]
+            )
+            self._accessed.clear()
+        self._accessed_flushed_at = time.monotonic()
+
+    def set(self, key: str, response: Tuple[str, Dict[str, Any]], model: str = None) -> None:
+        value = json.dumps(list(response), ensure_ascii=False, default=str)
+        size = len(value.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            # Eviction picks the least recently used entries, so it needs the current access times
+            self._flush_accessed()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, value, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, value, size, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then least recently used ones until within limits."""
+        if self.ttl is not None:
+            self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+            )
+
+        if self.max_entries is None and self.max_bytes is None:
+            return
+
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+
+        excess_entries = count - self.max_entries if self.max_entries is not None else 0
+        excess_bytes = total - self.max_bytes if self.max_bytes is not None else 0
+        if excess_entries <= 0 and excess_bytes <= 0:
+            return
+
+        victims = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+        ):
+            if excess_entries <= 0 and excess_bytes <= 0:
+                break
+            victims.append((key,))
+            excess_entries -= 1
+            excess_bytes -= size
+
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        logger.debug(f"Evicted {len(victims)} entries from response cache")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._accessed.clear()
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            return {
+                "entries": entries,
+                "bytes": total,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_accessed()
+            self._conn.commit()
+            self._conn.close()
+
+
+class TieredResponseCache(ResponseCache):
+    """
+    In-memory LRU tier in front of a slower persistent cache.
+    Hits in the persistent tier are promoted into memory.
+    """
+
+    def __init__(self, memory: MemoryResponseCache, persistent: ResponseCache):
+        """
+        Initialize the tiered cache.
+
+        Args:
+            memory: Fast in-process tier
+            persistent: Slower shared tier
+        """
+        self.memory = memory
+        self.persistent = persistent
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        response = self.memory.get(key)
+        if response is not None:
+            return response
+        return self._promote(key, self.persistent.lookup(key))
+
+    async def aget(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        response = self.memory.get(key)
+        if response is not None:
+            return response
+        return self._promote(key, await self.persistent.alookup(key))
+
+    def _promote(self, key: str,
+                 entry: Optional[Tuple[Tuple[str, Dict[str, Any]], Optional[str]]]) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Copy a persistent hit into the memory tier and return its response."""
+        if entry is None:
+            return None
+
+        response, model = entry
+        self.memory.set(key, response, model=model)
+        return response
+
+    def set(self, key: str, response: Tuple[str, Dict[str, Any]], model: str = None) -> None:
+        self.memory.set(key, response, model=model)
+        self.persistent.set(key, response, model=model)
+
+    async def aset(self, key: str, response: Tuple[str, Dict[str, Any]], model: str = None) -> None:
+        self.memory.set(key, response, model=model)
+        await self.persistent.aset(key, response, model=model)
+
+    def invalidate_model(self, model: str) -> int:
+        # Persistent entries are keyed by model and stay valid for later use
+        return self.memory.invalidate_model(model)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        self.persistent.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.stats(),
+            "persistent": self.persistent.stats()
+        }
+
+    def close(self) -> None:
+        self.persistent.close()
+
+
+def create_response_cache(config: Dict[str, Any] = None) -> ResponseCache:
+    """
+    Create a response cache from the ``llm.cache`` configuration section.
+
+    Args:
+        config: Cache configuration. Supported keys are ``backend``
+            ("memory" or "sqlite"), ``path``, ``ttl``, ``max_entries``,
+            ``max_bytes``, ``memory_max_entries`` and ``memory_max_bytes``.
+
+    Returns:
+        Response cache instance
+    """
+    config = config or {}
+    backend = config.get("backend", "memory")
+    ttl = config.get("ttl")
+
+    if backend == "memory":
+        return MemoryResponseCache(
+            ttl=ttl,
+            max_entries=config.get("max_entries", DEFAULT_MEMORY_MAX_ENTRIES),
+            max_bytes=config.get("max_bytes", DEFAULT_MEMORY_MAX_BYTES)
+        )
+
+    memory = MemoryResponseCache(
+        ttl=ttl,
+        max_entries=config.get("memory_max_entries", DEFAULT_MEMORY_MAX_ENTRIES),
+        max_bytes=config.get("memory_max_bytes", DEFAULT_MEMORY_MAX_BYTES)
+    )
+
+    if backend == "sqlite":
+        try:
+            persistent = SQLiteResponseCache(
+                path=config.get("path", DEFAULT_CACHE_PATH),
+                ttl=ttl,
+                max_entries=config.get("max_entries"),
+                max_bytes=config.get("max_bytes")
+            )
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Failed to open SQLite response cache, using memory cache: {e}")
+            return memory
+        return TieredResponseCache(memory, persistent)
+
+    logger.warning(f"Unsupported cache backend: {backend}. Using memory cache.")
+    return memory
@@ -0,0 +1,402 @@
+"""
+Storage of generated readings served by the API servers.
+Results are kept as compressed JSON, bounded in number and age; the SQLite
+backend makes them visible to every worker process and keeps them across
+restarts.
+"""
+import os
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger("ResultStore")
+
+# Default location of the on-disk store
+DEFAULT_STORE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "fortune_teller", "results.sqlite3"
+)
+
+# Default limits
+DEFAULT_TTL = 30 * 24 * 3600
+DEFAULT_MEMORY_MAX_ENTRIES = 1024
+DEFAULT_MAX_ENTRIES = 100000
+
+
+def encode_result(result: Dict[str, Any]) -> bytes:
+    """
+    Serialize a result as zlib-compressed JSON.
+
+    Args:
+        result: JSON-serializable result
+
+    Returns:
+        Compressed bytes
+    """
+    return zlib.compress(json.dumps(result, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8"))
+
+
+def decode_result(value: bytes) -> Dict[str, Any]:
+    """
+    Deserialize a result stored by encode_result.
+
+    Args:
+        value: Compressed bytes
+
+    Returns:
+        Result dictionary
+    """
+    return json.loads(zlib.decompress(value).decode("utf-8"))
+
+
+class ResultStore(ABC):
+    """Base class for result store backends."""
+
+    @abstractmethod
+    def get(self, result_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a result.
+
+        Args:
+            result_id: Result ID
+
+        Returns:
+            Result dictionary, or None if it does not exist or has expired
+        """
+        pass
+
+    @abstractmethod
+    def put(self, result_id: str, result: Dict[str, Any]) -> None:
+        """
+        Store a result, replacing any result with the same ID.
+
+        Args:
+            result_id: Result ID
+            result: JSON-serializable result
+        """
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every result."""
+        pass
+
+    def lookup(self, result_id: str) -> Optional[Tuple[bytes, float]]:
+        """
+        Look up the encoded form of a result.
+
+        Args:
+            result_id: Result ID
+
+        Returns:
+            Tuple of (compressed result, creation time), or None on a miss
+        """
+        result = self.get(result_id)
+        return None if result is None else (encode_result(result), time.time())
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get usage counters for the store.
+
+        Returns:
+            Dictionary of counters
+        """
+        return {}
+
+    def close(self) -> None:
+        """Release any resources held by the store."""
+        pass
+
+
+class MemoryResultStore(ResultStore):
+    """
+    Per-process LRU store bounded by entry count and age.
+    Results are kept compressed, so memory use stays proportional to the limit.
+    """
+
+    def __init__(self,
+                 ttl: Optional[float] = DEFAULT_TTL,
+                 max_entries: Optional[int] = DEFAULT_MEMORY_MAX_ENTRIES):
+        """
+        Initialize the in-memory store.
+
+        Args:
+            ttl: Seconds a result stays available, or None for no expiry
+            max_entries: Maximum number of results, or None for no limit
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        # result_id -> (created_at, compressed result), ordered from least to most recently used
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, result_id: str) -> Optional[Dict[str, Any]]:
+        entry = self.lookup(result_id)
+        return None if entry is None else decode_result(entry[0])
+
+    def lookup(self, result_id: str) -> Optional[Tuple[bytes, float]]:
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            created_at, value = entry
+            if self.ttl is not None and time.time() - created_at > self.ttl:
+                self._remove(result_id)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(result_id)
+            self.hits += 1
+            return value, created_at
+
+    def put(self, result_id: str, result: Dict[str, Any]) -> None:
+        self.store(result_id, encode_result(result), time.time())
+
+    def store(self, result_id: str, value: bytes, created_at: float) -> None:
+        """
+        Store an already encoded result.
+
+        Args:
+            result_id: Result ID
+            value: Compressed result from encode_result
+            created_at: Creation time the TTL counts from
+        """
+        with self._lock:
+            if result_id in self._entries:
+                self._remove(result_id)
+            self._entries[result_id] = (created_at, value)
+            self._bytes += len(value)
+
+            while self.max_entries is not None and len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def _remove(self, result_id: str) -> None:
+        """Remove an entry and update the byte count. Caller holds the lock."""
+        _, value = self._entries.pop(result_id)
+        self._bytes -= len(value)
+
+
+class SQLiteResultStore(ResultStore):
+    """
+    On-disk store backed by SQLite.
+    Shared by every worker process using the same path.
+    """
+
+    def __init__(self,
+                 path: str = DEFAULT_STORE_PATH,
+                 ttl: Optional[float] = DEFAULT_TTL,
+                 max_entries: Optional[int] = DEFAULT_MAX_ENTRIES):
+        """
+        Initialize the SQLite store.
+
+        Args:
+            path: Path of the database file
+            ttl: Seconds a result stays available, or None for no expiry
+            max_entries: Maximum number of stored results, or None for no limit
+        """
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " id TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_results_created ON results (created_at)"
+        )
+        self._conn.commit()
+
+        logger.info(f"SQLite result store opened at {self.path}")
+
+    def get(self, result_id: str) -> Optional[Dict[str, Any]]:
+        entry = self.lookup(result_id)
+        return None if entry is None else decode_result(entry[0])
+
+    def lookup(self, result_id: str) -> Optional[Tuple[bytes, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM results WHERE id = ?", (result_id,)
+            ).fetchone()
+            if row is None or (self.ttl is not None and time.time() - row[1] > self.ttl):
+                # Expired rows are deleted on the next write
+                self.misses += 1
+                return None
+            self.hits += 1
+        return bytes(row[0]), row[1]
+
+    def put(self, result_id: str, result: Dict[str, Any]) -> None:
+        now = time.time()
+        value = encode_result(result)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (id, value, created_at) VALUES (?, ?, ?)",
+                (result_id, sqlite3.Binary(value), now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """Drop expired results, then the oldest ones until within the entry limit."""
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl,))
+
+        if self.max_entries is None:
+            return
+
+        count = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM results WHERE id IN (SELECT id FROM results ORDER BY created_at ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+            logger.debug(f"Evicted {count - self.max_entries} results")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM results"
+            ).fetchone()
+            return {
+                "entries": entries,
+                "bytes": total,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class TieredResultStore(ResultStore):
+    """
+    In-memory LRU tier in front of a shared persistent store.
+    Results are immutable once stored, so the memory tier never goes stale.
+    """
+
+    def __init__(self, memory: MemoryResultStore, persistent: ResultStore):
+        """
+        Initialize the tiered store.
+
+        Args:
+            memory: Fast in-process tier
+            persistent: Slower shared tier
+        """
+        self.memory = memory
+        self.persistent = persistent
+
+    def get(self, result_id: str) -> Optional[Dict[str, Any]]:
+        entry = self.lookup(result_id)
+        return None if entry is None else decode_result(entry[0])
+
+    def lookup(self, result_id: str) -> Optional[Tuple[bytes, float]]:
+        entry = self.memory.lookup(result_id)
+        if entry is not None:
+            return entry
+
+        entry = self.persistent.lookup(result_id)
+        if entry is not None:
+            # Keep the original creation time so the result expires on schedule
+            self.memory.store(result_id, *entry)
+        return entry
+
+    def put(self, result_id: str, result: Dict[str, Any]) -> None:
+        self.persistent.put(result_id, result)
+        self.memory.put(result_id, result)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        self.persistent.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.stats(),
+            "persistent": self.persistent.stats()
+        }
+
+    def close(self) -> None:
+        self.persistent.close()
+
+
+def create_result_store(config: Dict[str, Any] = None) -> ResultStore:
+    """
+    Create a result store from the ``api.result_store`` configuration section.
+
+    Args:
+        config: Store configuration. Supported keys are ``backend``
+            ("memory" or "sqlite"), ``path``, ``ttl``, ``max_entries`` and
+            ``memory_max_entries``.
+
+    Returns:
+        Result store instance
+    """
+    config = config or {}
+    backend = config.get("backend", "memory")
+    ttl = config.get("ttl", DEFAULT_TTL)
+
+    if backend == "memory":
+        return MemoryResultStore(ttl=ttl, max_entries=config.get("max_entries", DEFAULT_MEMORY_MAX_ENTRIES))
+
+    memory = MemoryResultStore(ttl=ttl, max_entries=config.get("memory_max_entries", DEFAULT_MEMORY_MAX_ENTRIES))
+
+    if backend == "sqlite":
+        try:
+            persistent = SQLiteResultStore(
+                path=config.get("path", DEFAULT_STORE_PATH),
+                ttl=ttl,
+                max_entries=config.get("max_entries", DEFAULT_MAX_ENTRIES)
+            )
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Failed to open SQLite result store, using memory store: {e}")
+            return memory
+        return TieredResultStore(memory, persistent)
+
+    logger.warning(f"Unsupported result store backend: {backend}. Using memory store.")
+    return memory
@@ -0,0 +1,160 @@
+"""
+Request coalescing for the LLM connectors.
+Concurrent callers asking for the same thing share a single upstream call.
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+# Configure logging
+logger = logging.getLogger("SingleFlight")
+
+
+class _Call:
+    """An in-flight call and the number of callers waiting on it."""
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class _Broadcast:
+    """An in-flight stream whose chunks are replayed to every subscriber."""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.changed = asyncio.Condition()
+        self.task: Optional["asyncio.Task"] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+    Instances must only be used from a single event loop.
+    """
+
+    def __init__(self):
+        """Initialize the coalescing registry."""
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+
+        # Number of callers served by another caller's upstream call
+        self.coalesced = 0
+
+    def in_flight(self, key: str) -> bool:
+        """Whether a call with the given key is currently running."""
+        return key in self._calls
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run ``factory()`` unless a call with the same key is already in flight,
+        in which case wait for that call and share its result.
+
+        The upstream call is only cancelled once every waiting caller is cancelled.
+
+        Args:
+            key: Identity of the call
+            factory: Creates the coroutine to run
+
+        Returns:
+            Result of the (possibly shared) call
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+        else:
+            self.coalesced += 1
+            logger.debug(f"Joining in-flight call {key[:12]}")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    async def stream(self,
+                     key: str,
+                     factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Iterate ``factory()`` unless a stream with the same key is already in
+        flight, in which case subscribe to it. Late subscribers first receive
+        the chunks produced so far.
+
+        The upstream stream is cancelled once every subscriber has gone away.
+
+        Args:
+            key: Identity of the stream
+            factory: Creates the async iterator to consume
+
+        Returns:
+            Async generator yielding the shared chunks
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, factory))
+        else:
+            self.coalesced += 1
+            logger.debug(f"Subscribing to in-flight stream {key[:12]}")
+
+        broadcast.subscribers += 1
+        position = 0
+        try:
+            while True:
+                while position < len(broadcast.chunks):
+                    yield broadcast.chunks[position]
+                    position += 1
+
+                if broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+
+                async with broadcast.changed:
+                    await broadcast.changed.wait_for(
+                        lambda: len(broadcast.chunks) > position or broadcast.done
+                    )
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                broadcast.task.cancel()
+                self._forget(self._streams, key, broadcast)
+
+    async def _pump(self,
+                    key: str,
+                    broadcast: _Broadcast,
+                    factory: Callable[[], AsyncIterator[Any]]) -> None:
+        """Consume the upstream stream and notify subscribers of each chunk."""
+        source = factory()
+        try:
+            async for chunk in source:
+                broadcast.chunks.append(chunk)
+                async with broadcast.changed:
+                    broadcast.changed.notify_all()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            broadcast.done = True
+            self._forget(self._streams, key, broadcast)
+            if hasattr(source, "aclose"):
+                await source.aclose()
+            async with broadcast.changed:
+                broadcast.changed.notify_all()
+
+    @staticmethod
+    def _forget(registry: Dict[str, Any], key: str, entry: Any) -> None:
+        """Remove a finished entry unless it has already been replaced."""
+        if registry.get(key) is entry:
+            del registry[key]
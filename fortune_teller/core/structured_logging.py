@@ -0,0 +1,183 @@
+"""
+Logging of LLM requests and process-wide logging setup.
+
+Requests are logged as one record carrying prompt hashes and sizes instead
+of the prompt bodies; full prompts are only attached for a sampled fraction
+of requests or when DEBUG logging is enabled. Messages are formatted lazily,
+and ``configure_logging`` can move handler I/O to a background thread and
+switch the output to JSON lines.
+"""
+import json
+import atexit
+import queue
+import random
+import hashlib
+import logging
+import datetime
+import threading
+import logging.handlers
+from typing import Dict, Any, Optional
+
+# Fraction of requests logged with their full prompts (logging.sample_rate)
+_sample_rate = 0.0
+
+# Background listener of the queue handler, if installed
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+# Attributes every LogRecord has; anything else was passed in ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def prompt_hash(text: str) -> str:
+    """
+    Short, stable identifier of a prompt, to correlate log records without the prompt text.
+
+    Args:
+        text: Prompt text
+
+    Returns:
+        First 12 hex digits of the SHA-256 of the text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+class LazyFields:
+    """Key=value rendering of log fields, built only when a handler emits the record."""
+
+    def __init__(self, fields: Dict[str, Any]):
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return " ".join(f"{key}={value!r}" if isinstance(value, str) and " " in value else f"{key}={value}"
+                        for key, value in self.fields.items())
+
+
+def log_llm_request(logger: logging.Logger,
+                    event: str,
+                    system_prompt: str,
+                    user_prompt: str,
+                    **fields: Any) -> None:
+    """
+    Log an LLM request as a single structured INFO record.
+
+    Args:
+        logger: Logger to write to
+        event: Event name, e.g. "llm_request" or "llm_stream_request"
+        system_prompt: System prompt of the request
+        user_prompt: User prompt of the request
+        **fields: Further fields, e.g. provider and model
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return
+
+    record_fields = {"event": event}
+    record_fields.update(fields)
+    record_fields.update({
+        "system_prompt_hash": prompt_hash(system_prompt),
+        "system_prompt_chars": len(system_prompt),
+        "user_prompt_hash": prompt_hash(user_prompt),
+        "user_prompt_chars": len(user_prompt),
+    })
+    if logger.isEnabledFor(logging.DEBUG) or (_sample_rate and random.random() < _sample_rate):
+        record_fields["system_prompt"] = system_prompt
+        record_fields["user_prompt"] = user_prompt
+
+    logger.info("%s", LazyFields(record_fields), extra={"fields": record_fields})
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats records as JSON lines, merging the ``fields`` of request records."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        fields = getattr(record, "fields", None)
+        if isinstance(fields, dict):
+            entry.update(fields)
+        else:
+            entry["message"] = record.getMessage()
+        # Other values passed in ``extra``
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key != "fields":
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves message formatting to the listener thread.
+    The standard handler formats every record in the logging thread; here
+    only the exception traceback, which cannot outlive the call, is rendered.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(config: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Apply the ``logging`` configuration section to the root logger.
+
+    Args:
+        config: Logging configuration:
+            structured: Write JSON lines instead of plain text (default False)
+            sample_rate: Fraction of LLM requests logged with full prompts (default 0)
+            queue: Hand records to a background thread so that logging never
+                waits for file I/O (default True)
+    """
+    global _sample_rate, _listener
+    config = config or {}
+    _sample_rate = float(config.get("sample_rate", 0.0))
+
+    with _lock:
+        # Reconfiguring starts from the handlers behind the queue
+        _stop_listener()
+        root = logging.getLogger()
+        handlers = list(root.handlers)
+        if config.get("structured", False):
+            for handler in handlers:
+                handler.setFormatter(StructuredFormatter())
+
+        if config.get("queue", True) and handlers:
+            for handler in handlers:
+                root.removeHandler(handler)
+            records = queue.Queue(-1)
+            root.addHandler(DeferredQueueHandler(records))
+            _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+            _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records, stop the background logging thread and log directly again."""
+    with _lock:
+        _stop_listener()
+
+
+def _stop_listener() -> None:
+    """Stop the listener and put its handlers back on the root logger; call with the lock held."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, DeferredQueueHandler):
+            root.removeHandler(handler)
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    _listener = None
+
+
+atexit.register(shutdown_logging)
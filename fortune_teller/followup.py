@@ -0,0 +1,332 @@
+"""
+Follow-up topics for the fortune telling systems.
+Builds the prompts for in-depth readings on a single topic after a main
+reading, and optionally prefetches them into the response cache in the
+background so that picking a topic returns without waiting for the LLM.
+"""
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from typing import Any, Dict, List, Optional, Tuple
+
+from fortune_teller.core.async_runner import get_runner
+from fortune_teller.core.rate_limiter import PREFETCH, estimate_tokens
+
+# Configure logging
+logger = logging.getLogger("Followup")
+
+# Follow-up topics and their instructions, in menu order, by fortune system
+FOLLOWUP_TOPICS = {
+    "bazi": {
+        "🧠 性格命格": "请详细分析此八字主人的性格特点、才能倾向和行为模式，使用生动有趣的比喻和例子。",
+        "💼 事业财运": "请详细分析此八字主人的事业发展、适合行业和财富机遇，用风趣幽默的方式给出具体建议。",
+        "❤️ 婚姻情感": "请详细分析此八字主人的感情状况、婚姻倾向和桃花运势，以诙谐但不油腻的方式提供见解。",
+        "🧘 健康寿元": "请详细分析此八字主人的健康状况、潜在问题和养生建议，用轻松方式点出需要注意的地方。",
+        "🔄 流年大运": "请详细分析此八字主人近期和未来的运势变化、关键时间点，神秘而又不失风趣地展望未来。"
+    },
+    "tarot": {
+        "🌟 核心启示": "请详细分析此塔罗牌阵的核心信息和主要启示，用深入而通俗的语言揭示关键洞见。",
+        "🚶 当前处境": "请详细分析求测者目前所处的状况、面临的环境和心理状态，用生动的比喻帮助理解。",
+        "🧭 阻碍与助力": "请详细分析求测者当前面临的挑战和可利用的资源，提供创造性的思路和实用建议。",
+        "🛤️ 潜在路径": "请详细分析求测者可能的发展方向和选择建议，以温和但明确的方式指出各种可能性。",
+        "💫 精神成长": "请详细分析求测者的内在成长和个人转变的机会，用启发性的方式鼓励自我探索。"
+    },
+    "zodiac": {
+        "🪐 星盘解析": "请详细分析这份星盘的整体特点、行星角度及主要影响，用清晰易懂的方式解释复杂的星象关系。",
+        "🌠 宫位能量": "请详细分析星盘中重要宫位的能量分布和影响，特别关注上升、中天、下降和天底宫。",
+        "🔄 当前行运": "请详细分析当前行星运行对求测者的影响，指出关键的行星相位和过境现象。",
+        "🌈 元素平衡": "请详细分析星盘中的元素与能量分布，说明火、土、风、水四元素的平衡状态与缺失情况。",
+        "✨ 星座年运": "请详细预测未来一年内的星象变化及其对求测者的影响，用鼓舞人心的方式展望未来机遇。"
+    },
+}
+
+# Topics for any other system
+DEFAULT_FOLLOWUP_TOPICS = {
+    "性格特点": "请详细分析此命盘主人的性格特点、才能倾向和行为模式，使用生动有趣的比喻和例子。",
+    "事业财运": "请详细分析此命盘主人的事业发展、适合行业和财富机遇，用风趣幽默的方式给出具体建议。",
+    "感情姻缘": "请详细分析此命盘主人的感情状况、婚姻倾向和桃花运势，以诙谐但不油腻的方式提供见解。",
+    "健康提示": "请详细分析此命盘主人的健康状况、潜在问题和养生建议，用轻松方式点出需要注意的地方。",
+    "大运流年": "请详细分析此命盘主人近期和未来的运势变化、关键时间点，神秘而又不失风趣地展望未来。"
+}
+
+# Emoji prefixes used in topic names
+TOPIC_EMOJIS = ["🧠", "💼", "❤️", "🧘", "🔄", "🌟", "🚶", "🧭", "🛤️", "💫", "🪐", "🌠", "🌈", "✨", "💬"]
+
+# System prompts do not depend on the topic, so providers can cache them
+FOLLOWUP_SYSTEM_PROMPTS = {
+    "bazi": """你是"霄占"，一位来自中国的八字命理学大师，已有30年的占卜经验，性格风趣幽默又不失智慧。
+你刚刚为求测者提供了基本的八字命理分析。现在，求测者想就其中某个方面了解更深入详尽的解读，具体方面和要求见求测者的消息。
+
+请确保你的回答既专业又风趣，像一位和蔼可亲的长辈聊天，而不是冷冰冰的说教。让求测者感到轻松愉快，同时获得有价值的人生启示。
+
+你的分析应既有专业水准，又富含情趣价值，可以巧妙地引用一些谚语、典故或生活小故事来帮助理解。
+""",
+    "tarot": """你是"霄占"，一位精通塔罗牌解读的大师，拥有深厚的神秘学知识和20年的塔罗牌解读经验。
+你刚刚为求测者提供了基本的塔罗牌阵解析。现在，求测者想就其中某个方面了解更深入详尽的解读，具体方面和要求见求测者的消息。
+
+你的风格睿智而神秘，充满着智慧与洞察力，但同时也很亲和，能用生动的语言将复杂的符号象征转化为直观的理解。
+
+你的解读应当既有专业深度，又有灵性启发，可以适当引用一些神话、传说或象征学知识来丰富分析。
+""",
+    "zodiac": """你是"霄占"，一位精通西方占星学的专家，有着丰富的占星咨询经验。
+你刚刚为求测者提供了基本的星盘分析。现在，求测者想就其中某个方面了解更深入详尽的解读，具体方面和要求见求测者的消息。
+
+你的风格既有专业深度，又不乏幽默感，能够用生动的比喻和实例解释复杂的星象。你既尊重占星学的传统知识，
+又不会完全决定论，而是强调每个人都有自由意志来选择如何应对星象影响。
+
+你的解读应当平衡、客观，避免过于绝对化的预测。提供实用的建议和观点，帮助咨询者更好地理解自己和当前的能量影响。
+""",
+}
+
+DEFAULT_FOLLOWUP_SYSTEM_PROMPT = """你是"霄占"，一位来自中国的命理学大师，已有30年的占卜经验，性格风趣幽默又不失智慧。
+你刚刚为求测者提供了基本的命理分析。现在，求测者想就其中某个方面了解更深入详尽的解读，具体方面和要求见求测者的消息。
+
+请确保你的回答既专业又风趣，像一位和蔼可亲的长辈聊天，而不是冷冰冰的说教。让求测者感到轻松愉快，同时获得有价值的人生启示。
+
+你的分析应既有专业水准，又富含情趣价值，可以巧妙地引用一些谚语、典故或生活小故事来帮助理解。
+"""
+
+
+def get_followup_topics(system_name: str) -> Dict[str, str]:
+    """
+    Get the follow-up topics of a fortune system.
+
+    Args:
+        system_name: Name of the fortune system
+
+    Returns:
+        Dictionary of topic name to topic instructions, in menu order
+    """
+    return FOLLOWUP_TOPICS.get(system_name, DEFAULT_FOLLOWUP_TOPICS)
+
+
+def clean_topic_name(topic: str) -> str:
+    """
+    Strip the emoji prefix from a topic name.
+
+    Args:
+        topic: Topic name as shown in the menu
+
+    Returns:
+        Topic name without emoji
+    """
+    if any(emoji in topic for emoji in TOPIC_EMOJIS):
+        return topic[2:].strip()
+    return topic
+
+
+def build_followup_prompts(system_name: str,
+                           processed_data: Dict[str, Any],
+                           topic: str) -> Dict[str, str]:
+    """
+    Build the LLM prompts for a follow-up reading.
+
+    Args:
+        system_name: Name of the fortune system of the main reading
+        processed_data: Processed data of the main reading
+        topic: Follow-up topic
+
+    Returns:
+        Dictionary with "system_prompt" and "user_prompt"
+    """
+    clean_topic = clean_topic_name(topic)
+    topic_description = get_followup_topics(system_name).get(topic)
+    if topic_description is None:
+        topic_description = f"请详细分析{clean_topic}方面的信息，用清晰易懂的语言提供有见解的解读。"
+
+    system_prompt = FOLLOWUP_SYSTEM_PROMPTS.get(system_name, DEFAULT_FOLLOWUP_SYSTEM_PROMPT)
+
+    if system_name == "bazi":
+        user_prompt = f"""基于刚才的八字分析，请详细解读"{clean_topic}"方面的信息。{topic_description}
+
+四柱八字：
+{processed_data["four_pillars"]["year"]} {processed_data["four_pillars"]["month"]} {processed_data["four_pillars"]["day"]} {processed_data["four_pillars"]["hour"]}
+
+性别: {processed_data["gender"]}
+出生日期: {processed_data["birth_date"]}
+出生时间: {processed_data["birth_time"]}
+
+日主: {processed_data["day_master"]["character"]} ({processed_data["day_master"]["element"]})
+最强五行: {processed_data["elements"]["strongest"]}
+最弱五行: {processed_data["elements"]["weakest"]}
+
+请提供详细而有趣的"{clean_topic}"分析。"""
+    elif system_name == "tarot":
+        # Reconstruct tarot reading summary from processed data
+        card_info = ""
+        if "reading" in processed_data:
+            for i, card in enumerate(processed_data["reading"], 1):
+                position = card.get("position", f"位置{i}")
+                card_name = card.get("card", "")
+                orientation = card.get("orientation", "")
+                card_info += f"{position}: {card_name} ({orientation})\n"
+
+        user_prompt = f"""基于刚才的塔罗牌阵分析，请详细解读"{clean_topic}"方面的信息。{topic_description}
+
+塔罗牌阵：{processed_data.get("spread", {}).get("name", "未知牌阵")}
+问题：{processed_data.get("question", "未知")}
+领域：{processed_data.get("focus_area", "未知")}
+
+抽取的牌：
+{card_info}
+
+请提供详细而有深度的"{clean_topic}"分析。"""
+    elif system_name == "zodiac":
+        # Construct zodiac reading summary from processed data
+        sign_info = processed_data.get("zodiac_sign", {})
+
+        user_prompt = f"""基于刚才的星盘分析，请详细解读"{clean_topic}"方面的信息。{topic_description}
+
+太阳星座：{sign_info.get("name", "未知")} ({sign_info.get("english", "Unknown")})
+月亮星座：{processed_data.get("moon_sign", "未知")}
+上升星座：{processed_data.get("rising_sign", "未知")}
+
+元素：{sign_info.get("element", "未知")}
+品质：{sign_info.get("quality", "未知")}
+主宰星：{sign_info.get("ruler", "未知")}
+
+关注领域：{processed_data.get("question_area", "未知")}
+
+请提供详细而有洞见的"{clean_topic}"分析。"""
+    else:
+        # Generic prompt as fallback
+        user_prompt = f"""基于刚才的命理分析，请详细解读"{clean_topic}"方面的信息。{topic_description}
+
+请提供详细而有专业的"{clean_topic}"分析。"""
+
+    return {"system_prompt": system_prompt, "user_prompt": user_prompt}
+
+
+class FollowupPrefetcher:
+    """
+    Speculatively generates the follow-up readings of a main reading.
+
+    All topics are requested concurrently at prefetch priority, so they only
+    use rate-limit budget that interactive requests leave free, and the
+    responses land in the connector's response cache. A follow-up request
+    for a topic that is still being prefetched joins the in-flight call.
+    """
+
+    def __init__(self, llm_connector: Any, config: Dict[str, Any] = None):
+        """
+        Initialize the prefetcher.
+
+        Args:
+            llm_connector: LLMConnector whose cache receives the responses
+            config: ``llm.prefetch`` settings; ``enabled`` turns prefetching on
+                and ``token_budget`` caps the estimated tokens spent per reading
+        """
+        config = config or {}
+        self.llm_connector = llm_connector
+        self.enabled = config.get("enabled", False)
+        self.token_budget = config.get("token_budget", 12000)
+
+        self._future: Optional[concurrent.futures.Future] = None
+        self._lock = threading.Lock()
+
+    def plan(self, system_name: str, processed_data: Dict[str, Any]) -> List[Tuple[str, Dict[str, str]]]:
+        """
+        Choose the topics to prefetch: topics in menu order that are not cached
+        yet, as long as their estimated cost (prompt plus ``max_tokens``) fits
+        the token budget.
+
+        Args:
+            system_name: Name of the fortune system of the main reading
+            processed_data: Processed data of the main reading
+
+        Returns:
+            List of (topic, prompts) pairs
+        """
+        planned = []
+        budget = self.token_budget
+        for topic in get_followup_topics(system_name):
+            prompts = build_followup_prompts(system_name, processed_data, topic)
+            if self.llm_connector.is_cached(prompts["system_prompt"], prompts["user_prompt"]):
+                continue
+            cost = (estimate_tokens(prompts["system_prompt"]) + estimate_tokens(prompts["user_prompt"])
+                    + self.llm_connector.max_tokens)
+            if cost > budget:
+                logger.info(f"Prefetch token budget reached after {len(planned)} topics")
+                break
+            budget -= cost
+            planned.append((topic, prompts))
+        return planned
+
+    def start(self, system_name: str, processed_data: Dict[str, Any]) -> Optional[concurrent.futures.Future]:
+        """
+        Start prefetching the follow-up readings of a main reading in the
+        background, cancelling the prefetch of the previous reading. Planning,
+        which looks the topics up in the response cache, runs in the background
+        too, so the caller never waits for cache I/O.
+
+        Args:
+            system_name: Name of the fortune system of the main reading
+            processed_data: Processed data of the main reading
+
+        Returns:
+            Future of the number of topics prefetched, or None if prefetching is disabled
+        """
+        if not self.enabled:
+            return None
+
+        runner = get_runner()
+        with self._lock:
+            self._cancel_locked()
+            self._future = asyncio.run_coroutine_threadsafe(self._aprefetch(system_name, processed_data), runner.loop)
+            return self._future
+
+    async def _aprefetch(self, system_name: str, processed_data: Dict[str, Any]) -> int:
+        """Plan the follow-ups and generate them concurrently; returns the number that succeeded."""
+        loop = asyncio.get_running_loop()
+        try:
+            # Cache lookups may hit the disk; keep them off the event loop
+            planned = await loop.run_in_executor(None, self.plan, system_name, processed_data)
+        except Exception as e:
+            logger.warning(f"Could not plan follow-up prefetch: {e}")
+            return 0
+        if not planned:
+            return 0
+        logger.info(f"Prefetching follow-up topics: {', '.join(topic for topic, _ in planned)}")
+
+        results = await asyncio.gather(*(
+            self.llm_connector.agenerate_response(
+                prompts["system_prompt"], prompts["user_prompt"], priority=PREFETCH, plugin=system_name
+            )
+            for _, prompts in planned
+        ), return_exceptions=True)
+
+        succeeded = 0
+        for (topic, _), result in zip(planned, results):
+            if isinstance(result, BaseException) or "error" in result[1]:
+                logger.warning(f"Prefetch of follow-up topic {topic} failed")
+            else:
+                succeeded += 1
+        logger.info(f"Prefetched {succeeded}/{len(planned)} follow-up topics")
+        return succeeded
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        """
+        Wait for the current prefetch to finish.
+
+        Args:
+            timeout: Seconds to wait, or None to wait forever
+
+        Returns:
+            Number of topics prefetched successfully
+        """
+        with self._lock:
+            future = self._future
+        if future is None:
+            return 0
+        return future.result(timeout)
+
+    def cancel(self) -> None:
+        """Cancel the current prefetch; follow-ups already being shown keep running."""
+        with self._lock:
+            self._cancel_locked()
+
+    def _cancel_locked(self) -> None:
+        if self._future is not None and not self._future.done():
+            self._future.cancel()
+        self._future = None
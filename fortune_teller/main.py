@@ -12,7 +12,7 @@ import json
 import traceback
 import time
 import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncGenerator, Generator, List, Optional, Tuple
 
 # 静默所有第三方库的日志，将它们仅输出到文件
 # 这段代码必须在导入任何其他库之前执行
@@ -38,6 +38,10 @@ for logger_name in ["boto3", "botocore", "urllib3", "s3transfer",
     specific_logger.propagate = False  # 不向上传播日志
 
 from fortune_teller.core import BaseFortuneSystem, PluginManager, LLMConnector, ConfigManager
+from fortune_teller.core.metrics import get_metrics_registry
+from fortune_teller.core.rate_limiter import INTERACTIVE
+from fortune_teller.core.structured_logging import configure_logging
+from fortune_teller.followup import FollowupPrefetcher, build_followup_prompts, get_followup_topics
 from fortune_teller.ui.colors import Colors
 from fortune_teller.ui.display import (
     print_welcome_screen, print_llm_info, print_available_systems,
@@ -72,6 +76,9 @@ class FortuneTeller:
         llm_config = self.config_manager.get_config("llm")
         self.llm_connector = LLMConnector(llm_config)
         
+        # Background generation of follow-up readings (llm.prefetch)
+        self.followup_prefetcher = FollowupPrefetcher(self.llm_connector, llm_config.get("prefetch"))
+        
         # Load plugins
         self.load_plugins()
         
@@ -114,55 +121,255 @@ class FortuneTeller:
         Raises:
             ValueError: If system is not found or inputs are invalid
         """
-        # Get the requested fortune system
-        fortune_system = self.plugin_manager.get_plugin(system_name)
-        if not fortune_system:
-            raise ValueError(f"未找到占卜系统: {system_name}")
-        
+        fortune_system = self._get_system(system_name)
         try:
-            # Use provided processed data if available, otherwise process the inputs
-            if processed_data is None:
-                # Validate inputs
-                validated_inputs = fortune_system.validate_input(inputs)
-                
-                # Process the data
-                processed_data = fortune_system.process_data(validated_inputs)
-            else:
-                # If processed_data is provided, we use that directly
-                validated_inputs = inputs
-            
-            # Save processed data for follow-up questions
-            self._last_processed_data = {
-                "system_name": system_name,
-                "processed_data": processed_data,
-                "inputs": validated_inputs
-            }
-            
-            # Generate LLM prompts
-            prompts = fortune_system.generate_llm_prompt(processed_data)
+            processed_data, prompts = self._prepare_reading(fortune_system, system_name, inputs, processed_data)
             
             # Get LLM response
             llm_response, metadata = self.llm_connector.generate_response(
                 prompts["system_prompt"],
-                prompts["user_prompt"]
+                prompts["user_prompt"],
+                plugin=system_name
             )
             
-            # Format the result
-            result = fortune_system.format_result(llm_response)
+            return self._finish_reading(fortune_system, system_name, inputs, processed_data, llm_response, metadata)
             
-            # Add metadata to the result
-            result["metadata"] = {
-                "system_name": system_name,
-                "timestamp": datetime.datetime.now().isoformat(),
-                "llm_metadata": metadata,
-                "inputs": {k: str(v) for k, v in inputs.items()}
-            }
+        except Exception as e:
+            logger.error(f"Error performing reading: {e}")
+            raise ValueError(f"解读错误: {str(e)}")
+    
+    async def aperform_reading(
+        self,
+        system_name: str,
+        inputs: Dict[str, Any],
+        processed_data: Dict[str, Any] = None
+    ) -> Dict[str, Any]:
+        """
+        Perform a fortune telling reading without blocking the caller's event loop.
+        
+        Args:
+            system_name: Name of the fortune telling system to use
+            inputs: User input data for the fortune system
+            processed_data: Optional pre-processed data (to avoid re-processing)
             
-            return result
+        Returns:
+            Reading results and metadata
+            
+        Raises:
+            ValueError: If system is not found or inputs are invalid
+        """
+        fortune_system = self._get_system(system_name)
+        try:
+            processed_data, prompts = self._prepare_reading(fortune_system, system_name, inputs, processed_data)
+            
+            llm_response, metadata = await self.llm_connector.agenerate_response(
+                prompts["system_prompt"],
+                prompts["user_prompt"],
+                plugin=system_name
+            )
+            
+            return self._finish_reading(fortune_system, system_name, inputs, processed_data, llm_response, metadata)
+            
+        except Exception as e:
+            logger.error(f"Error performing reading: {e}")
+            raise ValueError(f"解读错误: {str(e)}")
+    
+    def stream_reading(
+        self,
+        system_name: str,
+        inputs: Dict[str, Any],
+        processed_data: Dict[str, Any] = None
+    ) -> Generator[Tuple[str, Any], None, None]:
+        """
+        Perform a reading, yielding its parts as soon as they are available.
+        
+        Args:
+            system_name: Name of the fortune telling system to use
+            inputs: User input data for the fortune system
+            processed_data: Optional pre-processed data (to avoid re-processing)
+            
+        Returns:
+            Generator of (event, data) pairs: ("chart", processed data) once the
+            inputs are processed, ("delta", text chunk) for each chunk of the LLM
+            response and ("result", reading) at the end
             
+        Raises:
+            ValueError: If system is not found or inputs are invalid
+        """
+        fortune_system = self._get_system(system_name)
+        try:
+            processed_data = self._process_inputs(fortune_system, system_name, inputs, processed_data)
+        except Exception as e:
+            logger.error(f"Error performing reading: {e}")
+            raise ValueError(f"解读错误: {str(e)}")
+        yield "chart", processed_data
+        
+        prompts = fortune_system.generate_llm_prompt(processed_data)
+        chunks = []
+        stream = self.llm_connector.generate_response_streaming(
+            prompts["system_prompt"],
+            prompts["user_prompt"],
+            priority=INTERACTIVE,
+            plugin=system_name
+        )
+        try:
+            for chunk in stream:
+                chunks.append(chunk)
+                yield "delta", chunk
+        finally:
+            # Stops the provider stream if the consumer went away
+            stream.close()
+        
+        yield "result", self._finish_reading(fortune_system, system_name, inputs, processed_data,
+                                             "".join(chunks), self._streaming_metadata())
+    
+    async def astream_reading(
+        self,
+        system_name: str,
+        inputs: Dict[str, Any],
+        processed_data: Dict[str, Any] = None
+    ) -> AsyncGenerator[Tuple[str, Any], None]:
+        """
+        Perform a reading without blocking the caller's event loop, yielding its
+        parts as soon as they are available (see ``stream_reading``).
+        
+        Args:
+            system_name: Name of the fortune telling system to use
+            inputs: User input data for the fortune system
+            processed_data: Optional pre-processed data (to avoid re-processing)
+            
+        Returns:
+            Async generator of ("chart", processed data), ("delta", text chunk)
+            and ("result", reading) pairs
+            
+        Raises:
+            ValueError: If system is not found or inputs are invalid
+        """
+        fortune_system = self._get_system(system_name)
+        try:
+            processed_data = self._process_inputs(fortune_system, system_name, inputs, processed_data)
         except Exception as e:
             logger.error(f"Error performing reading: {e}")
             raise ValueError(f"解读错误: {str(e)}")
+        yield "chart", processed_data
+        
+        prompts = fortune_system.generate_llm_prompt(processed_data)
+        chunks = []
+        stream = self.llm_connector.agenerate_response_streaming(
+            prompts["system_prompt"],
+            prompts["user_prompt"],
+            priority=INTERACTIVE,
+            plugin=system_name
+        )
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                yield "delta", chunk
+        finally:
+            await stream.aclose()
+        
+        yield "result", self._finish_reading(fortune_system, system_name, inputs, processed_data,
+                                             "".join(chunks), self._streaming_metadata())
+    
+    def process_inputs(self, system_name: str, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate and process the inputs of a reading without generating it.
+        
+        Args:
+            system_name: Name of the fortune telling system to use
+            inputs: User input data for the fortune system
+            
+        Returns:
+            Processed data, to pass to a reading method as ``processed_data``
+            
+        Raises:
+            ValueError: If system is not found or inputs are invalid
+        """
+        fortune_system = self._get_system(system_name)
+        try:
+            return self._process_inputs(fortune_system, system_name, inputs)
+        except Exception as e:
+            logger.error(f"Error processing inputs: {e}")
+            raise ValueError(f"解读错误: {str(e)}")
+    
+    def _streaming_metadata(self) -> Dict[str, Any]:
+        """LLM metadata of a streamed response."""
+        return {
+            "provider": self.llm_connector.provider,
+            "model": self.llm_connector.model,
+            "streaming": True
+        }
+    
+    def _get_system(self, system_name: str) -> BaseFortuneSystem:
+        """Get a fortune system by name, raising ValueError if it does not exist."""
+        fortune_system = self.plugin_manager.get_plugin(system_name)
+        if not fortune_system:
+            raise ValueError(f"未找到占卜系统: {system_name}")
+        return fortune_system
+    
+    def _prepare_reading(
+        self,
+        fortune_system: BaseFortuneSystem,
+        system_name: str,
+        inputs: Dict[str, Any],
+        processed_data: Optional[Dict[str, Any]]
+    ) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """Validate and process the inputs (unless already processed) and build the LLM prompts."""
+        processed_data = self._process_inputs(fortune_system, system_name, inputs, processed_data)
+        
+        # Generate LLM prompts
+        return processed_data, fortune_system.generate_llm_prompt(processed_data)
+    
+    def _process_inputs(
+        self,
+        fortune_system: BaseFortuneSystem,
+        system_name: str,
+        inputs: Dict[str, Any],
+        processed_data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Validate and process the inputs unless already processed, and keep them for follow-ups."""
+        # Use provided processed data if available, otherwise process the inputs
+        if processed_data is None:
+            # Validate inputs
+            validated_inputs = fortune_system.validate_input(inputs)
+            
+            # Process the data
+            processed_data = fortune_system.process_data(validated_inputs)
+        else:
+            # If processed_data is provided, we use that directly
+            validated_inputs = inputs
+        
+        # Save processed data for follow-up questions
+        self._last_processed_data = {
+            "system_name": system_name,
+            "processed_data": processed_data,
+            "inputs": validated_inputs
+        }
+        
+        return processed_data
+    
+    def _finish_reading(
+        self,
+        fortune_system: BaseFortuneSystem,
+        system_name: str,
+        inputs: Dict[str, Any],
+        processed_data: Dict[str, Any],
+        llm_response: str,
+        metadata: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Format the LLM response as a reading."""
+        # Format the result
+        result = fortune_system.format_result(llm_response)
+        
+        # Add metadata to the result
+        result["metadata"] = {
+            "system_name": system_name,
+            "timestamp": datetime.datetime.now().isoformat(),
+            "llm_metadata": metadata,
+            "inputs": {k: str(v) for k, v in inputs.items()}
+        }
+        
+        return result
     
     def perform_followup_reading(
         self, 
@@ -191,158 +398,22 @@ class FortuneTeller:
         if not fortune_system:
             raise ValueError(f"未找到占卜系统: {system_name}")
         
-        # Define system-specific topics and prompts
-        if system_name == "bazi":
-            valid_topics = {
-                "🧠 性格命格": "请详细分析此八字主人的性格特点、才能倾向和行为模式，使用生动有趣的比喻和例子。",
-                "💼 事业财运": "请详细分析此八字主人的事业发展、适合行业和财富机遇，用风趣幽默的方式给出具体建议。", 
-                "❤️ 婚姻情感": "请详细分析此八字主人的感情状况、婚姻倾向和桃花运势，以诙谐但不油腻的方式提供见解。",
-                "🧘 健康寿元": "请详细分析此八字主人的健康状况、潜在问题和养生建议，用轻松方式点出需要注意的地方。",
-                "🔄 流年大运": "请详细分析此八字主人近期和未来的运势变化、关键时间点，神秘而又不失风趣地展望未来。"
-            }
-        elif system_name == "tarot":
-            valid_topics = {
-                "🌟 核心启示": "请详细分析此塔罗牌阵的核心信息和主要启示，用深入而通俗的语言揭示关键洞见。",
-                "🚶 当前处境": "请详细分析求测者目前所处的状况、面临的环境和心理状态，用生动的比喻帮助理解。", 
-                "🧭 阻碍与助力": "请详细分析求测者当前面临的挑战和可利用的资源，提供创造性的思路和实用建议。",
-                "🛤️ 潜在路径": "请详细分析求测者可能的发展方向和选择建议，以温和但明确的方式指出各种可能性。",
-                "💫 精神成长": "请详细分析求测者的内在成长和个人转变的机会，用启发性的方式鼓励自我探索。"
-            }
-        elif system_name == "zodiac":
-            valid_topics = {
-                "🪐 星盘解析": "请详细分析这份星盘的整体特点、行星角度及主要影响，用清晰易懂的方式解释复杂的星象关系。",
-                "🌠 宫位能量": "请详细分析星盘中重要宫位的能量分布和影响，特别关注上升、中天、下降和天底宫。", 
-                "🔄 当前行运": "请详细分析当前行星运行对求测者的影响，指出关键的行星相位和过境现象。",
-                "🌈 元素平衡": "请详细分析星盘中的元素与能量分布，说明火、土、风、水四元素的平衡状态与缺失情况。",
-                "✨ 星座年运": "请详细预测未来一年内的星象变化及其对求测者的影响，用鼓舞人心的方式展望未来机遇。"
-            }
-        else:
-            # Default topics for any other system or fallback
-            valid_topics = {
-                "性格特点": "请详细分析此命盘主人的性格特点、才能倾向和行为模式，使用生动有趣的比喻和例子。",
-                "事业财运": "请详细分析此命盘主人的事业发展、适合行业和财富机遇，用风趣幽默的方式给出具体建议。", 
-                "感情姻缘": "请详细分析此命盘主人的感情状况、婚姻倾向和桃花运势，以诙谐但不油腻的方式提供见解。",
-                "健康提示": "请详细分析此命盘主人的健康状况、潜在问题和养生建议，用轻松方式点出需要注意的地方。",
-                "大运流年": "请详细分析此命盘主人近期和未来的运势变化、关键时间点，神秘而又不失风趣地展望未来。"
-            }
-
-        # Clean topic name (remove emoji if present)
-        clean_topic = topic
-        if any(emoji in topic for emoji in ["🧠", "💼", "❤️", "🧘", "🔄", "🌟", "🚶", "🧭", "🛤️", "💫", "🪐", "🌠", "🌈", "✨", "💬"]):
-            clean_topic = topic[2:].strip()  # Remove emoji and whitespace
-            
+        valid_topics = get_followup_topics(system_name)
         if topic not in valid_topics:
             topics_str = "、".join(list(valid_topics.keys()))
             raise ValueError(f"请选择有效的解读主题: {topics_str}")
             
         try:
-            # Create a system prompt for the follow-up based on the system type
-            if system_name == "bazi":
-                system_prompt = f"""你是"霄占"，一位来自中国的八字命理学大师，已有30年的占卜经验，性格风趣幽默又不失智慧。
-你刚刚为求测者提供了基本的八字命理分析。现在，求测者想了解更多关于"{clean_topic}"的详细信息。
-
-请为求测者提供关于"{clean_topic}"的深入详尽的解读。{valid_topics[topic]}
-
-请确保你的回答既专业又风趣，像一位和蔼可亲的长辈聊天，而不是冷冰冰的说教。让求测者感到轻松愉快，同时获得有价值的人生启示。
-
-你的分析应既有专业水准，又富含情趣价值，可以巧妙地引用一些谚语、典故或生活小故事来帮助理解。
-"""
-            elif system_name == "tarot":
-                system_prompt = f"""你是"霄占"，一位精通塔罗牌解读的大师，拥有深厚的神秘学知识和20年的塔罗牌解读经验。
-你刚刚为求测者提供了基本的塔罗牌阵解析。现在，求测者想了解更多关于"{clean_topic}"的详细信息。
-
-请为求测者提供关于"{clean_topic}"的深入详尽的解读。{valid_topics[topic]}
-
-你的风格睿智而神秘，充满着智慧与洞察力，但同时也很亲和，能用生动的语言将复杂的符号象征转化为直观的理解。
-
-你的解读应当既有专业深度，又有灵性启发，可以适当引用一些神话、传说或象征学知识来丰富分析。
-"""
-            elif system_name == "zodiac":
-                system_prompt = f"""你是"霄占"，一位精通西方占星学的专家，有着丰富的占星咨询经验。
-你刚刚为求测者提供了基本的星盘分析。现在，求测者想了解更多关于"{clean_topic}"的详细信息。
-
-请为求测者提供关于"{clean_topic}"的深入详尽的解读。{valid_topics[topic]}
-
-你的风格既有专业深度，又不乏幽默感，能够用生动的比喻和实例解释复杂的星象。你既尊重占星学的传统知识，
-又不会完全决定论，而是强调每个人都有自由意志来选择如何应对星象影响。
-
-你的解读应当平衡、客观，避免过于绝对化的预测。提供实用的建议和观点，帮助咨询者更好地理解自己和当前的能量影响。
-"""
-            else:
-                # Default generic prompt
-                system_prompt = f"""你是"霄占"，一位来自中国的命理学大师，已有30年的占卜经验，性格风趣幽默又不失智慧。
-你刚刚为求测者提供了基本的命理分析。现在，求测者想了解更多关于"{clean_topic}"的详细信息。
-
-请为求测者提供关于"{clean_topic}"的深入详尽的解读。{valid_topics[topic]}
-
-请确保你的回答既专业又风趣，像一位和蔼可亲的长辈聊天，而不是冷冰冰的说教。让求测者感到轻松愉快，同时获得有价值的人生启示。
-
-你的分析应既有专业水准，又富含情趣价值，可以巧妙地引用一些谚语、典故或生活小故事来帮助理解。
-"""
-            
-            # Create a user prompt with the processed data and topic based on the system type
-            if system_name == "bazi":
-                user_prompt = f"""基于刚才的八字分析，请详细解读"{clean_topic}"方面的信息。
-
-四柱八字：
-{processed_data["four_pillars"]["year"]} {processed_data["four_pillars"]["month"]} {processed_data["four_pillars"]["day"]} {processed_data["four_pillars"]["hour"]}
-
-性别: {processed_data["gender"]}
-出生日期: {processed_data["birth_date"]}
-出生时间: {processed_data["birth_time"]}
-
-日主: {processed_data["day_master"]["character"]} ({processed_data["day_master"]["element"]})
-最强五行: {processed_data["elements"]["strongest"]}
-最弱五行: {processed_data["elements"]["weakest"]}
-
-请提供详细而有趣的"{clean_topic}"分析。"""
-            elif system_name == "tarot":
-                # Reconstruct tarot reading summary from processed data
-                card_info = ""
-                if "reading" in processed_data:
-                    for i, card in enumerate(processed_data["reading"], 1):
-                        position = card.get("position", f"位置{i}")
-                        card_name = card.get("card", "")
-                        orientation = card.get("orientation", "")
-                        card_info += f"{position}: {card_name} ({orientation})\n"
-                
-                user_prompt = f"""基于刚才的塔罗牌阵分析，请详细解读"{clean_topic}"方面的信息。
-
-塔罗牌阵：{processed_data.get("spread", {}).get("name", "未知牌阵")}
-问题：{processed_data.get("question", "未知")}
-领域：{processed_data.get("focus_area", "未知")}
-
-抽取的牌：
-{card_info}
-
-请提供详细而有深度的"{clean_topic}"分析。"""
-            elif system_name == "zodiac":
-                # Construct zodiac reading summary from processed data
-                sign_info = processed_data.get("zodiac_sign", {})
-                
-                user_prompt = f"""基于刚才的星盘分析，请详细解读"{clean_topic}"方面的信息。
-
-太阳星座：{sign_info.get("name", "未知")} ({sign_info.get("english", "Unknown")})
-月亮星座：{processed_data.get("moon_sign", "未知")}
-上升星座：{processed_data.get("rising_sign", "未知")}
-
-元素：{sign_info.get("element", "未知")}
-品质：{sign_info.get("quality", "未知")}
-主宰星：{sign_info.get("ruler", "未知")}
-
-关注领域：{processed_data.get("question_area", "未知")}
-
-请提供详细而有洞见的"{clean_topic}"分析。"""
-            else:
-                # Generic prompt as fallback
-                user_prompt = f"""基于刚才的命理分析，请详细解读"{clean_topic}"方面的信息。
-                
-请提供详细而有专业的"{clean_topic}"分析。"""
+            # Build the follow-up prompts shared with the prefetcher
+            prompts = build_followup_prompts(system_name, processed_data, topic)
+            system_prompt = prompts["system_prompt"]
+            user_prompt = prompts["user_prompt"]
             
             # Get LLM response for the follow-up
             llm_response, metadata = self.llm_connector.generate_response(
                 system_prompt,
-                user_prompt
+                user_prompt,
+                plugin=system_name
             )
             
             # Format the result for the follow-up
@@ -540,9 +611,13 @@ def run_interactive_menu(fortune_teller, args):
                     prompts["system_prompt"],
                     prompts["user_prompt"],
                     streaming_handler=handle_streaming,
-                    non_streaming_handler=handle_standard
+                    non_streaming_handler=handle_standard,
+                    plugin=system.name
                 )
                 
+                # Generate the follow-up topics in the background while the user reads
+                fortune_teller.followup_prefetcher.start(system.name, processed_data)
+                
                 # Interactive followup menu
                 if not run_followup_menu(fortune_teller):
                     break  # Exit if user doesn't want to return to main menu
@@ -621,7 +696,10 @@ def run_chat_mode(fortune_teller, system_name=None):
         animation.start()
         
         # Get initial greeting from LLM
-        response, _ = fortune_teller.llm_connector.generate_response(system_prompt, user_prompt)
+        # 聊天是交互式请求，在限流队列中优先于批量和预取请求
+        response, _ = fortune_teller.llm_connector.generate_response(
+            system_prompt, user_prompt, priority=INTERACTIVE
+        )
         
         # Stop animation
         animation.stop()
@@ -737,7 +815,8 @@ def run_chat_mode(fortune_teller, system_name=None):
                     system_prompt, 
                     chat_prompt,
                     streaming_handler=lambda gen, st: handle_chat_streaming(gen, st, thinking_animation),
-                    non_streaming_handler=lambda resp, meta: handle_chat_standard(resp, meta, thinking_animation)
+                    non_streaming_handler=lambda resp, meta: handle_chat_standard(resp, meta, thinking_animation),
+                    priority=INTERACTIVE
                 )
                 
                 # 将响应添加到聊天上下文
@@ -773,24 +852,7 @@ def run_followup_menu(fortune_teller):
         else:
             system_name = fortune_teller._last_processed_data["system_name"]
             
-            if system_name == "bazi":
-                valid_topics = [
-                    "🧠 性格命格", "💼 事业财运", "❤️ 婚姻情感", 
-                    "🧘 健康寿元", "🔄 流年大运"
-                ]
-            elif system_name == "tarot":
-                valid_topics = [
-                    "🌟 核心启示", "🚶 当前处境", "🧭 阻碍与助力", 
-                    "🛤️ 潜在路径", "💫 精神成长"
-                ]
-            elif system_name == "zodiac":
-                valid_topics = [
-                    "🪐 星盘解析", "🌠 宫位能量", "🔄 当前行运", 
-                    "🌈 元素平衡", "✨ 星座年运"
-                ]
-            else:
-                # Fallback to generic topics
-                valid_topics = ["性格特点", "事业财运", "感情姻缘", "健康提示", "大运流年"]
+            valid_topics = list(get_followup_topics(system_name))
                 
             # Always add chat option regardless of the system
             valid_topics.append("💬 与霄占聊天")
@@ -822,158 +884,10 @@ def run_followup_menu(fortune_teller):
                     system_name = fortune_teller._last_processed_data["system_name"]
                     processed_data = fortune_teller._last_processed_data["processed_data"]
                     
-                    # Get clean topic name (remove emoji if present)
-                    clean_topic = selected_topic
-                    if any(emoji in selected_topic for emoji in ["🧠", "💼", "❤️", "🧘", "🔄", "🌟", "🚶", "🧭", "🛤️", "💫", "🪐", "🌠", "🌈", "✨", "💬"]):
-                        clean_topic = selected_topic[2:].strip()  # Remove emoji and whitespace
-                    
-                    # Define system-specific topics and prompts
-                    if system_name == "bazi":
-                        valid_topics = {
-                            "🧠 性格命格": "请详细分析此八字主人的性格特点、才能倾向和行为模式，使用生动有趣的比喻和例子。",
-                            "💼 事业财运": "请详细分析此八字主人的事业发展、适合行业和财富机遇，用风趣幽默的方式给出具体建议。", 
-                            "❤️ 婚姻情感": "请详细分析此八字主人的感情状况、婚姻倾向和桃花运势，以诙谐但不油腻的方式提供见解。",
-                            "🧘 健康寿元": "请详细分析此八字主人的健康状况、潜在问题和养生建议，用轻松方式点出需要注意的地方。",
-                            "🔄 流年大运": "请详细分析此八字主人近期和未来的运势变化、关键时间点，神秘而又不失风趣地展望未来。"
-                        }
-                    elif system_name == "tarot":
-                        valid_topics = {
-                            "🌟 核心启示": "请详细分析此塔罗牌阵的核心信息和主要启示，用深入而通俗的语言揭示关键洞见。",
-                            "🚶 当前处境": "请详细分析求测者目前所处的状况、面临的环境和心理状态，用生动的比喻帮助理解。", 
-                            "🧭 阻碍与助力": "请详细分析求测者当前面临的挑战和可利用的资源，提供创造性的思路和实用建议。",
-                            "🛤️ 潜在路径": "请详细分析求测者可能的发展方向和选择建议，以温和但明确的方式指出各种可能性。",
-                            "💫 精神成长": "请详细分析求测者的内在成长和个人转变的机会，用启发性的方式鼓励自我探索。"
-                        }
-                    elif system_name == "zodiac":
-                        valid_topics = {
-                            "🪐 星盘解析": "请详细分析这份星盘的整体特点、行星角度及主要影响，用清晰易懂的方式解释复杂的星象关系。",
-                            "🌠 宫位能量": "请详细分析星盘中重要宫位的能量分布和影响，特别关注上升、中天、下降和天底宫。", 
-                            "🔄 当前行运": "请详细分析当前行星运行对求测者的影响，指出关键的行星相位和过境现象。",
-                            "🌈 元素平衡": "请详细分析星盘中的元素与能量分布，说明火、土、风、水四元素的平衡状态与缺失情况。",
-                            "✨ 星座年运": "请详细预测未来一年内的星象变化及其对求测者的影响，用鼓舞人心的方式展望未来机遇。"
-                        }
-                    else:
-                        # Default topics for any other system or fallback
-                        valid_topics = {
-                            "性格特点": "请详细分析此命盘主人的性格特点、才能倾向和行为模式，使用生动有趣的比喻和例子。",
-                            "事业财运": "请详细分析此命盘主人的事业发展、适合行业和财富机遇，用风趣幽默的方式给出具体建议。", 
-                            "感情姻缘": "请详细分析此命盘主人的感情状况、婚姻倾向和桃花运势，以诙谐但不油腻的方式提供见解。",
-                            "健康提示": "请详细分析此命盘主人的健康状况、潜在问题和养生建议，用轻松方式点出需要注意的地方。",
-                            "大运流年": "请详细分析此命盘主人近期和未来的运势变化、关键时间点，神秘而又不失风趣地展望未来。"
-                        }
-                    
-                    # Make sure the selected topic is in our topics dictionary to avoid KeyError
-                    topic_description = ""
-                    try:
-                        topic_description = valid_topics.get(selected_topic, "")
-                        logger.info(f"找到话题'{selected_topic}'的描述: {topic_description}")
-                    except Exception as e:
-                        logger.error(f"获取话题描述时出错: {e}", exc_info=True)
-                        # Provide a generic description if we can't find one
-                        topic_description = f"请详细分析{clean_topic}方面的信息，用清晰易懂的语言提供有见解的解读。"
-                        
-                    # Create system prompts for different fortune systems
-                    if system_name == "bazi":
-                        system_prompt = f"""你是"霄占"，一位来自中国的八字命理学大师，已有30年的占卜经验，性格风趣幽默又不失智慧。
-你刚刚为求测者提供了基本的八字命理分析。现在，求测者想了解更多关于"{clean_topic}"的详细信息。
-
-请为求测者提供关于"{clean_topic}"的深入详尽的解读。{topic_description}
-
-请确保你的回答既专业又风趣，像一位和蔼可亲的长辈聊天，而不是冷冰冰的说教。让求测者感到轻松愉快，同时获得有价值的人生启示。
-
-你的分析应既有专业水准，又富含情趣价值，可以巧妙地引用一些谚语、典故或生活小故事来帮助理解。
-"""
-                    elif system_name == "tarot":
-                        system_prompt = f"""你是"霄占"，一位精通塔罗牌解读的大师，拥有深厚的神秘学知识和20年的塔罗牌解读经验。
-你刚刚为求测者提供了基本的塔罗牌阵解析。现在，求测者想了解更多关于"{clean_topic}"的详细信息。
-
-请为求测者提供关于"{clean_topic}"的深入详尽的解读。{valid_topics[selected_topic]}
-
-你的风格睿智而神秘，充满着智慧与洞察力，但同时也很亲和，能用生动的语言将复杂的符号象征转化为直观的理解。
-
-你的解读应当既有专业深度，又有灵性启发，可以适当引用一些神话、传说或象征学知识来丰富分析。
-"""
-                    elif system_name == "zodiac":
-                        system_prompt = f"""你是"霄占"，一位精通西方占星学的专家，有着丰富的占星咨询经验。
-你刚刚为求测者提供了基本的星盘分析。现在，求测者想了解更多关于"{clean_topic}"的详细信息。
-
-请为求测者提供关于"{clean_topic}"的深入详尽的解读。{valid_topics[selected_topic]}
-
-你的风格既有专业深度，又不乏幽默感，能够用生动的比喻和实例解释复杂的星象。你既尊重占星学的传统知识，
-又不会完全决定论，而是强调每个人都有自由意志来选择如何应对星象影响。
-
-你的解读应当平衡、客观，避免过于绝对化的预测。提供实用的建议和观点，帮助咨询者更好地理解自己和当前的能量影响。
-"""
-                    else:
-                        # Default generic prompt
-                        system_prompt = f"""你是"霄占"，一位来自中国的命理学大师，已有30年的占卜经验，性格风趣幽默又不失智慧。
-你刚刚为求测者提供了基本的命理分析。现在，求测者想了解更多关于"{clean_topic}"的详细信息。
-
-请为求测者提供关于"{clean_topic}"的深入详尽的解读。{valid_topics[selected_topic]}
-
-请确保你的回答既专业又风趣，像一位和蔼可亲的长辈聊天，而不是冷冰冰的说教。让求测者感到轻松愉快，同时获得有价值的人生启示。
-
-你的分析应既有专业水准，又富含情趣价值，可以巧妙地引用一些谚语、典故或生活小故事来帮助理解。
-"""
-                    
-                    # Create user prompts based on system type
-                    if system_name == "bazi":
-                        user_prompt = f"""基于刚才的八字分析，请详细解读"{clean_topic}"方面的信息。
-
-四柱八字：
-{processed_data["four_pillars"]["year"]} {processed_data["four_pillars"]["month"]} {processed_data["four_pillars"]["day"]} {processed_data["four_pillars"]["hour"]}
-
-性别: {processed_data["gender"]}
-出生日期: {processed_data["birth_date"]}
-出生时间: {processed_data["birth_time"]}
-
-日主: {processed_data["day_master"]["character"]} ({processed_data["day_master"]["element"]})
-最强五行: {processed_data["elements"]["strongest"]}
-最弱五行: {processed_data["elements"]["weakest"]}
-
-请提供详细而有趣的"{clean_topic}"分析。"""
-                    elif system_name == "tarot":
-                        # Reconstruct tarot reading summary from processed data
-                        card_info = ""
-                        if "reading" in processed_data:
-                            for i, card in enumerate(processed_data["reading"], 1):
-                                position = card.get("position", f"位置{i}")
-                                card_name = card.get("card", "")
-                                orientation = card.get("orientation", "")
-                                card_info += f"{position}: {card_name} ({orientation})\n"
-                        
-                        user_prompt = f"""基于刚才的塔罗牌阵分析，请详细解读"{clean_topic}"方面的信息。
-
-塔罗牌阵：{processed_data.get("spread", {}).get("name", "未知牌阵")}
-问题：{processed_data.get("question", "未知")}
-领域：{processed_data.get("focus_area", "未知")}
-
-抽取的牌：
-{card_info}
-
-请提供详细而有深度的"{clean_topic}"分析。"""
-                    elif system_name == "zodiac":
-                        # Construct zodiac reading summary from processed data
-                        sign_info = processed_data.get("zodiac_sign", {})
-                        
-                        user_prompt = f"""基于刚才的星盘分析，请详细解读"{clean_topic}"方面的信息。
-
-太阳星座：{sign_info.get("name", "未知")} ({sign_info.get("english", "Unknown")})
-月亮星座：{processed_data.get("moon_sign", "未知")}
-上升星座：{processed_data.get("rising_sign", "未知")}
-
-元素：{sign_info.get("element", "未知")}
-品质：{sign_info.get("quality", "未知")}
-主宰星：{sign_info.get("ruler", "未知")}
-
-关注领域：{processed_data.get("question_area", "未知")}
-
-请提供详细而有洞见的"{clean_topic}"分析。"""
-                    else:
-                        # Generic prompt as fallback
-                        user_prompt = f"""基于刚才的命理分析，请详细解读"{clean_topic}"方面的信息。
-                        
-请提供详细而有专业的"{clean_topic}"分析。"""
+                    # Build the follow-up prompts shared with the prefetcher
+                    prompts = build_followup_prompts(system_name, processed_data, selected_topic)
+                    system_prompt = prompts["system_prompt"]
+                    user_prompt = prompts["user_prompt"]
                     
                     def handle_followup_streaming(response_generator, start_time, thinking_anim=None):
                         """话题解读流式输出处理函数"""
@@ -1029,7 +943,8 @@ def run_followup_menu(fortune_teller):
                         system_prompt, 
                         user_prompt,
                         streaming_handler=lambda gen, st: handle_followup_streaming(gen, st, thinking_animation),
-                        non_streaming_handler=lambda resp, meta: handle_followup_standard(resp, meta, thinking_animation)
+                        non_streaming_handler=lambda resp, meta: handle_followup_standard(resp, meta, thinking_animation),
+                        plugin=system_name
                     )
                     
                 except Exception as e:
@@ -1056,6 +971,7 @@ def main():
     parser.add_argument("--system", help="使用指定的占卜系统")
     parser.add_argument("--output", help="输出结果文件路径")
     parser.add_argument("--verbose", action="store_true", help="显示详细日志")
+    parser.add_argument("--metrics-file", help="退出时将LLM调用指标以Prometheus文本格式写入该文件")
     
     args = parser.parse_args()
     
@@ -1072,6 +988,9 @@ def main():
         # Initialize the application
         fortune_teller = FortuneTeller(args.config)
         
+        # Structured/sampled request logging and background log writing (logging section)
+        configure_logging(fortune_teller.config_manager.get_config("logging"))
+        
         # Show LLM information
         llm_config = fortune_teller.config_manager.get_config("llm")
         print_llm_info(llm_config)
@@ -1087,6 +1006,24 @@ def main():
     except Exception as e:
         print(f"错误: {e}")
         traceback.print_exc()
+    finally:
+        if args.metrics_file:
+            export_metrics(args.metrics_file)
+
+
+def export_metrics(path: str) -> None:
+    """
+    Write the LLM call metrics of this session in the Prometheus text format.
+    
+    Args:
+        path: File to write, e.g. for the node exporter's textfile collector
+    """
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(get_metrics_registry().render_prometheus())
+        logger.info(f"Metrics written to {path}")
+    except OSError as e:
+        logger.error(f"Could not write metrics to {path}: {e}")
 
 
 if __name__ == "__main__":
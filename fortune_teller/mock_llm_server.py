@@ -0,0 +1,422 @@
+"""
+Local stand-in LLM server for end-to-end benchmarking.
+Speaks the OpenAI chat-completions wire format (including SSE streaming) and the
+AWS Bedrock invoke / invoke-with-response-stream format, serving MockConnector
+content, so the full network path can be exercised without a real provider.
+
+Point the connectors at it with ``llm.base_url`` (openai, deepseek) or
+``llm.endpoint_url`` (aws_bedrock).
+"""
+import json
+import time
+import uuid
+import zlib
+import base64
+import random
+import struct
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+
+from fortune_teller.core.mock_connector import MockConnector
+from fortune_teller.core.rate_limiter import estimate_tokens
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("MockLLMServer")
+
+# Bedrock error types keyed by HTTP status, as sent in the x-amzn-ErrorType header
+BEDROCK_ERROR_TYPES = {
+    429: "ThrottlingException",
+    500: "InternalServerException",
+    503: "ServiceUnavailableException",
+}
+
+
+def encode_event_message(payload: bytes, headers: Dict[str, str]) -> bytes:
+    """
+    Frame a payload as an AWS event stream message
+    (prelude, string headers, payload and CRC32 checksums).
+
+    Args:
+        payload: Message payload
+        headers: String-valued message headers
+
+    Returns:
+        Encoded message bytes
+    """
+    encoded_headers = b""
+    for name, value in headers.items():
+        name_bytes = name.encode("utf-8")
+        value_bytes = value.encode("utf-8")
+        # Header value type 7 is a UTF-8 string
+        encoded_headers += struct.pack(">B", len(name_bytes)) + name_bytes
+        encoded_headers += struct.pack(">BH", 7, len(value_bytes)) + value_bytes
+
+    total_length = 12 + len(encoded_headers) + len(payload) + 4
+    prelude = struct.pack(">II", total_length, len(encoded_headers))
+    message = prelude + struct.pack(">I", zlib.crc32(prelude) & 0xffffffff)
+    message += encoded_headers + payload
+    return message + struct.pack(">I", zlib.crc32(message) & 0xffffffff)
+
+
+def encode_bedrock_chunk(event: Dict[str, Any]) -> bytes:
+    """Wrap an Anthropic stream event as a Bedrock ``chunk`` event message."""
+    body = json.dumps({"bytes": base64.b64encode(json.dumps(event).encode("utf-8")).decode("ascii")})
+    return encode_event_message(body.encode("utf-8"), {
+        ":event-type": "chunk",
+        ":content-type": "application/json",
+        ":message-type": "event",
+    })
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server holding the mock content source and fault settings.
+    """
+
+    daemon_threads = True
+
+    def __init__(self,
+                 address: Tuple[str, int],
+                 mock_config: Dict[str, Any] = None,
+                 error_rate: float = 0.0,
+                 error_status: int = 500,
+                 throttle_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        """
+        Initialize the server.
+
+        Args:
+            address: (host, port) to listen on; port 0 picks a free port
+            mock_config: MockConnector configuration (latency profile, seed)
+            error_rate: Fraction of requests answered with ``error_status``
+            error_status: HTTP status used for injected errors
+            throttle_rate: Fraction of requests answered with 429
+            seed: Seed for error injection
+        """
+        super().__init__(address, MockLLMRequestHandler)
+        self.mock = MockConnector(mock_config)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.throttle_rate = throttle_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def pick_fault(self) -> Optional[int]:
+        """
+        Decide whether to inject a fault into the next request.
+
+        Returns:
+            HTTP status to answer with, or None to serve normally
+        """
+        with self._rng_lock:
+            roll = self._rng.random()
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return self.error_status
+        return None
+
+
+class MockLLMRequestHandler(BaseHTTPRequestHandler):
+    """Serves OpenAI- and Bedrock-style requests from the mock connector."""
+
+    # Keep-alive, so client connection pooling is exercised
+    protocol_version = "HTTP/1.1"
+    server: MockLLMServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format % args)
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") in ("", "/health"):
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path: {self.path}"}})
+
+    def do_POST(self) -> None:
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {"error": {"message": f"Invalid request body: {e}"}})
+            return
+
+        path = self.path.split("?", 1)[0]
+        if path.endswith("/chat/completions"):
+            self._handle_openai(body)
+        elif path.startswith("/model/") and path.endswith("/invoke-with-response-stream"):
+            model = unquote(path[len("/model/"):-len("/invoke-with-response-stream")])
+            self._handle_bedrock(model, body, stream=True)
+        elif path.startswith("/model/") and path.endswith("/invoke"):
+            model = unquote(path[len("/model/"):-len("/invoke")])
+            self._handle_bedrock(model, body, stream=False)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path: {self.path}"}})
+
+    # ------------------------------------------------------------------
+    # OpenAI chat completions
+    # ------------------------------------------------------------------
+
+    def _handle_openai(self, body: Dict[str, Any]) -> None:
+        fault = self.server.pick_fault()
+        if fault:
+            error_type = "rate_limit_error" if fault == 429 else "server_error"
+            self._send_json(fault, {"error": {
+                "message": f"Injected mock error ({fault})", "type": error_type, "code": None
+            }})
+            return
+
+        model = body.get("model", "mock")
+        system_prompt, user_prompt = self._openai_prompts(body.get("messages", []))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            text = self._full_text(system_prompt, user_prompt)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": self._openai_usage(system_prompt, user_prompt, text),
+            })
+            return
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> bytes:
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        self._start_chunked(200, "text/event-stream")
+        self._write_chunk(chunk({"role": "assistant", "content": ""}))
+        for text in self._timed_chunks(system_prompt, user_prompt):
+            self._write_chunk(chunk({"content": text}))
+        self._write_chunk(chunk({}, "stop"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._end_chunked()
+
+    @staticmethod
+    def _openai_prompts(messages: List[Dict[str, Any]]) -> Tuple[str, str]:
+        system_parts = [m.get("content") or "" for m in messages if m.get("role") == "system"]
+        user_parts = [m.get("content") or "" for m in messages if m.get("role") == "user"]
+        return "\n".join(system_parts), (user_parts[-1] if user_parts else "")
+
+    @staticmethod
+    def _openai_usage(system_prompt: str, user_prompt: str, text: str) -> Dict[str, int]:
+        prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+        completion_tokens = estimate_tokens(text)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    # ------------------------------------------------------------------
+    # Bedrock (Anthropic messages body)
+    # ------------------------------------------------------------------
+
+    def _handle_bedrock(self, model: str, body: Dict[str, Any], stream: bool) -> None:
+        fault = self.server.pick_fault()
+        if fault:
+            error_type = BEDROCK_ERROR_TYPES.get(fault, "InternalServerException")
+            self._send_json(fault, {"message": f"Injected mock error ({fault})"},
+                            {"x-amzn-ErrorType": error_type})
+            return
+
+        system_prompt, user_prompt = self._bedrock_prompts(body)
+        input_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+        message_id = f"msg_{uuid.uuid4().hex}"
+
+        if not stream:
+            text = self._full_text(system_prompt, user_prompt)
+            self._send_json(200, {
+                "id": message_id,
+                "type": "message",
+                "role": "assistant",
+                "model": model,
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "usage": {"input_tokens": input_tokens, "output_tokens": estimate_tokens(text)},
+            })
+            return
+
+        started = time.time()
+        self._start_chunked(200, "application/vnd.amazon.eventstream")
+        self._write_chunk(encode_bedrock_chunk({
+            "type": "message_start",
+            "message": {
+                "id": message_id, "type": "message", "role": "assistant", "model": model,
+                "content": [], "stop_reason": None,
+                "usage": {"input_tokens": input_tokens, "output_tokens": 0},
+            },
+        }))
+        self._write_chunk(encode_bedrock_chunk({
+            "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}
+        }))
+
+        output_tokens = 0
+        first_byte_latency = None
+        for text in self._timed_chunks(system_prompt, user_prompt):
+            if first_byte_latency is None:
+                first_byte_latency = int((time.time() - started) * 1000)
+            output_tokens += estimate_tokens(text)
+            self._write_chunk(encode_bedrock_chunk({
+                "type": "content_block_delta", "index": 0,
+                "delta": {"type": "text_delta", "text": text},
+            }))
+
+        self._write_chunk(encode_bedrock_chunk({"type": "content_block_stop", "index": 0}))
+        self._write_chunk(encode_bedrock_chunk({
+            "type": "message_delta",
+            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+            "usage": {"output_tokens": output_tokens},
+        }))
+        self._write_chunk(encode_bedrock_chunk({
+            "type": "message_stop",
+            "amazon-bedrock-invocationMetrics": {
+                "inputTokenCount": input_tokens,
+                "outputTokenCount": output_tokens,
+                "invocationLatency": int((time.time() - started) * 1000),
+                "firstByteLatency": first_byte_latency or 0,
+            },
+        }))
+        self._end_chunked()
+
+    @staticmethod
+    def _bedrock_prompts(body: Dict[str, Any]) -> Tuple[str, str]:
+        system = body.get("system") or ""
+        if isinstance(system, list):
+            system = "".join(block.get("text", "") for block in system)
+
+        user_prompt = ""
+        for message in body.get("messages", []):
+            if message.get("role") != "user":
+                continue
+            content = message.get("content")
+            if isinstance(content, list):
+                content = "".join(block.get("text", "") for block in content)
+            user_prompt = content or ""
+
+        # Legacy text-completion bodies
+        if not user_prompt and body.get("prompt"):
+            user_prompt = body["prompt"]
+        return system, user_prompt
+
+    # ------------------------------------------------------------------
+    # Mock content and HTTP plumbing
+    # ------------------------------------------------------------------
+
+    def _full_text(self, system_prompt: str, user_prompt: str) -> str:
+        """Mock response, delivered after the profile's time to first token."""
+        plan = list(self.server.mock.iter_timed_chunks(system_prompt, user_prompt,
+                                                       include_header=False))
+        delay = sum(step for step, _ in plan)
+        if delay:
+            time.sleep(delay)
+        return "".join(text for _, text in plan)
+
+    def _timed_chunks(self, system_prompt: str, user_prompt: str) -> Iterator[str]:
+        for delay, text in self.server.mock.iter_timed_chunks(system_prompt, user_prompt,
+                                                              include_header=False):
+            if delay:
+                time.sleep(delay)
+            yield text
+
+    def _send_json(self, status: int, payload: Dict[str, Any],
+                   headers: Dict[str, str] = None) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_chunked(self, status: int, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _end_chunked(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def run_server(host: str = "127.0.0.1",
+               port: int = 8600,
+               mock_config: Dict[str, Any] = None,
+               error_rate: float = 0.0,
+               error_status: int = 500,
+               throttle_rate: float = 0.0,
+               seed: Optional[int] = None) -> None:
+    """Run the mock LLM server until interrupted."""
+    server = MockLLMServer((host, port), mock_config, error_rate=error_rate,
+                           error_status=error_status, throttle_rate=throttle_rate, seed=seed)
+    logger.info(f"Mock LLM server listening on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    # 解析命令行参数
+    parser = argparse.ArgumentParser(description="本地模拟LLM服务器 (OpenAI / AWS Bedrock 协议)")
+    parser.add_argument("--host", default="127.0.0.1", help="监听主机 (默认: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8600, help="监听端口 (默认: 8600)")
+    parser.add_argument("--latency", choices=["zero", "fixed", "sampled"], default="sampled",
+                        help="延迟模式 (默认: sampled)")
+    parser.add_argument("--ttft", type=float, default=0.5, help="首个token延迟秒数 (fixed模式)")
+    parser.add_argument("--inter-token", type=float, default=0.1, help="分块间隔秒数 (fixed模式)")
+    parser.add_argument("--token-rate", type=float, help="每秒输出字符数，设置后按分块长度计算间隔")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入错误的请求比例")
+    parser.add_argument("--error-status", type=int, default=500, help="注入错误的HTTP状态码 (默认: 500)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="返回429限流的请求比例")
+    parser.add_argument("--seed", type=int, help="随机种子，用于复现延迟和错误注入")
+
+    args = parser.parse_args()
+
+    run_server(
+        host=args.host,
+        port=args.port,
+        mock_config={
+            "latency": args.latency,
+            "ttft": args.ttft,
+            "inter_token": args.inter_token,
+            "token_rate": args.token_rate,
+            "seed": args.seed,
+        },
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        throttle_rate=args.throttle_rate,
+        seed=args.seed,
+    )
@@ -290,7 +290,8 @@ class TarotFortuneSystem(BaseFortuneSystem):
             },
             "reading": reading
         }
-        logger.info(f"Processed data: {json.dumps(processed_data, ensure_ascii=False, indent=2)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Processed data: {json.dumps(processed_data, ensure_ascii=False)}")
         
         return processed_data
     
@@ -341,6 +341,10 @@ def print_reading_result_streaming(result_generator: Generator[str, None, None],
     except Exception as e:
         # Handle errors
         print(f"\n\n{Colors.RED}解读生成出错: {e}{Colors.ENDC}")
+    finally:
+        # Stop the upstream request if the reading was interrupted
+        if hasattr(result_generator, "close"):
+            result_generator.close()
     
     # Print footer
     print(f"\n\n{Colors.CYAN}" + "=" * 60 + f"{Colors.ENDC}")
@@ -426,6 +430,10 @@ def print_followup_result_streaming(topic: str, result_generator: Generator[str,
     except Exception as e:
         # Handle errors
         print(f"\n\n{Colors.RED}解读生成出错: {e}{Colors.ENDC}")
+    finally:
+        # Stop the upstream request if the reading was interrupted
+        if hasattr(result_generator, "close"):
+            result_generator.close()
     
     # Print footer
     print(f"\n\n{Colors.CYAN}" + "-" * 40 + f"{Colors.ENDC}")
@@ -0,0 +1,302 @@
+"""
+Tests for the ASGI app, driven directly through the ASGI protocol.
+"""
+import asyncio
+import json
+import threading
+
+import pytest
+
+from fortune_teller.api_common import InputSchema, get_result_store, reading_result_id
+from fortune_teller.asgi_app import FortuneASGIApp
+
+
+@pytest.fixture
+def app(tmp_path):
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text('llm:\n  provider: "mock"\n  model: "mock-model"\n  mock:\n    latency: "zero"\n',
+                           encoding="utf-8")
+    app = FortuneASGIApp(str(config_path))
+
+    async def lifespan():
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        await app({"type": "lifespan"}, receive, send)
+        return sent
+
+    assert asyncio.run(lifespan()) == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    return app
+
+
+def request(app, method, path, payload=None):
+    """Send one HTTP request to the app; returns (status, headers, body)."""
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    sent = []
+
+    received = []
+
+    async def receive():
+        if not received:
+            received.append(body)
+            return {"type": "http.request", "body": body, "more_body": False}
+        # The client stays connected
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": []}
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"], dict(sent[0]["headers"]), b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def test_bazi_reading_is_saved_and_retrievable(app):
+    status, headers, body = request(app, "POST", "/api/fortune/bazi", {
+        "name": "张三", "birthDate": "1990-05-01", "birthTime": "08:30", "gender": "male"
+    })
+    assert status == 200
+    assert headers[b"access-control-allow-origin"] == b"*"
+    reading = json.loads(body)
+    assert reading["result"]["analysis"]["character"]
+
+    status, _, body = request(app, "GET", f"/api/result/{reading['resultId']}")
+    assert status == 200 and json.loads(body) == reading["result"]
+
+
+def test_errors_are_reported_as_json(app):
+    status, _, body = request(app, "POST", "/api/fortune/bazi", {"birthDate": "not a date", "gender": "male"})
+    assert status == 400 and "error" in json.loads(body)
+    assert request(app, "GET", "/api/fortune/bazi")[0] == 405
+    assert request(app, "GET", "/api/nothing")[0] == 404
+    assert request(app, "GET", "/health")[0] == 200
+
+
+def test_stream_sends_chart_before_text_and_saves_result(app):
+    status, headers, body = request(app, "POST", "/api/fortune/bazi/stream", {
+        "name": "李四", "birthDate": "1985-10-12", "birthTime": "20:15", "gender": "female"
+    })
+    assert status == 200
+    assert headers[b"content-type"].startswith(b"text/event-stream")
+    events = []
+    for block in body.decode("utf-8").strip().split("\n\n"):
+        name_line, data_line = block.split("\n")
+        events.append((name_line[len("event: "):], json.loads(data_line[len("data: "):])))
+
+    assert events[0][0] == "chart" and set(events[0][1]) == {"eightWords", "fiveElements"}
+    assert events[-1][0] == "result"
+    deltas = [data["text"] for name, data in events[1:-1]]
+    assert deltas and all(name == "delta" for name, _ in events[1:-1])
+
+    final = events[-1][1]
+    assert final["result"]["analysis"]["character"] == "".join(deltas)
+    assert final["result"]["eightWords"] == events[0][1]["eightWords"]
+    status, _, body = request(app, "GET", f"/api/result/{final['resultId']}")
+    assert status == 200 and json.loads(body) == final["result"]
+
+
+def test_stream_rejects_invalid_inputs_before_streaming(app):
+    status, headers, body = request(app, "POST", "/api/fortune/bazi/stream", {"birthDate": "not a date"})
+    assert status == 400 and headers[b"content-type"].startswith(b"application/json")
+    assert request(app, "POST", "/api/fortune/unknown/stream", {})[0] == 404
+
+
+def test_stream_stops_when_client_disconnects(app):
+    original = app.fortune_teller.astream_reading
+
+    async def slow_reading(*args, **kwargs):
+        async for event in original(*args, **kwargs):
+            yield event
+            await asyncio.sleep(0.05)
+
+    app.fortune_teller.astream_reading = slow_reading
+    body = json.dumps({"birthDate": "1985-10-12", "birthTime": "20:15", "gender": "female"}).encode("utf-8")
+    sent = []
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        # Disconnect once the first event has been sent
+        while len(sent) < 2:
+            await asyncio.sleep(0.001)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/api/fortune/bazi/stream", "headers": []}
+    asyncio.run(app(scope, receive, send))
+    streamed = b"".join(m.get("body", b"") for m in sent[1:]).decode("utf-8")
+    assert streamed.startswith("event: chart") and "event: result" not in streamed
+
+
+def test_identical_requests_share_one_result(app):
+    payload = {"name": "王五", "birthDate": "1992-03-04", "birthTime": "06:00", "gender": "male"}
+    calls = []
+    original = app.fortune_teller.aperform_reading
+
+    async def counting_reading(*args, **kwargs):
+        calls.append(args)
+        return await original(*args, **kwargs)
+
+    app.fortune_teller.aperform_reading = counting_reading
+
+    async def concurrent():
+        sent = [[], []]
+
+        def client(index):
+            body = json.dumps(payload).encode("utf-8")
+
+            async def receive():
+                return {"type": "http.request", "body": body, "more_body": False}
+
+            async def send(message):
+                sent[index].append(message)
+
+            scope = {"type": "http", "method": "POST", "path": "/api/fortune/bazi", "headers": []}
+            return app(scope, receive, send)
+
+        await asyncio.gather(client(0), client(1))
+        return [json.loads(messages[1]["body"]) for messages in sent]
+
+    first, second = asyncio.run(concurrent())
+    assert first == second and len(calls) == 1
+
+    # Stored results answer later requests, streaming included
+    status, _, body = request(app, "POST", "/api/fortune/bazi", payload)
+    assert json.loads(body) == first and len(calls) == 1
+    _, _, streamed = request(app, "POST", "/api/fortune/bazi/stream", payload)
+    assert f'"resultId": "{first["resultId"]}"' in streamed.decode("utf-8")
+
+    # Another question is another reading
+    status, _, body = request(app, "POST", "/api/fortune/bazi", dict(payload, question="事业"))
+    assert json.loads(body)["resultId"] != first["resultId"] and len(calls) == 2
+
+
+def test_result_store_is_accessed_off_the_event_loop(app, monkeypatch):
+    store = get_result_store()
+    loop_threads = []
+    store_threads = []
+
+    for method in ("get", "put"):
+        original = getattr(store, method)
+
+        def recording(*args, _original=original):
+            store_threads.append(threading.get_ident())
+            return _original(*args)
+
+        monkeypatch.setattr(store, method, recording)
+
+    async def call(scope, receive, send):
+        loop_threads.append(threading.get_ident())
+        await app(scope, receive, send)
+
+    payload = {"name": "赵六", "birthDate": "1988-08-08", "birthTime": "12:00", "gender": "female"}
+    assert request(call, "POST", "/api/fortune/bazi", payload)[0] == 200
+    assert request(call, "POST", "/api/fortune/bazi/stream", dict(payload, question="财运"))[0] == 200
+    assert request(call, "GET", "/api/result/missing")[0] == 404
+
+    assert len(store_threads) >= 5
+    assert not set(store_threads) & set(loop_threads)
+
+
+def test_failed_readings_are_not_saved(app):
+    payload = {"name": "钱七", "birthDate": "1979-01-02", "birthTime": "03:00", "gender": "male"}
+    backend = app.fortune_teller.llm_connector.backends[0]
+    original = backend.acall
+
+    async def failing_call(system_prompt, user_prompt):
+        raise RuntimeError("provider down")
+
+    backend.acall = failing_call
+    status, _, body = request(app, "POST", "/api/fortune/bazi", payload)
+    assert status == 502 and "provider down" in json.loads(body)["error"]
+
+    # Once the provider recovers the reading is generated, not replayed
+    backend.acall = original
+    status, _, body = request(app, "POST", "/api/fortune/bazi", payload)
+    assert status == 200 and "provider down" not in json.loads(body)["result"]["analysis"]["character"]
+
+
+def test_failed_streams_end_with_an_error_and_are_not_saved(app):
+    payload = {"name": "孙八", "birthDate": "1983-04-05", "birthTime": "10:00", "gender": "female"}
+    backend = app.fortune_teller.llm_connector.backends[0]
+    original = backend.astream
+
+    async def failing_stream(system_prompt, user_prompt):
+        raise RuntimeError("provider down")
+        yield
+
+    backend.astream = failing_stream
+    _, _, body = request(app, "POST", "/api/fortune/bazi/stream", payload)
+    events = [block.split("\n")[0] for block in body.decode("utf-8").strip().split("\n\n")]
+    assert events == ["event: chart", "event: error"]
+    assert "provider down" in body.decode("utf-8")
+
+    # Once the provider recovers the reading is generated, not replayed
+    backend.astream = original
+    _, _, body = request(app, "POST", "/api/fortune/bazi/stream", payload)
+    assert "event: result" in body.decode("utf-8") and "provider down" not in body.decode("utf-8")
+
+
+def test_result_ids_are_content_addressed():
+    chart = {"four_pillars": {"year": "庚午"}, "elements": {"strongest": "金"}}
+    data = {"name": "张三", "question": ""}
+    result_id = reading_result_id("bazi", chart, data, "mock/mock-model")
+    assert result_id == reading_result_id("bazi", dict(reversed(list(chart.items()))), dict(data), "mock/mock-model")
+    assert result_id.startswith("bazi-") and len(result_id) == len("bazi-") + 32
+    assert result_id != reading_result_id("bazi", chart, dict(data, name="李四"), "mock/mock-model")
+    assert result_id != reading_result_id("bazi", chart, data, "openai/gpt-4")
+
+
+@pytest.mark.parametrize("system_name,payload", [
+    ("tarot", {"question": "今年的事业方向？", "spread": "three_card", "focusArea": "事业"}),
+    ("zodiac", {"birthDate": "1993-07-21", "questionArea": "爱情"}),
+])
+def test_every_plugin_is_served(app, system_name, payload):
+    status, _, body = request(app, "POST", f"/api/fortune/{system_name}", payload)
+    assert status == 200
+    reading = json.loads(body)
+    assert reading["resultId"].startswith(f"{system_name}-")
+    assert reading["result"]["system"] == system_name and reading["result"]["fullText"]
+    assert request(app, "GET", f"/api/result/{reading['resultId']}")[2] == json.dumps(
+        reading["result"], ensure_ascii=False).encode("utf-8")
+
+    _, headers, streamed = request(app, "POST", f"/api/fortune/{system_name}/stream", payload)
+    assert headers[b"content-type"].startswith(b"text/event-stream")
+    assert streamed.decode("utf-8").startswith("event: chart")
+
+
+def test_requests_are_validated_against_compiled_schemas(app):
+    plugin = app.fortune_teller.plugin_manager.get_plugin("tarot")
+    calls = []
+    original = plugin.get_required_inputs
+    plugin.get_required_inputs = lambda: calls.append(1) or original()
+
+    status, _, body = request(app, "POST", "/api/fortune/tarot", {"spread": "unknown", "focusArea": "事业"})
+    assert status == 400
+    error = json.loads(body)["error"]
+    assert "你想要咨询的问题" in error and "塔罗牌阵" in error
+    # Schemas were compiled at startup, not per request
+    assert calls == []
+    assert request(app, "POST", "/api/fortune/nothing", {})[0] == 404
+
+
+def test_input_schema_accepts_camel_case_and_frontend_values():
+    schema = InputSchema({
+        "birth_date": {"type": "date", "required": True},
+        "birth_time": {"type": "time", "required": False},
+        "gender": {"type": "select", "options": ["男", "女"], "required": True},
+    })
+    assert schema.validate({"birthDate": "1990-05-01", "gender": "female", "name": "张三"}) == {
+        "birth_date": "1990-05-01", "gender": "女"
+    }
+    with pytest.raises(ValueError):
+        schema.validate({"birth_date": "1990-05-01", "birthTime": "noon", "gender": "女"})
@@ -0,0 +1,88 @@
+"""
+Tests for the AWS Bedrock connector's background client creation.
+"""
+import time
+
+import pytest
+
+from fortune_teller.core import aws_connector
+from fortune_teller.core.aws_connector import AWSBedrockConnector
+from fortune_teller.core.llm_connector import LLMConnector
+
+
+def test_client_is_created_in_the_background_and_cached(monkeypatch):
+    created = []
+
+    def slow_client(region, **kwargs):
+        time.sleep(0.2)
+        created.append(region)
+        return f"client-{region}"
+
+    monkeypatch.setattr(aws_connector, "get_bedrock_client", slow_client)
+
+    started = time.monotonic()
+    connector = AWSBedrockConnector({"region": "us-west-2"})
+    assert time.monotonic() - started < 0.1
+
+    # The first use waits for the client; later uses get the cached one
+    assert connector.client == "client-us-west-2"
+    assert connector.client == "client-us-west-2"
+    assert created == ["us-west-2"]
+
+    connector.set_region("eu-central-1")
+    assert connector.client == "client-eu-central-1"
+
+
+def test_rebuilt_connectors_share_one_thread_pool(monkeypatch):
+    monkeypatch.setattr(aws_connector, "get_bedrock_client", lambda region, **kwargs: f"client-{region}")
+    first = AWSBedrockConnector({"region": "us-west-2"})
+    second = AWSBedrockConnector({"region": "us-west-2"})
+    assert first._executor is second._executor
+    assert AWSBedrockConnector({"max_concurrency": 4})._executor is not first._executor
+
+
+def test_failed_client_creation_is_reported_on_first_use(monkeypatch):
+    def failing_client(region, **kwargs):
+        raise RuntimeError("no credentials")
+
+    monkeypatch.setattr(aws_connector, "get_bedrock_client", failing_client)
+    connector = AWSBedrockConnector({"region": "us-west-2"})
+    assert connector.client is None
+    response, metadata = connector.generate_response("系统", "用户")
+    assert "not initialized" in metadata["error"]
+
+
+def test_failed_streaming_fallback_is_not_cached(monkeypatch):
+    class OnDemandOnlyClient:
+        def invoke_model_with_response_stream(self, **kwargs):
+            raise RuntimeError("ValidationException: on-demand throughput isn't supported")
+
+        def invoke_model(self, **kwargs):
+            raise RuntimeError("ValidationException: on-demand throughput isn't supported")
+
+    monkeypatch.setattr(aws_connector, "get_bedrock_client", lambda region, **kwargs: OnDemandOnlyClient())
+    connector = LLMConnector({"provider": "aws_bedrock", "model": "anthropic.claude-3-5-haiku-20241022-v1:0",
+                              "region": "us-west-2"})
+
+    # The inference profile advice reaches the user as an error, not as a reading
+    with pytest.raises(RuntimeError, match="推理配置文件"):
+        list(connector.generate_response_streaming("系统", "用户"))
+    assert not connector.is_cached("系统", "用户")
+
+
+def test_unrecognized_response_format_is_an_error(monkeypatch):
+    class Body:
+        def read(self):
+            return b'{"unexpected": "shape"}'
+
+    class ProfileClient:
+        def invoke_model(self, **kwargs):
+            return {"body": Body()}
+
+    monkeypatch.setattr(aws_connector, "get_bedrock_client", lambda region, **kwargs: ProfileClient())
+    connector = LLMConnector({"provider": "aws_bedrock", "region": "us-west-2",
+                              "model": "arn:aws:bedrock:us-west-2:123456789012:inference-profile/test"})
+
+    response, metadata = connector.generate_response("系统", "格式")
+    assert "Unrecognized response format" in metadata["error"]
+    assert not connector.is_cached("系统", "格式")
@@ -0,0 +1,102 @@
+"""
+Tests for the offline batch pipeline with the local batch backend.
+"""
+import json
+import os
+
+import pytest
+
+from fortune_teller.api_common import ReadingRequests
+from fortune_teller.batch_pipeline import BatchPipeline, SUBMITTED
+from fortune_teller.core.batch_backend import LocalBatchBackend, read_jsonl
+from fortune_teller.core.result_store import MemoryResultStore
+from fortune_teller.main import FortuneTeller
+
+JOBS = [
+    {"id": "a", "system": "bazi", "inputs": {"birth_date": "1990-05-01", "birth_time": "08:30", "gender": "男"}},
+    {"id": "b", "system": "bazi", "inputs": {"birth_date": "1985-11-12", "gender": "女"}},
+    {"id": "c", "system": "bazi", "inputs": {"birth_date": "not a date", "gender": "女"}},
+]
+
+
+@pytest.fixture
+def fortune_teller(tmp_path):
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text('llm:\n  provider: "mock"\n  model: "mock-model"\n', encoding="utf-8")
+    return FortuneTeller(str(config_path))
+
+
+@pytest.fixture
+def jobs_path(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    path.write_text("\n".join(json.dumps(job, ensure_ascii=False) for job in JOBS), encoding="utf-8")
+    return str(path)
+
+
+def make_pipeline(fortune_teller, work_dir, **options):
+    backend = LocalBatchBackend(os.path.join(work_dir, "local_batches"), polls_until_done=options.pop("polls", 0))
+    return BatchPipeline(fortune_teller, backend, work_dir, poll_interval=0, **options)
+
+
+def test_batch_results_are_cached_and_written(fortune_teller, jobs_path, tmp_path):
+    work_dir = str(tmp_path / "work")
+    summary = make_pipeline(fortune_teller, work_dir, polls=2).run(jobs_path)
+    assert summary == {"total": 3, "succeeded": 2, "failed": 1, "cached": 0}
+
+    records = {record["id"]: record for record in read_jsonl(os.path.join(work_dir, "results.jsonl"))}
+    assert "出生日期格式错误" in records["c"]["error"]
+    assert records["a"]["result"]["metadata"]["llm_metadata"]["mock"] is True
+
+    # The responses are served from the cache, so a second job file submits nothing
+    for job in read_jsonl(os.path.join(work_dir, "jobs.prepared.jsonl")):
+        if "error" not in job:
+            assert fortune_teller.llm_connector.is_cached(job["system_prompt"], job["user_prompt"])
+    summary = make_pipeline(fortune_teller, str(tmp_path / "again")).run(jobs_path)
+    assert summary == {"total": 3, "succeeded": 2, "failed": 1, "cached": 2}
+
+
+def test_interrupted_run_resumes_without_resubmitting(fortune_teller, jobs_path, tmp_path):
+    work_dir = str(tmp_path / "work")
+    with pytest.raises(RuntimeError):
+        make_pipeline(fortune_teller, work_dir, polls=5, timeout=0).run(jobs_path)
+    assert make_pipeline(fortune_teller, work_dir).load_checkpoint()["stage"] == SUBMITTED
+
+    summary = make_pipeline(fortune_teller, work_dir).run(jobs_path)
+    assert summary["succeeded"] == 2
+    batches = [name for name in os.listdir(os.path.join(work_dir, "local_batches")) if name.endswith(".state.json")]
+    assert len(batches) == 1
+
+    # A finished run only reports its summary
+    assert make_pipeline(fortune_teller, work_dir).run(jobs_path) == summary
+
+
+def test_batch_readings_are_served_by_the_api(fortune_teller, jobs_path, tmp_path):
+    store = MemoryResultStore()
+    make_pipeline(fortune_teller, str(tmp_path / "work"), result_store=store).run(jobs_path)
+    records = {record["id"]: record for record in read_jsonl(str(tmp_path / "work" / "results.jsonl"))}
+
+    # The API gives the same request the ID the batch reading was saved under
+    _, _, result_id = ReadingRequests(fortune_teller).prepare("bazi", {
+        "birthDate": "1990-05-01", "birthTime": "08:30", "gender": "male"
+    })
+    assert records["a"]["result_id"] == result_id
+    stored = store.get(result_id)
+    assert stored["id"] == result_id and stored["gender"] == "male"
+    assert stored["analysis"]["character"] == records["a"]["result"]["full_text"]
+    assert "result_id" not in records["c"]
+
+
+def test_batch_readings_keep_the_chart_their_prompt_was_built_from(fortune_teller, tmp_path):
+    jobs_path = tmp_path / "tarot.jsonl"
+    jobs_path.write_text(json.dumps({"id": "t", "system": "tarot", "inputs": {
+        "question": "事业如何", "spread": "three_card", "focus_area": "事业"
+    }}, ensure_ascii=False), encoding="utf-8")
+    store = MemoryResultStore()
+    work_dir = tmp_path / "work"
+    make_pipeline(fortune_teller, str(work_dir), result_store=store).run(str(jobs_path))
+
+    # Tarot draws random cards, so the stored chart must be the one drawn when preparing
+    job = next(read_jsonl(str(work_dir / "jobs.prepared.jsonl")))
+    stored = store.get(job["result_id"])
+    assert stored["chart"] == job["processed_data"]
+    assert all(card["card"] in job["user_prompt"] for card in stored["chart"]["reading"])
@@ -0,0 +1,34 @@
+"""
+Tests for the shared provider client registry.
+"""
+import threading
+
+from fortune_teller.core.client_pool import ClientRegistry, pool_settings, secret_fingerprint
+
+
+def test_clients_are_created_once_per_key_across_threads():
+    registry = ClientRegistry()
+    created = []
+
+    def factory():
+        created.append(object())
+        return created[-1]
+
+    key = ("openai", None, secret_fingerprint("sk-test"), tuple(sorted(pool_settings(None).items())))
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(registry.get(key, factory))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(client is created[0] for client in clients)
+    assert registry.get(key[:2] + (secret_fingerprint("sk-other"),) + key[3:], factory) is not created[0]
+    assert "sk-test" not in repr(key)
+
+
+def test_pool_settings_fill_in_defaults():
+    settings = pool_settings({"max_connections": 8})
+    assert settings["max_connections"] == 8
+    assert settings["max_keepalive"] > 0 and settings["keepalive_expiry"] > 0
@@ -0,0 +1,75 @@
+"""
+Tests for the follow-up prompts and the follow-up prefetcher.
+"""
+import asyncio
+import time
+
+from fortune_teller.core import LLMConnector
+from fortune_teller.core.rate_limiter import estimate_tokens
+from fortune_teller.followup import FollowupPrefetcher, build_followup_prompts, get_followup_topics
+
+BAZI_DATA = {
+    "four_pillars": {"year": "甲子", "month": "丙寅", "day": "戊辰", "hour": "庚午"},
+    "gender": "男",
+    "birth_date": "1990-01-01",
+    "birth_time": "12:00",
+    "day_master": {"character": "戊", "element": "土"},
+    "elements": {"strongest": "土", "weakest": "水"},
+}
+
+
+def make_connector():
+    """Create a connector backed by the zero-latency mock provider."""
+    return LLMConnector({"provider": "mock", "model": "mock-model", "max_tokens": 100,
+                         "mock": {"latency": "zero"}})
+
+
+def test_system_prompt_is_shared_by_all_topics():
+    prompts = [build_followup_prompts("bazi", BAZI_DATA, topic) for topic in get_followup_topics("bazi")]
+    assert len({p["system_prompt"] for p in prompts}) == 1
+    assert "事业财运" in prompts[1]["user_prompt"]
+
+
+def test_prefetch_fills_the_cache_within_the_token_budget():
+    connector = make_connector()
+    topics = list(get_followup_topics("bazi"))
+    costs = []
+    for topic in topics[:2]:
+        prompts = build_followup_prompts("bazi", BAZI_DATA, topic)
+        costs.append(estimate_tokens(prompts["system_prompt"]) + estimate_tokens(prompts["user_prompt"]) + 100)
+
+    prefetcher = FollowupPrefetcher(connector, {"enabled": True, "token_budget": sum(costs)})
+    assert [topic for topic, _ in prefetcher.plan("bazi", BAZI_DATA)] == topics[:2]
+    prefetcher.start("bazi", BAZI_DATA)
+    assert prefetcher.wait(timeout=5) == 2
+
+    cached = [connector.is_cached(**build_followup_prompts("bazi", BAZI_DATA, topic)) for topic in topics]
+    assert cached == [True, True, False, False, False]
+
+    # Cached topics are not fetched (or charged) again
+    assert prefetcher.plan("bazi", BAZI_DATA)[0][0] == topics[2]
+    prefetcher.start("bazi", BAZI_DATA)
+    prefetcher.wait(timeout=5)
+
+
+def test_streaming_followup_joins_the_inflight_prefetch():
+    connector = make_connector()
+    calls = []
+
+    async def slow_fetch(system_prompt, user_prompt, cache_key, use_cache, priority, plugin):
+        calls.append(priority)
+        await asyncio.sleep(0.2)
+        return "预取结果", {"model": "mock-model"}
+
+    connector._afetch_response = slow_fetch
+    prefetcher = FollowupPrefetcher(connector, {"enabled": True})
+    topics = [topic for topic, _ in prefetcher.plan("bazi", BAZI_DATA)]
+    prefetcher.start("bazi", BAZI_DATA)
+    time.sleep(0.05)
+
+    prompts = build_followup_prompts("bazi", BAZI_DATA, topics[0])
+    chunks = list(connector.generate_response_streaming(prompts["system_prompt"], prompts["user_prompt"]))
+
+    assert chunks == ["预取结果"]
+    assert calls == ["prefetch"] * len(topics)
+    prefetcher.wait(timeout=5)
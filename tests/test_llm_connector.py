@@ -0,0 +1,340 @@
+"""
+Tests for the LLM connector using the mock provider.
+"""
+import asyncio
+import time
+
+from fortune_teller.core import LLMConnector
+
+
+def make_connector(**config):
+    """Create a connector backed by the mock provider."""
+    return LLMConnector({"provider": "mock", "model": "mock-model", **config})
+
+
+def test_sync_and_async_responses_share_the_cache():
+    """Test that the sync wrapper and the coroutine hit the same cache."""
+    connector = make_connector()
+    text, metadata = connector.generate_response("八字", "测试")
+    assert metadata["mock"] is True
+
+    async def fetch():
+        return await connector.agenerate_response("八字", "测试")
+
+    assert asyncio.run(fetch()) == (text, metadata)
+    assert connector.cache.stats()["hits"] == 1
+
+
+def test_concurrent_async_responses():
+    """Test that many coroutines can be awaited concurrently."""
+    connector = make_connector()
+
+    async def fetch_all():
+        return await asyncio.gather(*[
+            connector.agenerate_response("塔罗", f"问题{i}") for i in range(20)
+        ])
+
+    results = asyncio.run(fetch_all())
+    assert len(results) == 20
+    assert all(text for text, _ in results)
+
+
+def test_identical_concurrent_requests_are_coalesced():
+    """Test that concurrent identical requests share one upstream call."""
+    connector = make_connector()
+    calls = []
+
+    async def slow_fetch(system_prompt, user_prompt, cache_key, use_cache, priority, plugin):
+        calls.append(user_prompt)
+        await asyncio.sleep(0.05)
+        return "共享结果", {"model": "mock-model"}
+
+    connector._afetch_response = slow_fetch
+
+    async def fetch_all():
+        return await asyncio.gather(*[
+            connector.agenerate_response("八字", "同一个问题") for _ in range(10)
+        ])
+
+    results = asyncio.run(fetch_all())
+    assert len(calls) == 1
+    assert all(result == ("共享结果", {"model": "mock-model"}) for result in results)
+
+
+def test_identical_concurrent_streams_fan_out():
+    """Test that concurrent identical streams receive the same chunks from one upstream stream."""
+    connector = make_connector()
+    calls = []
+
+    async def fake_stream(system_prompt, user_prompt, priority, plugin, on_backend=None):
+        calls.append(user_prompt)
+        on_backend(connector.backends[0])
+        for chunk in ["甲", "乙", "丙"]:
+            await asyncio.sleep(0.01)
+            yield chunk
+
+    connector._astream_from_provider = fake_stream
+
+    async def consume():
+        return [chunk async for chunk in connector.agenerate_response_streaming("八字", "流式")]
+
+    async def consume_all():
+        return await asyncio.gather(*[consume() for _ in range(5)])
+
+    results = asyncio.run(consume_all())
+    assert len(calls) == 1
+    assert all(result == ["甲", "乙", "丙"] for result in results)
+
+
+class FakeAnthropicMessages:
+    """Stand-in for the Anthropic Messages API that records requests."""
+
+    def __init__(self, texts=("命", "理"), delay=0):
+        self.texts = texts
+        self.delay = delay
+        self.requests = []
+        self.closed = 0
+
+    async def create(self, stream=False, **request):
+        from types import SimpleNamespace
+        self.requests.append(request)
+        messages = self
+
+        class EventStream:
+            async def __aiter__(self):
+                for text in messages.texts:
+                    await asyncio.sleep(messages.delay)
+                    yield SimpleNamespace(
+                        type="content_block_delta", delta=SimpleNamespace(type="text_delta", text=text)
+                    )
+                yield SimpleNamespace(type="message_stop")
+
+            async def close(self):
+                messages.closed += 1
+
+        return EventStream()
+
+
+def test_anthropic_streaming_uses_messages_api():
+    """Test that Anthropic streaming yields text deltas and sends the system prompt as a cached prefix."""
+    from types import SimpleNamespace
+
+    connector = make_connector()
+    connector.provider = "anthropic"
+    messages = FakeAnthropicMessages()
+    connector.client = SimpleNamespace(messages=messages)
+
+    chunks = list(connector.generate_response_streaming("系统提示", "用户提示", use_cache=False))
+    assert chunks == ["命", "理"]
+    assert messages.requests[0]["system"] == [
+        {"type": "text", "text": "系统提示", "cache_control": {"type": "ephemeral"}}
+    ]
+    assert messages.requests[0]["messages"] == [{"role": "user", "content": "用户提示"}]
+
+
+def test_abandoned_stream_closes_the_provider_stream():
+    from types import SimpleNamespace
+    from fortune_teller.core.metrics import get_metrics_registry
+
+    connector = make_connector(max_tokens=500)
+    connector.provider = "anthropic"
+    messages = FakeAnthropicMessages(texts=["命"] * 50, delay=0.01)
+    connector.client = SimpleNamespace(messages=messages)
+    registry = get_metrics_registry()
+    labels = {"provider": "anthropic", "model": "mock-model"}
+    cancellations = registry.counter("llm_stream_cancellations_total", "").value(**labels)
+    saved = registry.counter("llm_stream_tokens_saved_total", "").value(**labels)
+
+    stream = connector.generate_response_streaming("系统提示", "用户提示", use_cache=False)
+    assert [next(stream), next(stream)] == ["命", "命"]
+    stream.close()
+
+    # The shared upstream stream is cancelled on the runner loop
+    counter = registry.counter("llm_stream_cancellations_total", "")
+    deadline = time.monotonic() + 2
+    while counter.value(**labels) == cancellations and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert counter.value(**labels) == cancellations + 1
+    assert messages.closed == 1
+    assert registry.counter("llm_stream_tokens_saved_total", "").value(**labels) > saved
+
+
+def test_mock_zero_latency_is_fast_and_seeded_output_is_reproducible():
+    """Test the zero-latency mock profile and seeded chunking."""
+    import time
+
+    config = {"mock": {"latency": "zero", "seed": 7}}
+    start = time.time()
+    first = list(make_connector(**config).generate_response_streaming("八字", "种子", use_cache=False))
+    second = list(make_connector(**config).generate_response_streaming("八字", "种子", use_cache=False))
+
+    assert time.time() - start < 1.0
+    assert first == second
+    assert len(first) > 2
+
+
+def test_provider_errors_are_retried_never_cached_and_trip_the_breaker():
+    """Test retries, error responses bypassing the cache and the circuit breaker."""
+    connector = make_connector(
+        model="flaky-model",
+        retry={"max_attempts": 2, "base_delay": 0},
+        circuit_breaker={"failure_threshold": 2, "recovery_timeout": 60}
+    )
+    calls = []
+
+    class ServiceUnavailableError(Exception):
+        pass
+
+    async def failing_call(system_prompt, user_prompt):
+        calls.append(user_prompt)
+        raise ServiceUnavailableError("upstream down")
+
+    connector.backends[0].acall = failing_call
+
+    text, metadata = connector.generate_response("八字", "故障")
+    assert "error" in metadata and text.startswith("Error:")
+    assert len(calls) == 2
+    assert connector.cache.get(connector._generate_cache_key("八字", "故障")) is None
+
+    # The circuit is now open: the provider is not called again
+    text, metadata = connector.generate_response("八字", "故障")
+    assert "is open" in metadata["error"]
+    assert len(calls) == 2
+
+
+def test_slow_backend_is_hedged_and_open_circuit_fails_over():
+    """Test hedging to the next backend and failover while a circuit is open."""
+    connector = make_connector(
+        backends=[{"model": "slow-primary"}, {"model": "fast-secondary"}],
+        hedge_after=0.05,
+        mock={"latency": "zero"}
+    )
+    primary, secondary = connector.backends
+    cancelled = []
+
+    async def slow_call(system_prompt, user_prompt):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "slow", {}
+
+    async def slow_stream(system_prompt, user_prompt):
+        await asyncio.sleep(5)
+        yield "slow"
+
+    primary.acall = slow_call
+    primary.astream = slow_stream
+
+    text, metadata = connector.generate_response("八字", "对冲", use_cache=False)
+    assert metadata["backend"] == "mock:fast-secondary"
+    assert text != "slow" and cancelled == [True]
+
+    chunks = list(connector.generate_response_streaming("八字", "对冲", use_cache=False))
+    assert chunks and "slow" not in chunks
+
+    # With the primary's circuit open the secondary answers without waiting
+    connector.hedge_after = None
+    for _ in range(5):
+        connector._circuit_breaker(primary).record_failure()
+    text, metadata = connector.generate_response("八字", "熔断", use_cache=False)
+    assert metadata["backend"] == "mock:fast-secondary"
+
+
+def test_hedged_answers_are_cached_under_the_answering_model():
+    """Test that an answer from a secondary backend is not cached as the primary's."""
+    connector = make_connector(
+        backends=[{"model": "slow-primary"}, {"model": "fast-secondary"}],
+        hedge_after=0.05,
+        mock={"latency": "zero"}
+    )
+    primary, secondary = connector.backends
+
+    async def slow_call(system_prompt, user_prompt):
+        await asyncio.sleep(5)
+        return "slow", {}
+
+    async def slow_stream(system_prompt, user_prompt):
+        await asyncio.sleep(5)
+        yield "slow"
+
+    primary.acall = slow_call
+    primary.astream = slow_stream
+
+    for user_prompt, generate in [
+        ("对冲", lambda: connector.generate_response("八字", "对冲")[0]),
+        ("流式对冲", lambda: "".join(connector.generate_response_streaming("八字", "流式对冲")))
+    ]:
+        text = generate()
+        assert connector.get_cached_response("八字", user_prompt) is None
+        cached_text, metadata = connector.cache.get(connector._generate_cache_key("八字", user_prompt, secondary))
+        assert cached_text == text and metadata["backend"] == "mock:fast-secondary"
+        if "streamed" in metadata:
+            assert metadata["model"] == "fast-secondary"
+
+    # Switching away from the secondary's model frees its entries
+    assert connector.cache.invalidate_model("fast-secondary") == 2
+
+
+def test_prompt_cache_usage_is_normalized():
+    """Test prompt-cache token counts across provider usage formats."""
+    from types import SimpleNamespace
+    from fortune_teller.core.llm_backend import prompt_cache_usage
+
+    anthropic_usage = SimpleNamespace(input_tokens=10, cache_read_input_tokens=800,
+                                      cache_creation_input_tokens=None)
+    assert prompt_cache_usage(anthropic_usage) == {"read_tokens": 800, "write_tokens": 0}
+    assert prompt_cache_usage({"prompt_tokens_details": {"cached_tokens": 512}})["read_tokens"] == 512
+    assert prompt_cache_usage({"prompt_cache_hit_tokens": 64})["read_tokens"] == 64
+    assert prompt_cache_usage({"cache_creation_input_tokens": 900})["write_tokens"] == 900
+
+
+def test_batch_responses_are_bounded_and_yielded_in_completion_order():
+    """Test that a batch runs with bounded concurrency and yields results as they finish."""
+    connector = make_connector()
+    active, peak, calls = [0], [0], []
+
+    async def timed_fetch(system_prompt, user_prompt, cache_key, use_cache, priority, plugin):
+        calls.append(priority)
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(float(user_prompt))
+        active[0] -= 1
+        return f"结果{user_prompt}", {"model": "mock-model"}
+
+    connector._afetch_response = timed_fetch
+    delays = ["0.08", "0.02", "0.02", "0.01", "0.04", "0.09"]
+    results = list(connector.generate_responses([("批量", d) for d in delays], max_concurrency=3))
+
+    assert sorted(index for index, _, _ in results) == list(range(len(delays)))
+    assert all(text == f"结果{delays[index]}" for index, text, _ in results)
+    assert [index for index, _, _ in results][2:] == [3, 4, 0, 5]
+    assert peak[0] == 3
+    # The two concurrent 0.02 prompts share one upstream call
+    assert len(calls) == 5 and set(calls) == {"bulk"}
+
+
+def test_calls_record_latency_and_token_metrics():
+    from fortune_teller.core.metrics import get_metrics_registry
+
+    connector = make_connector(mock={"latency": "zero"})
+    registry = get_metrics_registry()
+    labels = {"provider": "mock", "model": "mock-model", "plugin": "tarot"}
+    duration = registry.histogram("llm_request_duration_seconds", "")
+    first_token = registry.histogram("llm_time_to_first_token_seconds", "")
+    gaps = registry.histogram("llm_inter_chunk_gap_seconds", "")
+    output_tokens = registry.counter("llm_output_tokens_total", "")
+    before = (duration.count(**labels), first_token.count(**labels), gaps.count(**labels))
+
+    response, _ = connector.generate_response("系统", "非流式", use_cache=False, plugin="tarot")
+    assert duration.count(**labels) == before[0] + 1
+    assert output_tokens.value(**labels) > 0
+
+    chunks = list(connector.generate_response_streaming("系统", "流式", use_cache=False, plugin="tarot"))
+    assert duration.count(**labels) == before[0] + 2
+    assert first_token.count(**labels) == before[1] + 1
+    assert gaps.count(**labels) == before[2] + len(chunks) - 1
+
+    exported = registry.render_prometheus()
+    assert 'llm_request_duration_seconds_count{provider="mock",model="mock-model",plugin="tarot"}' in exported
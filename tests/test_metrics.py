@@ -0,0 +1,25 @@
+"""
+Tests for the in-process metrics registry.
+"""
+from fortune_teller.core.metrics import MetricsRegistry
+
+
+def test_histogram_buckets_are_cumulative_and_exported():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, route="/a")
+    registry.counter("requests_total", "Requests", ("route",)).inc(route='say "hi"')
+    assert registry.histogram("latency_seconds", "ignored") is histogram
+
+    (labels, value), = histogram.samples()
+    assert labels == {"route": "/a"}
+    assert value["buckets"] == [(0.1, 1), (1.0, 3), (float("inf"), 4)]
+    assert value["count"] == 4
+
+    lines = registry.render_prometheus().splitlines()
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{route="/a",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{route="/a"} 4.25' in lines
+    assert 'requests_total{route="say \\"hi\\""} 1' in lines
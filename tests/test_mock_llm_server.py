@@ -0,0 +1,100 @@
+"""
+Tests for the local stand-in LLM server.
+"""
+import json
+import zlib
+import base64
+import struct
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from fortune_teller.mock_llm_server import MockLLMServer
+
+
+@pytest.fixture
+def server():
+    server = MockLLMServer(("127.0.0.1", 0), {"latency": "zero", "seed": 1})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, path, payload):
+    url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    return urllib.request.urlopen(request, timeout=5)
+
+
+def decode_event_messages(data):
+    """Split an AWS event stream into (headers, payload) pairs, checking the CRCs."""
+    messages = []
+    while data:
+        total_length, headers_length = struct.unpack(">II", data[:8])
+        message, data = data[:total_length], data[total_length:]
+        assert struct.unpack(">I", message[8:12])[0] == zlib.crc32(message[:8]) & 0xffffffff
+        assert struct.unpack(">I", message[-4:])[0] == zlib.crc32(message[:-4]) & 0xffffffff
+
+        headers, raw = {}, message[12:12 + headers_length]
+        while raw:
+            name_length = raw[0]
+            name = raw[1:1 + name_length].decode()
+            value_length = struct.unpack(">H", raw[2 + name_length:4 + name_length])[0]
+            headers[name] = raw[4 + name_length:4 + name_length + value_length].decode()
+            raw = raw[4 + name_length + value_length:]
+        messages.append((headers, message[12 + headers_length:-4]))
+    return messages
+
+
+def test_openai_completion_and_sse_stream_match(server):
+    payload = {"model": "gpt-4", "messages": [
+        {"role": "system", "content": "system"}, {"role": "user", "content": "八字"}
+    ]}
+    with post(server, "/v1/chat/completions", payload) as response:
+        completion = json.loads(response.read())
+    text = completion["choices"][0]["message"]["content"]
+    assert text and completion["usage"]["completion_tokens"] > 0
+
+    with post(server, "/v1/chat/completions", dict(payload, stream=True)) as response:
+        assert response.headers["Content-Type"] == "text/event-stream"
+        events = [line[len("data: "):] for line in response.read().decode("utf-8").splitlines()
+                  if line.startswith("data: ")]
+
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+    assert "".join(c["choices"][0]["delta"].get("content", "") for c in chunks) == text
+
+
+def test_bedrock_response_stream_framing(server):
+    body = {"anthropic_version": "bedrock-2023-05-31", "system": "system",
+            "messages": [{"role": "user", "content": "塔罗"}]}
+    model = "arn%3Aaws%3Abedrock%3Aus-west-2%3A1%3Ainference-profile%2Fmodel"
+    with post(server, f"/model/{model}/invoke-with-response-stream", body) as response:
+        assert response.headers["Content-Type"] == "application/vnd.amazon.eventstream"
+        messages = decode_event_messages(response.read())
+
+    events = []
+    for headers, payload in messages:
+        assert headers[":event-type"] == "chunk"
+        events.append(json.loads(base64.b64decode(json.loads(payload)["bytes"])))
+
+    assert events[0]["message"]["model"] == "arn:aws:bedrock:us-west-2:1:inference-profile/model"
+    assert events[-1]["type"] == "message_stop"
+    streamed = "".join(e["delta"]["text"] for e in events if e["type"] == "content_block_delta")
+
+    with post(server, f"/model/{model}/invoke", body) as response:
+        assert json.loads(response.read())["content"][0]["text"] == streamed
+
+
+def test_error_injection(server):
+    server.throttle_rate = 1.0
+    with pytest.raises(urllib.error.HTTPError) as excinfo:
+        post(server, "/model/m/invoke", {"messages": []})
+    assert excinfo.value.code == 429
+    assert excinfo.value.headers["x-amzn-ErrorType"] == "ThrottlingException"
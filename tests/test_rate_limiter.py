@@ -0,0 +1,50 @@
+"""
+Tests for the token-bucket rate limiter.
+"""
+import asyncio
+
+from fortune_teller.core.rate_limiter import BULK, INTERACTIVE, RateLimiter, estimate_tokens
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("八字命理") == 4
+
+
+def test_queued_requests_are_served_by_priority():
+    """Test that excess work waits, and interactive work jumps the queue."""
+    limiter = RateLimiter("test", tokens_per_minute=60000)
+    served = []
+
+    async def request(name, priority):
+        await limiter.acquire(50, priority)
+        served.append(name)
+
+    async def run():
+        # Drain the bucket, then queue bulk work before an interactive request
+        assert await limiter.acquire(60000) == 0
+        bulk = [asyncio.ensure_future(request(f"bulk{i}", BULK)) for i in range(2)]
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(request("chat", INTERACTIVE))
+        await asyncio.gather(*bulk, interactive)
+
+    asyncio.run(run())
+    assert served == ["chat", "bulk0", "bulk1"]
+    assert limiter.queued == 3 and limiter.queue_length == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    limiter = RateLimiter("test", requests_per_minute=60)
+
+    async def run():
+        for _ in range(60):
+            await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.queue_length == 1
+        waiter.cancel()
+        await asyncio.sleep(0)
+        assert limiter.queue_length == 0
+
+    asyncio.run(run())
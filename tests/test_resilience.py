@@ -0,0 +1,109 @@
+"""
+Tests for error classification, retries and the circuit breaker.
+"""
+import asyncio
+
+import pytest
+
+from fortune_teller.core.resilience import (
+    CLIENT_ERROR, SERVER_ERROR, THROTTLED, TIMEOUT,
+    CircuitBreaker, CircuitOpenError, RetryPolicy,
+    call_with_retry, classify_error, stream_with_retry
+)
+
+
+class RateLimitError(Exception):
+    """Stands in for the OpenAI/Anthropic SDK error of the same name."""
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class ClientError(Exception):
+    """Stands in for botocore's ClientError."""
+
+    def __init__(self, code, status):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}
+
+
+NO_BACKOFF = RetryPolicy(max_attempts=3, base_delay=0)
+
+
+def test_classify_error():
+    assert classify_error(RateLimitError()) == THROTTLED
+    assert classify_error(ClientError("throttlingException", 400)) == THROTTLED
+    assert classify_error(StatusError(503)) == SERVER_ERROR
+    assert classify_error(ClientError("ModelTimeoutException", 408)) == TIMEOUT
+    assert classify_error(asyncio.TimeoutError()) == TIMEOUT
+    assert classify_error(StatusError(400)) == CLIENT_ERROR
+    assert classify_error(ValueError("bad prompt")) == CLIENT_ERROR
+
+
+def test_call_with_retry_retries_only_retryable_errors():
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise StatusError(500)
+        return "ok"
+
+    assert asyncio.run(call_with_retry(flaky, NO_BACKOFF)) == "ok"
+    assert len(calls) == 3
+
+    async def bad_request():
+        calls.append(1)
+        raise StatusError(400)
+
+    calls.clear()
+    with pytest.raises(StatusError):
+        asyncio.run(call_with_retry(bad_request, NO_BACKOFF))
+    assert len(calls) == 1
+
+
+def test_stream_is_not_retried_after_first_chunk():
+    attempts = []
+
+    async def stream():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RateLimitError()
+        yield "a"
+        raise StatusError(502)
+
+    async def consume():
+        chunks = []
+        with pytest.raises(StatusError):
+            async for chunk in stream_with_retry(stream, NO_BACKOFF):
+                chunks.append(chunk)
+        return chunks
+
+    assert asyncio.run(consume()) == ["a"]
+    assert len(attempts) == 2
+
+
+def test_circuit_breaker_opens_and_recovers():
+    now = [0.0]
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=10, clock=lambda: now[0])
+
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # After the recovery timeout a single probe goes through
+    now[0] = 11
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
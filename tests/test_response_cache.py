@@ -0,0 +1,124 @@
+"""
+Tests for the LLM response cache.
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+
+from fortune_teller.core.response_cache import (
+    make_cache_key, MemoryResponseCache, SQLiteResponseCache, TieredResponseCache,
+    create_response_cache
+)
+
+
+def test_cache_key_is_stable():
+    """Test that cache keys depend only on the request parameters."""
+    key = make_cache_key("openai", "gpt-4", 0.7, "系统", "用户")
+    assert key == make_cache_key("openai", "gpt-4", 0.7, "系统", "用户")
+    assert key != make_cache_key("openai", "gpt-4", 0.2, "系统", "用户")
+    assert len(key) == 64
+
+
+def test_sqlite_cache_persists_across_instances(tmp_path):
+    """Test that a response written by one cache is read by another."""
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteResponseCache(path).set("k", ("解读", {"model": "m"}), model="m")
+
+    assert SQLiteResponseCache(path).get("k") == ("解读", {"model": "m"})
+
+
+def test_sqlite_cache_ttl_and_eviction(tmp_path):
+    """Test that expired and least recently used entries are dropped."""
+    cache = SQLiteResponseCache(str(tmp_path / "cache.sqlite3"), ttl=0.05)
+    cache.set("old", ("a", {}))
+    time.sleep(0.1)
+    assert cache.get("old") is None
+
+    cache = SQLiteResponseCache(str(tmp_path / "lru.sqlite3"), max_entries=2)
+    cache.set("a", ("a", {}))
+    cache.set("b", ("b", {}))
+    cache.get("a")
+    cache.set("c", ("c", {}))
+    assert cache.get("b") is None
+    assert cache.get("a") == ("a", {})
+
+
+def test_create_response_cache_defaults_to_memory():
+    """Test that the factory falls back to the in-memory backend."""
+    assert isinstance(create_response_cache(None), MemoryResponseCache)
+    assert isinstance(create_response_cache({"backend": "unknown"}), MemoryResponseCache)
+
+
+def test_memory_cache_limits_and_counters():
+    """Test LRU eviction by entry count and byte budget."""
+    cache = MemoryResponseCache(max_entries=2, max_bytes=None)
+    cache.set("a", ("a", {}))
+    cache.set("b", ("b", {}))
+    cache.get("a")
+    cache.set("c", ("c", {}))
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+    cache = MemoryResponseCache(max_entries=None, max_bytes=15)
+    cache.set("a", ("x" * 8, {}))
+    cache.set("b", ("y" * 8, {}))
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] <= 15
+
+
+def test_tiered_cache_promotes_and_invalidates_by_model(tmp_path):
+    """Test that persistent hits are promoted and model invalidation stays in memory."""
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteResponseCache(path).set("k", ("解读", {}), model="m1")
+
+    cache = TieredResponseCache(MemoryResponseCache(), SQLiteResponseCache(path))
+    assert cache.get("k") == ("解读", {})
+    assert cache.memory.stats()["entries"] == 1
+
+    assert cache.invalidate_model("m1") == 1
+    assert cache.memory.stats()["entries"] == 0
+    assert cache.get("k") == ("解读", {})
+
+
+def test_sqlite_cache_batches_access_times(tmp_path):
+    """Test that hits only write their access times in batches."""
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SQLiteResponseCache(path, access_flush_interval=3600)
+    cache.set("k", ("解读", {}))
+
+    def accessed_at():
+        with sqlite3.connect(path) as conn:
+            return conn.execute("SELECT accessed_at FROM responses WHERE key = 'k'").fetchone()[0]
+
+    written = accessed_at()
+    time.sleep(0.01)
+    assert cache.get("k") == ("解读", {})
+    assert accessed_at() == written
+
+    # The next write, or closing the cache, writes them
+    cache.set("other", ("x", {}))
+    assert accessed_at() > written
+
+
+def test_tiered_cache_async_methods_keep_sqlite_off_the_event_loop(tmp_path):
+    """Test that the async methods reach the persistent tier on another thread."""
+    persistent = SQLiteResponseCache(str(tmp_path / "cache.sqlite3"))
+    cache = TieredResponseCache(MemoryResponseCache(), persistent)
+    threads = []
+    for method in ("lookup", "set"):
+        def recording(*args, _original=getattr(persistent, method)):
+            threads.append(threading.get_ident())
+            return _original(*args)
+        setattr(persistent, method, recording)
+
+    async def use_cache():
+        await cache.aset("k", ("解读", {}), model="m")
+        cache.memory.clear()
+        return await cache.aget("k"), threading.get_ident()
+
+    response, loop_thread = asyncio.run(use_cache())
+    assert response == ("解读", {}) and cache.memory.get("k") == response
+    assert len(threads) == 2 and loop_thread not in threads
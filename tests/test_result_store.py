@@ -0,0 +1,63 @@
+"""
+Tests for the API result store.
+"""
+import time
+
+from fortune_teller.core.result_store import (
+    MemoryResultStore, SQLiteResultStore, TieredResultStore, create_result_store, encode_result
+)
+
+RESULT = {"id": "bazi-1", "analysis": {"character": "命主性格沉稳" * 50}}
+
+
+def test_results_are_stored_compressed():
+    """Test that results round-trip and are kept smaller than their JSON."""
+    store = MemoryResultStore()
+    store.put("bazi-1", RESULT)
+
+    assert store.get("bazi-1") == RESULT
+    assert store.stats()["bytes"] == len(encode_result(RESULT))
+    assert store.stats()["bytes"] < len("命主性格沉稳".encode("utf-8")) * 50
+
+
+def test_memory_store_ttl_and_lru_limit():
+    """Test that expired and least recently used results are dropped."""
+    store = MemoryResultStore(ttl=0.05)
+    store.put("old", RESULT)
+    time.sleep(0.1)
+    assert store.get("old") is None
+
+    store = MemoryResultStore(max_entries=2)
+    store.put("a", {"n": 1})
+    store.put("b", {"n": 2})
+    store.get("a")
+    store.put("c", {"n": 3})
+    assert store.get("b") is None
+    assert store.get("a") == {"n": 1} and store.stats()["evictions"] == 1
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    """Test that a result saved by one worker's store is read by another's."""
+    path = str(tmp_path / "results.sqlite3")
+    create_result_store({"backend": "sqlite", "path": path}).put("bazi-1", RESULT)
+
+    other = create_result_store({"backend": "sqlite", "path": path})
+    assert isinstance(other, TieredResultStore)
+    assert other.get("bazi-1") == RESULT
+    # Promoted into the memory tier
+    assert other.memory.get("bazi-1") == RESULT
+
+
+def test_sqlite_store_ttl_and_entry_limit(tmp_path):
+    """Test that expired results are not served and the oldest are evicted."""
+    store = SQLiteResultStore(str(tmp_path / "ttl.sqlite3"), ttl=0.05)
+    store.put("old", RESULT)
+    time.sleep(0.1)
+    assert store.get("old") is None
+
+    store = SQLiteResultStore(str(tmp_path / "limit.sqlite3"), max_entries=2)
+    for n in range(3):
+        store.put(f"r{n}", {"n": n})
+    assert store.get("r0") is None
+    assert store.stats()["entries"] == 2
+
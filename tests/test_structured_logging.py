@@ -0,0 +1,67 @@
+"""
+Tests for LLM request logging and the queue-based logging setup.
+"""
+import json
+import logging
+import threading
+
+from fortune_teller.core import structured_logging
+from fortune_teller.core.structured_logging import (
+    StructuredFormatter, configure_logging, log_llm_request, prompt_hash, shutdown_logging
+)
+
+
+class ListHandler(logging.Handler):
+    """Collects formatted records."""
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def test_requests_are_logged_with_hashes_and_sampled_payloads():
+    logger = logging.getLogger("test_structured_logging")
+    logger.setLevel(logging.INFO)
+    handler = ListHandler()
+    handler.setFormatter(StructuredFormatter())
+    logger.addHandler(handler)
+    try:
+        log_llm_request(logger, "llm_request", "系统提示", "用户提示", provider="mock")
+        structured_logging._sample_rate = 1.0
+        log_llm_request(logger, "llm_request", "系统提示", "用户提示", provider="mock")
+    finally:
+        structured_logging._sample_rate = 0.0
+        logger.removeHandler(handler)
+
+    plain, sampled = [json.loads(line) for line in handler.lines]
+    assert plain["event"] == "llm_request" and plain["provider"] == "mock"
+    assert plain["user_prompt_hash"] == prompt_hash("用户提示")
+    assert "user_prompt" not in plain
+    assert sampled["user_prompt"] == "用户提示"
+
+
+def test_queue_handler_writes_in_the_background_and_formats_lazily():
+    root = logging.getLogger()
+    handler = ListHandler()
+    root.addHandler(handler)
+    formatted = []
+
+    class Payload:
+        def __str__(self):
+            formatted.append(threading.current_thread())
+            return "payload"
+
+    try:
+        configure_logging({"queue": True})
+        assert handler not in root.handlers
+        logging.getLogger("test_structured_logging").warning("value: %s", Payload())
+        shutdown_logging()
+    finally:
+        root.removeHandler(handler)
+
+    assert handler.lines == ["value: payload"]
+    # The message was only built by the listener thread
+    assert formatted and threading.main_thread() not in formatted